@@ -0,0 +1,229 @@
+"""
+Benchmark antes/después del parser LaTeX.
+
+Compara la implementación anterior (cuatro escaneos completos + sort + regex por
+bloque, copiada aquí tal cual como referencia) contra `latex_parser.parsear_latex`
+sobre un banco sintético, y verifica que ambas devuelven exactamente lo mismo.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_parser            # 100k ejercicios
+    python -m benchmarks.bench_parser -n 10000 -r 5
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from latex_parser import parsear_latex
+from benchmarks.synthetic import escribir_banco
+
+
+# ---------------- implementación anterior (referencia) ---------------- #
+def _extract_math_blocks_legacy(text: str) -> List[str]:
+    """Devuelve lista del contenido interior de cada \[ ... \] en el texto (sin delimitadores)."""
+    pattern = re.compile(r'\\\[(.*?)\\\]', re.S)
+    return [m.group(1).strip() for m in pattern.finditer(text)]
+
+def _clean_condition_legacy(text: str) -> str:
+    """
+    Normaliza la condición extraída:
+      - elimina comas/espacios líderes y el token \quad si está al principio.
+      - NO modifica el LaTeX interior (conserva \frac, \left, etc.).
+    """
+    if not text:
+        return ""
+    s = text.strip()
+    # eliminar \quad iniciales o comas precedentes
+    s = re.sub(r'^(?:,|\s|\\quad|\\,)+', '', s)
+    return s.strip()
+
+def parsear_latex_legacy(path: str) -> List[Dict[str, Optional[str]]]:
+    """
+    Parsea un archivo .tex con el estándar y devuelve lista de ejercicios con:
+      numero, tema, subtema, enunciado, condiciones, respuesta, archivo_origen
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No existe el archivo: {path}")
+
+    with open(path, "r", encoding="utf-8") as f:
+        contenido = f.read()
+
+    # posición de \maketitle si existe (para detectar la primera sección válida como tema)
+    maketitle_pos = contenido.find(r'\maketitle')
+    if maketitle_pos == -1:
+        maketitle_pos = 0
+
+    # recolectar tokens: secciones/subsecciones y marcadores de ejercicio
+    tokens = []
+    for m in re.finditer(r'\\section\*?{([^}]*)}', contenido):
+        tokens.append({'type': 'section', 'pos': m.start(), 'title': m.group(1).strip()})
+    for m in re.finditer(r'\\subsection\*?{([^}]*)}', contenido):
+        tokens.append({'type': 'subsection', 'pos': m.start(), 'title': m.group(1).strip()})
+    for m in re.finditer(r'%%\s*EXERCISE_START', contenido, flags=re.I):
+        tokens.append({'type': 'exercise_start', 'pos': m.start(), 'title': None})
+    for m in re.finditer(r'%%\s*EXERCISE_END', contenido, flags=re.I):
+        tokens.append({'type': 'exercise_end', 'pos': m.start(), 'title': None})
+
+    tokens.sort(key=lambda x: x['pos'])
+
+    tema = None
+    tema_set = False
+    current_subtema = None
+    ejercicios: List[Dict[str, Optional[str]]] = []
+
+    i = 0
+    n_tokens = len(tokens)
+    while i < n_tokens:
+        tok = tokens[i]
+        ttype = tok['type']
+
+        if ttype == 'section':
+            # la PRIMERA sección (después de \maketitle) la guardamos como TEMA general
+            if (not tema_set) and (tok['pos'] >= maketitle_pos):
+                tema = tok['title']
+                tema_set = True
+            else:
+                # posteriores secciones interpretadas como subtema contextual
+                current_subtema = tok['title']
+            i += 1
+            continue
+
+        if ttype == 'subsection':
+            current_subtema = tok['title']
+            i += 1
+            continue
+
+        if ttype == 'exercise_start':
+            # buscar exercise_end correspondiente
+            j = i + 1
+            end_pos = None
+            while j < n_tokens:
+                if tokens[j]['type'] == 'exercise_end':
+                    end_pos = tokens[j]['pos']
+                    break
+                j += 1
+            if end_pos is None:
+                end_pos = len(contenido)
+
+            start_pos = tok['pos']
+            block_text = contenido[start_pos:end_pos]
+
+            # ---------------- extraer campos ----------------
+            # numero: comentario % id: X o patrón "N)" al inicio del bloque
+            numero = None
+            m_id = re.search(r'%\s*id\s*:\s*([A-Za-z0-9\-\_]+)', block_text, flags=re.I)
+            if m_id:
+                numero = m_id.group(1).strip()
+            else:
+                m_num = re.search(r'^\s*([0-9]+)\)', block_text, flags=re.M)
+                if m_num:
+                    numero = m_num.group(1).strip()
+
+            # Nota: el estándar actual NO usa "% condition: ..." — sólo condiciones inline con ", \quad"
+            math_blocks = _extract_math_blocks_legacy(block_text)
+
+            enunciado = ""
+            condiciones = ""
+            respuesta = ""
+
+            if math_blocks:
+                math1 = math_blocks[0]  # primer \[...\] -> enunciado (posible inline cond)
+
+                # Detectar condición INLINE: COMA no escapada seguida de \quad
+                # regex: (?<!\\),\s*\\quad
+                m_inline = re.search(r'(?<!\\),\s*\\quad', math1)
+                if m_inline:
+                    # dividir: enunciado = parte anterior a la coma no escapada,
+                    # condición = lo que sigue al primer \quad subsecuente
+                    comma_idx = m_inline.start()
+                    quad_idx = math1.find(r'\quad', comma_idx)
+                    if quad_idx == -1:
+                        quad_idx = math1.rfind(r'\quad')
+                    pre = math1[:comma_idx].rstrip()
+                    pre = re.sub(r'(?:,|\s)+$', '', pre)  # limpiar comas/trailing spaces del pre
+                    post = math1[quad_idx + len(r'\quad'):].strip() if quad_idx != -1 else math1[comma_idx + 1:].strip()
+                    enunciado = pre
+                    condiciones = _clean_condition_legacy(post)
+                else:
+                    # No hay condición inline --> enunciado completo
+                    enunciado = math1
+                    condiciones = ""
+
+                # respuesta = segundo \[...\] si existe
+                if len(math_blocks) >= 2:
+                    respuesta = math_blocks[1]
+                else:
+                    # fallback: intentar encontrar \textbf{Rpta: } ... \[...\]
+                    m_r = re.search(r'\\textbf\{Rpta[:\s]*\}\s*\\\[(.*?)\\\]', block_text, flags=re.S | re.I)
+                    if m_r:
+                        respuesta = m_r.group(1).strip()
+                    else:
+                        respuesta = ""
+            else:
+                # Si no hay \[...\] en bloque, fallback: primera línea no comentada = enunciado
+                lines = [ln for ln in block_text.splitlines() if ln.strip() and not ln.strip().startswith('%')]
+                enunciado = lines[0].strip() if lines else ""
+                condiciones = ""
+                respuesta = ""
+
+            ejercicios.append({
+                'numero': numero,
+                'tema': tema or "",
+                'subtema': current_subtema or "",
+                'enunciado': enunciado,
+                'condiciones': condiciones,
+                'respuesta': respuesta,
+                'archivo_origen': os.path.basename(path)
+            })
+
+            # avanzar índice al token después del exercise_end (si existía)
+            if end_pos == len(contenido):
+                i = n_tokens
+            else:
+                i = j + 1
+            continue
+
+        i += 1
+
+    return ejercicios
+
+
+# ---------------- medición ---------------- #
+def _medir(fn, path: str, repeticiones: int) -> float:
+    """Mejor tiempo (segundos) de `repeticiones` corridas."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn(path)
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark antes/después de parsear_latex")
+    parser.add_argument("-n", type=int, default=100_000, help="cantidad de ejercicios sintéticos")
+    parser.add_argument("-r", "--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = escribir_banco(os.path.join(tmp, "banco.tex"), args.n)
+        tam_mb = os.path.getsize(path) / 1e6
+
+        antes = parsear_latex_legacy(path)
+        despues = parsear_latex(path)
+        if antes != despues:
+            raise SystemExit("❌ Las salidas difieren: el parser nuevo no es equivalente")
+
+        t_antes = _medir(parsear_latex_legacy, path, args.repeticiones)
+        t_despues = _medir(parsear_latex, path, args.repeticiones)
+
+    print(f"Banco sintético: {args.n} ejercicios, {tam_mb:.1f} MB (salidas idénticas)")
+    print(f"  antes   : {t_antes:8.3f} s  ({args.n / t_antes:,.0f} ej/s)")
+    print(f"  después : {t_despues:8.3f} s  ({args.n / t_despues:,.0f} ej/s)")
+    print(f"  speedup : {t_antes / t_despues:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
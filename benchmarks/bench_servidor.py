@@ -0,0 +1,182 @@
+"""
+Benchmark de carga del servicio HTTP/JSON local (servidor.py).
+
+Levanta el servidor en este proceso sobre una copia temporal de
+db/EDO_DB.db con un banco sintético (nunca toca la base real) y abre
+--clientes conexiones concurrentes desde localhost. Cada una hace
+--pedidos pedidos con keep-alive, mezclando:
+  - páginas de /ejercicios (limite=20 desde un id al azar)
+  - /ejercicios/ID
+  - /buscar y /estadisticas
+  - revalidaciones con If-None-Match (304)
+Al final descarga el banco entero en NDJSON, registra un lote (una escritura)
+y comprueba que los ETag anteriores dejaron de valer.
+
+Reporta pedidos/s, latencia p50/p99, aciertos de caché y cuántas conexiones
+SQLite abrió el servidor (deben ser a lo sumo --hilos).
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_servidor
+    python -m benchmarks.bench_servidor -n 10000 -c 300 -p 50 --hilos 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from benchmarks.synthetic import escribir_banco
+from db import repository
+from latex_parser import parsear_latex
+from services.exercise_service import agregar_ejercicios
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_ESQUEMA = os.path.join(RAIZ, "db", "EDO_DB.db")
+BUSQUEDAS = ("exactas", "e^{x}", "Bernoulli", "\\sin y", "separables")
+
+
+async def pedir(lector, escritor, metodo: str, destino: str, encabezados: Optional[Dict[str, str]] = None,
+                cuerpo: bytes = b"") -> Tuple[int, Dict[str, str], bytes]:
+    """Un pedido HTTP/1.1 por una conexión abierta: (estado, encabezados, cuerpo)."""
+    lineas = [f"{metodo} {destino} HTTP/1.1", "Host: localhost", f"Content-Length: {len(cuerpo)}"]
+    lineas += [f"{k}: {v}" for k, v in (encabezados or {}).items()]
+    escritor.write(("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1") + cuerpo)
+    await escritor.drain()
+
+    cabecera = (await lector.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    estado = int(cabecera[0].split(" ")[1])
+    recibidos = {}
+    for linea in cabecera[1:]:
+        if linea:
+            nombre, _, valor = linea.partition(":")
+            recibidos[nombre.strip().lower()] = valor.strip()
+    if recibidos.get('transfer-encoding') == "chunked":
+        partes = []
+        while True:
+            largo = int((await lector.readline()).strip(), 16)
+            if largo == 0:
+                await lector.readline()
+                break
+            partes.append(await lector.readexactly(largo))
+            await lector.readline()
+        return estado, recibidos, b"".join(partes)
+    largo = int(recibidos.get('content-length', 0))
+    return estado, recibidos, (await lector.readexactly(largo) if largo else b"")
+
+
+async def cliente(puerto: int, pedidos: int, ids: List[int], rng: random.Random,
+                  latencias: List[float], estados: Dict[int, int]):
+    lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+    etags: Dict[str, str] = {}
+    try:
+        for _ in range(pedidos):
+            sorteo = rng.random()
+            if sorteo < 0.4:
+                destino = f"/ejercicios?limite=20&despues_de={rng.choice(ids)}"
+            elif sorteo < 0.7:
+                destino = f"/ejercicios/{rng.choice(ids)}"
+            elif sorteo < 0.9:
+                destino = f"/buscar?q={quote(rng.choice(BUSQUEDAS))}&limite=20"
+            else:
+                destino = "/estadisticas"
+            # la mitad de las veces se revalida lo que ya se tiene
+            encabezados = {'If-None-Match': etags[destino]} if destino in etags and rng.random() < 0.5 else None
+            t0 = time.perf_counter()
+            estado, recibidos, _ = await pedir(lector, escritor, "GET", destino, encabezados)
+            latencias.append(time.perf_counter() - t0)
+            estados[estado] = estados.get(estado, 0) + 1
+            if 'etag' in recibidos:
+                etags[destino] = recibidos['etag']
+    finally:
+        escritor.close()
+
+
+async def correr(puerto: int, clientes: int, pedidos: int, hilos: int, ids: List[int]) -> Dict:
+    import servidor
+
+    servidor_tcp, estado_servidor = await servidor.iniciar("127.0.0.1", puerto, hilos)
+    puerto = servidor_tcp.sockets[0].getsockname()[1]
+    latencias: List[float] = []
+    estados: Dict[int, int] = {}
+    try:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(cliente(puerto, pedidos, ids, random.Random(i), latencias, estados)
+                               for i in range(clientes)))
+        total = time.perf_counter() - t0
+
+        lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+        t1 = time.perf_counter()
+        estado, recibidos, cuerpo = await pedir(lector, escritor, "GET", "/ejercicios")
+        ndjson = time.perf_counter() - t1
+        lineas = cuerpo.count(b"\n")
+        etag = recibidos['etag']
+        _, _, previo = await pedir(lector, escritor, "GET", "/estadisticas")
+
+        # una escritura (registrar un lote) invalida todo lo anterior
+        lote = json.dumps({'ejercicios': 5, 'estudiantes': 3, 'semestre': "bench", 'registrar': True}).encode()
+        estado_lote, _, _ = await pedir(lector, escritor, "POST", "/practicas", {'Content-Type': "application/json"}, lote)
+        revalidado, _, _ = await pedir(lector, escritor, "GET", "/ejercicios", {'If-None-Match': etag})
+        _, _, posterior = await pedir(lector, escritor, "GET", "/estadisticas")
+        escritor.close()
+    finally:
+        servidor_tcp.close()
+        await servidor_tcp.wait_closed()
+        estado_servidor.cerrar()
+
+    return {
+        'total_s': total,
+        'pedidos': len(latencias),
+        'latencias': sorted(latencias),
+        'estados': estados,
+        'contadores': estado_servidor.contadores,
+        'conexiones_sqlite': len(repository._abiertas),
+        'ndjson': (estado, lineas, ndjson),
+        'invalidacion': (estado_lote, revalidado,
+                         json.loads(previo)['asignaciones'], json.loads(posterior)['asignaciones']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga del servicio HTTP/JSON local")
+    parser.add_argument("-n", "--ejercicios", type=int, default=10_000, help="tamaño del banco sintético")
+    parser.add_argument("-c", "--clientes", type=int, default=200, help="conexiones concurrentes")
+    parser.add_argument("-p", "--pedidos", type=int, default=25, help="pedidos por conexión")
+    parser.add_argument("--hilos", type=int, default=8, help="hilos de DB del servidor")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "EDO_DB.db")
+        shutil.copyfile(DB_ESQUEMA, db)
+        repository.configurar(db)
+        agregar_ejercicios(parsear_latex(escribir_banco(os.path.join(tmp, "banco.tex"), args.ejercicios)))
+        ids = list(repository.read_ids_ejercicios())
+        repository.cerrar_conexiones()
+
+        r = asyncio.run(correr(0, args.clientes, args.pedidos, args.hilos, ids))
+
+    latencias = r['latencias']
+    print(f"\n{r['pedidos']} pedidos, {args.clientes} conexiones concurrentes, {args.hilos} hilos de DB, "
+          f"banco de {args.ejercicios} ejercicios")
+    print(f"  pedidos/s                {r['pedidos'] / r['total_s']:10.0f}")
+    print(f"  latencia p50             {statistics.median(latencias) * 1000:10.2f} ms")
+    print(f"  latencia p99             {latencias[int(len(latencias) * 0.99) - 1] * 1000:10.2f} ms")
+    print(f"  estados                  {dict(sorted(r['estados'].items()))}")
+    print(f"  servidor                 {r['contadores']}")
+    print(f"  conexiones SQLite        {r['conexiones_sqlite']:10d}")
+    estado, lineas, segundos = r['ndjson']
+    print(f"  NDJSON completo          {estado} · {lineas} ejercicios en {segundos * 1000:.1f} ms")
+    estado_lote, revalidado, antes, despues = r['invalidacion']
+    print(f"  escritura (POST lote)    {estado_lote} · asignaciones {antes} -> {despues} · "
+          f"If-None-Match viejo -> {revalidado}")
+    if r['conexiones_sqlite'] > args.hilos or revalidado != 200 or despues <= antes:
+        raise SystemExit("❌ el servidor abrió más conexiones que hilos o no invalidó la caché")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark de snapshots binarios del banco (services/snapshot_service.py).
+
+Sobre copias temporales de db/EDO_DB.db (nunca toca la base real):
+  1. arma un banco sintético de -n ejercicios con un semestre y un lote de
+     prácticas registrado;
+  2. exporta el snapshot y compara su tamaño con el de la DB;
+  3. lo restaura en una DB vacía (reemplazo, una transacción) y comprueba que
+     los conteos, la búsqueda FTS y el historial coinciden;
+  4. lo fusiona con otra DB que ya tiene parte del banco (dedup por huella) y
+     vuelve a fusionarlo para comprobar que no duplica nada;
+  5. daña un byte y comprueba que la restauración lo rechaza sin tocar la DB.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_snapshot              # 100k ejercicios
+    python -m benchmarks.bench_snapshot -n 20000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import escribir_banco
+from db import repository
+from latex_parser import iter_ejercicios
+from services import practice_service, snapshot_service
+from services.exercise_service import agregar_ejercicios
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_ESQUEMA = os.path.join(RAIZ, "db", "EDO_DB.db")
+
+
+def _db_nueva(tmp: str, nombre: str) -> str:
+    ruta = os.path.join(tmp, nombre)
+    shutil.copyfile(DB_ESQUEMA, ruta)
+    repository.cerrar_conexiones()
+    repository.configurar(ruta)
+    return ruta
+
+
+def _cargar(tmp: str, n: int, seed: int):
+    banco = escribir_banco(os.path.join(tmp, f"banco_{seed}.tex"), n, seed)
+    agregar_ejercicios(iter_ejercicios(banco))
+
+
+def _estado() -> dict:
+    estadisticas = repository.read_estadisticas()
+    return {
+        'ejercicios': estadisticas['ejercicios'],
+        'asignaciones': estadisticas['asignaciones'],
+        'semestres': estadisticas['semestres'],
+        'fts': len(repository.read_ids_fts("Bernoulli OR exactas OR sin")),
+        'historial': [(r['nombre'], r['asignaciones']) for r in repository.read_resumen_semestres()],
+    }
+
+
+def _medir(funcion, *args, **kwargs):
+    t0 = time.perf_counter()
+    resultado = funcion(*args, **kwargs)
+    return resultado, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de snapshots binarios del banco")
+    parser.add_argument("-n", "--ejercicios", type=int, default=100_000, help="tamaño del banco sintético")
+    parser.add_argument("-e", "--estudiantes", type=int, default=200, help="prácticas del lote registrado")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        origen = _db_nueva(tmp, "origen.db")
+        print(f"Armando banco de {args.ejercicios} ejercicios...")
+        _cargar(tmp, args.ejercicios, seed=0)
+        semestre_id = repository.create_semestre("bench")
+        practice_service.generar_lote(args.estudiantes, 10, "bench", semestre_id, workers=1)
+        esperado = _estado()
+        with repository.conexion() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        bytes_db = os.path.getsize(origen)
+
+        snapshot = os.path.join(tmp, "banco.snap")
+        exportado, t_exportar = _medir(snapshot_service.exportar, snapshot)
+
+        _db_nueva(tmp, "restaurada.db")
+        restaurado, t_restaurar = _medir(snapshot_service.restaurar, snapshot)
+        obtenido = _estado()
+
+        _db_nueva(tmp, "fusion.db")
+        _cargar(tmp, args.ejercicios // 2, seed=1)
+        fusion, t_fusionar = _medir(snapshot_service.restaurar, snapshot, fusionar=True)
+        refusion, t_refusionar = _medir(snapshot_service.restaurar, snapshot, fusionar=True)
+
+        dañado = os.path.join(tmp, "dañado.snap")
+        with open(snapshot, "rb") as f:
+            datos = bytearray(f.read())
+        datos[len(datos) // 2] ^= 0xFF
+        with open(dañado, "wb") as f:
+            f.write(datos)
+        antes = repository.read_estadisticas()['ejercicios']
+        try:
+            snapshot_service.restaurar(dañado)
+            rechazado = False
+        except snapshot_service.SnapshotInvalido:
+            rechazado = True
+        intacta = repository.read_estadisticas()['ejercicios'] == antes
+        repository.cerrar_conexiones()
+
+    print(f"\nfilas                    {exportado['filas']}")
+    print(f"  DB (sin WAL)             {bytes_db / 1e6:10.1f} MB")
+    print(f"  snapshot                 {exportado['bytes'] / 1e6:10.1f} MB "
+          f"({exportado['bytes_sin_comprimir'] / 1e6:.1f} MB sin comprimir)")
+    print(f"  exportar                 {t_exportar:10.2f} s")
+    print(f"  restaurar (reemplazo)    {t_restaurar:10.2f} s   {restaurado}")
+    print(f"  fusionar                 {t_fusionar:10.2f} s   {fusion}")
+    print(f"  fusionar otra vez        {t_refusionar:10.2f} s   {refusion}")
+    print(f"  snapshot dañado          {'rechazado' if rechazado else 'ACEPTADO'}, "
+          f"DB {'intacta' if intacta else 'MODIFICADA'}")
+    if obtenido != esperado:
+        print(f"  esperado {esperado}\n  obtenido {obtenido}")
+    if (obtenido != esperado or not rechazado or not intacta
+            or refusion['ejercicios'] or refusion['ejercicios_reactivados']
+            or refusion['asignaciones'] or refusion['semestres']):
+        raise SystemExit("❌ la restauración no reproduce el banco o la fusión duplicó filas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark de arranque de la CLI no interactiva (python -m cli).
+
+Lanza cada comando en un proceso nuevo varias veces y reporta mínimo y mediana
+del tiempo de pared contra el objetivo (100 ms). Como referencia mide también
+`python -c pass` (el piso del intérprete) y, si rich está instalado, el import
+del menú interactivo (main.py). Con --importtime muestra los módulos que más
+tardan en importarse para un comando (python -X importtime).
+
+Los comandos corren contra una copia temporal de db/EDO_DB.db: nunca tocan la
+base real.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup -r 20 --importtime stats
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence
+
+OBJETIVO_MS = 100.0
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_ORIGINAL = os.path.join(RAIZ, "db", "EDO_DB.db")
+
+
+def _medir(argv: Sequence[str], repeticiones: int, entorno: Dict[str, str],
+           codigos_validos: Sequence[int] = (0, 1)) -> Optional[List[float]]:
+    """Tiempos (ms) de `repeticiones` ejecuciones en frío; None si el comando falla."""
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        r = subprocess.run(argv, cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+        if r.returncode not in codigos_validos:
+            return None
+    return tiempos
+
+
+def _importtime(argv: Sequence[str], entorno: Dict[str, str], top: int = 15) -> List[str]:
+    """Las `top` líneas de -X importtime con mayor tiempo acumulado."""
+    r = subprocess.run([sys.executable, "-X", "importtime", *argv[1:]], cwd=RAIZ, env=entorno,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    filas = []
+    for linea in r.stderr.splitlines():
+        partes = linea.split("|")
+        if len(partes) == 3 and partes[1].strip().isdigit():
+            filas.append((int(partes[1]), partes[2].rstrip()))
+    filas.sort(reverse=True)
+    return [f"{us / 1000:8.1f} ms  {modulo}" for us, modulo in filas[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de python -m cli")
+    parser.add_argument("-r", "--repeticiones", type=int, default=10)
+    parser.add_argument("--importtime", metavar="COMANDO", default=None,
+                        help="mostrar los imports más lentos de ese comando (p. ej. stats)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        entorno = dict(os.environ, EDO_DB_PATH=os.path.join(tmp, "EDO_DB.db"))
+        shutil.copyfile(DB_ORIGINAL, entorno['EDO_DB_PATH'])
+
+        casos = [
+            ("python -c pass (piso)", [sys.executable, "-c", "pass"], False),
+            ("cli --help", [sys.executable, "-m", "cli", "--help"], True),
+            ("cli stats", [sys.executable, "-m", "cli", "stats"], True),
+            ("cli search", [sys.executable, "-m", "cli", "search", "exactas"], True),
+            ("cli generate -n 10", [sys.executable, "-m", "cli", "generate", "-n", "10", "-s", "1"], True),
+            ("import main (menú)", [sys.executable, "-c", "import main"], False),
+        ]
+        # ingesta previa de data/ (así stats/search/generate trabajan sobre el banco
+        # real) que además deja creado el esquema y el caché de bytecode
+        subprocess.run([sys.executable, "-m", "cli", "ingest"], cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        print(f"Arranque en frío ({args.repeticiones} ejecuciones, objetivo < {OBJETIVO_MS:.0f} ms)")
+        for nombre, argv, con_objetivo in casos:
+            tiempos = _medir(argv, args.repeticiones, entorno, (0, 1) if con_objetivo else (0,))
+            if tiempos is None:
+                print(f"  {nombre:22s}  (no disponible)")
+                continue
+            mediana = statistics.median(tiempos)
+            marca = ("✅" if mediana < OBJETIVO_MS else "❌") if con_objetivo else "  "
+            print(f"  {nombre:22s}  min {min(tiempos):7.1f} ms   mediana {mediana:7.1f} ms  {marca}")
+
+        if args.importtime:
+            print(f"\nImports más lentos de `cli {args.importtime}` (acumulado):")
+            for linea in _importtime([sys.executable, "-m", "cli", *args.importtime.split()], entorno):
+                print("  " + linea)
+
+
+if __name__ == "__main__":
+    main()
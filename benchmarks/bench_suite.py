@@ -0,0 +1,209 @@
+"""
+Suite de benchmarks de los caminos críticos: parser, repositorio y servicios.
+
+Para cada tamaño genera un banco sintético en el estándar de data/main.tex
+(benchmarks/synthetic.py: secciones, subsecciones y condiciones inline con
+\\quad) y, contra una DB SQLite temporal (copia del esquema de db/EDO_DB.db),
+mide:
+  - parsear_latex             parseo del archivo completo
+  - agregar_ejercicios        inserción (con índice MinHash y huellas)
+  - precalentar_expresiones   parseo SymPy de las fórmulas insertadas (con SymPy
+                              instalado; en la ingesta corre en segundo plano)
+  - read_ejercicios/*         listados con filtros, prefijos, patrones, cursor y conteo
+  - dedup/*                   búsqueda de duplicados exactos (huella) y casi-duplicados (LSH)
+
+Cada corrida se agrega a un historial JSON (benchmarks/historial.json por
+defecto) con el commit, y se compara contra la corrida anterior del mismo
+tamaño: los casos que empeoran más que --umbral se marcan como regresión.
+Toda optimización se mide con esta suite antes y después.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_suite                       # 1k, 10k y 100k
+    python -m benchmarks.bench_suite -n 1000 10000 -r 5
+    python -m benchmarks.bench_suite -n 10000 --sin-historial
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic import escribir_banco
+from db import repository
+from latex_parser import parsear_latex
+from services import dedup_service, expression_service
+from services.exercise_service import agregar_ejercicios
+
+TAMANOS = (1_000, 10_000, 100_000)
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_ESQUEMA = os.path.join(RAIZ, "db", "EDO_DB.db")
+HISTORIAL = os.path.join(RAIZ, "benchmarks", "historial.json")
+# enunciados consultados en los casos de dedup
+CONSULTAS_DEDUP = 200
+# diferencias menores que esto (s) son ruido de medición, no regresiones
+RUIDO_S = 0.001
+
+
+def _medir(funcion: Callable[[], object], repeticiones: int) -> float:
+    """Mejor tiempo (s) de `repeticiones` ejecuciones."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def _commit() -> Optional[str]:
+    try:
+        r = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                           capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return r.stdout.strip() or None
+
+
+# ----------------- CASOS ----------------- #
+def _casos_consultas(n: int, repeticiones: int) -> Dict[str, float]:
+    medio = n // 2
+    consultas = {
+        'read_ejercicios/todos': lambda: repository.read_ejercicios(),
+        'read_ejercicios/filtro_tema': lambda: repository.read_ejercicios(filtros={'tema': "Tema sintético"}),
+        'read_ejercicios/prefijo_subtema': lambda: repository.read_ejercicios(prefijos={'subtema': "Sección 1"}),
+        'read_ejercicios/patron_subtema': lambda: repository.read_ejercicios(patrones={'subtema': "%Subsección%"}),
+        'read_ejercicios/pagina_cursor': lambda: repository.read_ejercicios(despues_de=medio, limite=20),
+        'count_ejercicios/prefijo_subtema': lambda: repository.count_ejercicios(prefijos={'subtema': "Sección"}),
+    }
+    return {nombre: _medir(f, repeticiones) for nombre, f in consultas.items()}
+
+
+def _casos_dedup(ejercicios: List[Dict], repeticiones: int) -> Dict[str, float]:
+    paso = max(1, len(ejercicios) // CONSULTAS_DEDUP)
+    existentes = [ej['enunciado'] for ej in ejercicios[::paso]][:CONSULTAS_DEDUP]
+    nuevos = [e + " + 1" for e in existentes]
+    return {
+        'dedup/huella_existentes': _medir(
+            lambda: [repository.exists_ejercicio_por_enunciado(e) for e in existentes], repeticiones),
+        'dedup/huella_nuevos': _medir(
+            lambda: [repository.exists_ejercicio_por_enunciado(e) for e in nuevos], repeticiones),
+        'dedup/lsh_lote': _medir(lambda: dedup_service.buscar_similares_lote(nuevos), repeticiones),
+    }
+
+
+def correr(n: int, repeticiones: int) -> Dict[str, float]:
+    """Tiempos (s) de todos los casos para un banco de n ejercicios."""
+    resultados: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = escribir_banco(os.path.join(tmp, "banco.tex"), n)
+        db = os.path.join(tmp, "EDO_DB.db")
+        shutil.copyfile(DB_ESQUEMA, db)
+        anterior = repository.DB_PATH
+        repository.configurar(db)
+        try:
+            resultados['parsear_latex'] = _medir(lambda: parsear_latex(ruta), repeticiones)
+            ejercicios = parsear_latex(ruta)
+
+            # el precalentado (en segundo plano en la ingesta) se mide aparte
+            precalentar = expression_service.PRECALENTAR_EN_INGESTA
+            expression_service.PRECALENTAR_EN_INGESTA = False
+            try:
+                t0 = time.perf_counter()
+                agregados, _, _ = agregar_ejercicios(ejercicios)
+                resultados['agregar_ejercicios'] = time.perf_counter() - t0
+            finally:
+                expression_service.PRECALENTAR_EN_INGESTA = precalentar
+            if agregados != n:
+                raise SystemExit(f"❌ Se esperaban {n} ejercicios agregados y se agregaron {agregados}")
+            if expression_service.sympy_disponible():
+                t0 = time.perf_counter()
+                expression_service.precalentar(f for ej in ejercicios for f in expression_service.formulas_ejercicio(ej))
+                resultados['precalentar_expresiones'] = time.perf_counter() - t0
+
+            resultados.update(_casos_consultas(n, repeticiones))
+            resultados.update(_casos_dedup(ejercicios, repeticiones))
+        finally:
+            repository.cerrar_conexiones()
+            repository.configurar(anterior)
+    return resultados
+
+
+# ----------------- HISTORIAL ----------------- #
+def leer_historial(ruta: str) -> List[Dict]:
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def guardar_historial(ruta: str, historial: List[Dict]):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(historial, f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    os.replace(temporal, ruta)
+
+
+def anterior_para(historial: List[Dict], n: int) -> Optional[Dict]:
+    """La última corrida registrada que incluye el tamaño n."""
+    for corrida in reversed(historial):
+        if str(n) in corrida['resultados']:
+            return corrida
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de parser, repositorio y servicios")
+    parser.add_argument("-n", "--tamanos", type=int, nargs="+", default=list(TAMANOS),
+                        help="cantidades de ejercicios de los bancos sintéticos")
+    parser.add_argument("-r", "--repeticiones", type=int, default=3)
+    parser.add_argument("--historial", default=HISTORIAL, help="archivo JSON del historial")
+    parser.add_argument("--sin-historial", action="store_true", help="no registrar la corrida")
+    parser.add_argument("--umbral", type=float, default=1.2,
+                        help="factor de empeoramiento que se marca como regresión (1.2 = +20%%)")
+    args = parser.parse_args()
+
+    historial = leer_historial(args.historial)
+    corrida = {
+        'fecha': datetime.now().isoformat(timespec="seconds"),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'sympy': expression_service.sympy_disponible(),
+        'repeticiones': args.repeticiones,
+        'resultados': {},
+    }
+
+    regresiones = 0
+    for n in args.tamanos:
+        resultados = correr(n, args.repeticiones)
+        corrida['resultados'][str(n)] = resultados
+        previa = anterior_para(historial, n)
+        base = previa['resultados'][str(n)] if previa else {}
+
+        print(f"\nBanco sintético de {n} ejercicios"
+              + (f" (vs {previa['commit'] or previa['fecha']})" if previa else ""))
+        for caso, segundos in resultados.items():
+            linea = f"  {caso:34s} {segundos * 1000:10.2f} ms"
+            if caso in base and base[caso] > 0:
+                factor = segundos / base[caso]
+                marca = "❌ regresión" if factor > args.umbral and segundos - base[caso] > RUIDO_S else ""
+                regresiones += bool(marca)
+                linea += f"   {factor:5.2f}x {marca}"
+            print(linea)
+
+    if not args.sin_historial:
+        historial.append(corrida)
+        guardar_historial(args.historial, historial)
+        print(f"\nCorrida registrada en {os.path.relpath(args.historial)}")
+    if regresiones:
+        raise SystemExit(f"{regresiones} casos empeoraron más de {args.umbral:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
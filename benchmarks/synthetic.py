@@ -0,0 +1,155 @@
+"""
+Generador de bancos sintéticos en el estándar de data/main.tex.
+
+Produce documentos con \\maketitle, una \\section de tema, secciones/subsecciones
+de subtema y ejercicios EXERCISE_START/END con condiciones inline (", \\quad ...").
+Los enunciados salen de varias familias de EDO (exactas, Bernoulli, lineales,
+separables, de segundo orden, Cauchy-Euler) con coeficientes, funciones y
+cantidad de sumandos al azar; sólo una fracción controlada
+(FRACCION_SIMILARES) son casi-duplicados de otro enunciado del banco. Todos
+los enunciados son distintos (huellas únicas).
+Es determinista: el mismo (n, seed) produce siempre el mismo texto.
+"""
+import random
+from typing import Iterator
+
+_PREAMBULO = r"""\documentclass{article}
+\usepackage[utf8]{inputenc}
+\usepackage{amsmath,amssymb}
+
+\title{Banco sintético}
+\author{bench}
+\date{}
+
+\begin{document}
+\maketitle
+
+"""
+
+# fracción de casi-duplicados: copias de un enunciado reciente con los sumandos
+# reordenados o un término de más (el resto son enunciados independientes)
+FRACCION_SIMILARES = 0.05
+# fracción de ejercicios cuyo contenido depende sólo de su posición: dos bancos
+# con distinta semilla comparten ~COMPARTIDA² de sus ejercicios (fusiones)
+COMPARTIDA = 0.5
+_RECIENTES = 200      # enunciados recientes candidatos a copiarse
+
+_FUNCIONES = [r"\sin {v}", r"\cos {v}", r"e^{{{v}}}", r"e^{{{c}{v}}}", r"\ln {v}", r"\tan {v}",
+              r"\sqrt{{{v}}}", r"\frac{{1}}{{{v}}}", r"{v}^{{{p}}}", r"\sinh {v}", r"\arctan {v}"]
+_CONDICIONES = [r"y(0) = {c}", r"y({c}) = {d}", r"y'(0) = {c}", r"y\!\left(\frac{{\pi}}{{{c}}}\right) = \frac{{\pi}}{{{d}}}"]
+_RESPUESTAS = [r"x^{p} y + x\sin y = C", r"y = C e^{{{c}x}}", r"y = \frac{{{c}}}{{x^{p} + C}}",
+               r"{c} \sin {p}y - {d} \cos {p}x = C", r"y = C_1 e^{{{c}x}} + C_2 e^{{-{p}x}}"]
+
+
+def _termino(rnd: random.Random, v: str, otras: str = "") -> str:
+    """Un sumando: coeficiente, potencia de la variable y a veces una función."""
+    partes = []
+    c = rnd.randint(1, 40)
+    if c > 1:
+        partes.append(str(c))
+    if rnd.random() < 0.6:
+        p = rnd.randint(1, 5)
+        partes.append(v if p == 1 else f"{v}^{{{p}}}")
+    if rnd.random() < 0.6 or not partes:
+        f = rnd.choice(_FUNCIONES)
+        partes.append(f.format(v=rnd.choice(v + otras), c=rnd.randint(2, 9), p=rnd.randint(2, 6)))
+    return " ".join(partes)
+
+
+def _suma(rnd: random.Random, v: str, minimo: int = 1, maximo: int = 3, otras: str = "") -> str:
+    texto = _termino(rnd, v, otras)
+    for _ in range(rnd.randint(minimo, maximo) - 1):
+        texto += f" {rnd.choice('+-')} {_termino(rnd, v, otras)}"
+    return texto
+
+
+def _enunciado(rnd: random.Random, unico: int) -> str:
+    """Un enunciado de EDO de alguna de varias familias; `unico` lo distingue de cualquier otro."""
+    familia = rnd.randrange(6)
+    if familia == 0:    # exacta / forma diferencial
+        return rf"({unico}xy + {_suma(rnd, 'x', otras='y')})\,dx + ({_suma(rnd, 'y', otras='x')})\,dy = 0"
+    if familia == 1:    # Bernoulli
+        return rf"y' + ({_suma(rnd, 'x', 1, 2)}) y = ({_suma(rnd, 'x', 1, 2)} + {unico}) y^{{{rnd.randint(2, 5)}}}"
+    if familia == 2:    # lineal de primer orden
+        return rf"\frac{{dy}}{{dx}} + ({_suma(rnd, 'x', 1, 2)}) y = {_suma(rnd, 'x')} + {unico}"
+    if familia == 3:    # variables separables
+        return rf"({_suma(rnd, 'x', 1, 2)})\,\frac{{dy}}{{dx}} = {unico} ({_suma(rnd, 'y', 1, 2)})"
+    if familia == 4:    # segundo orden, coeficientes constantes
+        return (rf"{rnd.randint(1, 9)}y'' {rnd.choice('+-')} {rnd.randint(1, 20)}y' {rnd.choice('+-')} "
+                rf"{rnd.randint(1, 20)}y = {_suma(rnd, 'x', 2, 4)} + {unico}")
+    # Cauchy-Euler
+    return (rf"{rnd.randint(1, 9)} t^{{2}} y'' {rnd.choice('+-')} {rnd.randint(1, 20)} t y' "
+            rf"{rnd.choice('+-')} {rnd.randint(1, 20)} y = {_suma(rnd, 't', 2, 4)} + {unico}")
+
+
+def _casi_duplicado(rnd: random.Random, original: str, unico: int) -> str:
+    """Variante de `original`: los sumandos de la izquierda en otro orden y un término de más."""
+    izquierda, igual, derecha = original.partition(" = ")
+    sumandos = _sumandos(izquierda)
+    if len(sumandos) > 1 and rnd.random() < 0.5:
+        sumandos.reverse()
+        return f"{' + '.join(sumandos)}{igual}{derecha} + {unico}"
+    return f"{izquierda}{igual}{derecha} + {unico}"
+
+
+def _sumandos(expresion: str) -> list:
+    """Partes de la expresión separadas por " + " fuera de paréntesis y llaves."""
+    partes, nivel, inicio = [], 0, 0
+    for i, ch in enumerate(expresion):
+        nivel += (ch in "({") - (ch in ")}")
+        if nivel == 0 and expresion.startswith(" + ", i):
+            partes.append(expresion[inicio:i])
+            inicio = i + 3
+    return partes + [expresion[inicio:]]
+
+
+def iter_banco(n: int, seed: int = 0, por_seccion: int = 50,
+               fraccion_similares: float = FRACCION_SIMILARES) -> Iterator[str]:
+    """Genera el banco por fragmentos (útil para escribir archivos grandes sin armarlos en memoria)."""
+    rnd = random.Random(seed)
+    recientes = []
+    yield _PREAMBULO
+    yield "\\section{Tema sintético}\n\n"
+    for i in range(1, n + 1):
+        if i % por_seccion == 1:
+            bloque = (i // por_seccion) + 1
+            if bloque % 2:
+                yield f"\\section*{{Sección {bloque}}}\n\n"
+            else:
+                yield f"\\subsection{{Subsección {bloque}}}\n\n"
+        # contenido propio del ejercicio: de la posición (compartido entre semillas) o de la semilla
+        ej = random.Random(i if rnd.random() < COMPARTIDA else ((seed + 1) << 32) | i)
+        if recientes and ej.random() < fraccion_similares:
+            enunciado = _casi_duplicado(ej, ej.choice(recientes), i)
+        else:
+            enunciado = _enunciado(ej, i)
+            recientes.append(enunciado)
+            if len(recientes) > _RECIENTES:
+                recientes.pop(0)
+        if ej.random() < 0.4:
+            enunciado += ", \\quad " + ej.choice(_CONDICIONES).format(c=ej.randint(1, 9), d=ej.randint(1, 9))
+        respuesta = ej.choice(_RESPUESTAS).format(c=ej.randint(1, 9), d=ej.randint(1, 9), p=ej.randint(2, 5))
+        yield (
+            "%% EXERCISE_START\n"
+            f"% id: {i}\n"
+            f"{i})\n"
+            f"\\[\n{enunciado}\n\\]\n"
+            f"\\[\n{respuesta}\n\\]\n"
+            "%% EXERCISE_END\n\n\\vspace{8pt}\n\n"
+        )
+    yield "\\end{document}\n"
+
+
+def generar_banco(n: int, seed: int = 0, por_seccion: int = 50,
+                  fraccion_similares: float = FRACCION_SIMILARES) -> str:
+    """Devuelve el banco completo como string."""
+    return "".join(iter_banco(n, seed, por_seccion, fraccion_similares))
+
+
+def escribir_banco(path: str, n: int, seed: int = 0, por_seccion: int = 50,
+                   fraccion_similares: float = FRACCION_SIMILARES) -> str:
+    """Escribe el banco en `path` y devuelve la ruta."""
+    with open(path, "w", encoding="utf-8") as f:
+        for fragmento in iter_banco(n, seed, por_seccion, fraccion_similares):
+            f.write(fragmento)
+    return path
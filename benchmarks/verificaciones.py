@@ -0,0 +1,240 @@
+"""
+Verificaciones de comportamiento sobre una DB SQLite temporal (copia del
+esquema de db/EDO_DB.db; la DB real no se toca). Complementan a la suite de
+benchmarks: cada caso arma su escenario mínimo y termina con SystemExit ante
+la primera discrepancia.
+  - casi_duplicados   el par de enunciados que sólo difieren en el orden de
+                      los sumandos se marca como casi-duplicado al agregarse
+  - historial         los reportes de historial (agregados uso_*) coinciden con
+                      el join sobre ejercicios_semestre tras asignar, borrar
+                      asignaciones y editar el tema/subtema de un ejercicio
+  - lectura_catalogo  read_catalogo / read_tablas_snapshot no confirman una
+                      transacción abierta en la conexión del hilo
+  - practica_suelta   POST /practicas sin "estudiantes" respeta "semestre" y
+                      "registrar" (no repite lo usado y queda asignada)
+  - arbol_cacheado    la caché de expresiones reconstruye el mismo árbol y un
+                      blob ajeno en la tabla expresiones no ejecuta nada (SymPy)
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.verificaciones
+    python -m benchmarks.verificaciones -c casi_duplicados
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+from db import repository
+from services import dedup_service, expression_service
+from services.exercise_service import agregar_ejercicios
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_ESQUEMA = os.path.join(RAIZ, "db", "EDO_DB.db")
+
+# mismo enunciado con los sumandos en otro orden (y \, de más)
+PAR_REORDENADO = (
+    r"Resolver $(2xy + \sin y)\,dx + (x^2 + x\cos y)\,dy = 0$",
+    r"Resolver $(\sin y + 2xy)dx + (x\cos y + x^2)dy = 0$",
+)
+
+
+@contextmanager
+def db_temporal():
+    """Copia vacía del esquema, configurada como DB del proceso mientras dura el bloque."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "EDO_DB.db")
+        shutil.copyfile(DB_ESQUEMA, db)
+        anterior = repository.DB_PATH
+        repository.configurar(db)
+        precalentar = expression_service.PRECALENTAR_EN_INGESTA
+        expression_service.PRECALENTAR_EN_INGESTA = False
+        try:
+            yield db
+        finally:
+            expression_service.PRECALENTAR_EN_INGESTA = precalentar
+            repository.cerrar_conexiones()
+            repository.configurar(anterior)
+
+
+def _ejercicio(numero, enunciado, tema="Exactas"):
+    return {'numero': numero, 'tema': tema, 'subtema': None, 'enunciado': enunciado,
+            'respuesta': None, 'condiciones': None, 'archivo_origen': "verificaciones.tex"}
+
+
+# ----------------- CASOS ----------------- #
+def verificar_casi_duplicados():
+    a, b = PAR_REORDENADO
+    similitud = dedup_service.similitud(dedup_service.firma_minhash(a), dedup_service.firma_minhash(b))
+    if similitud < dedup_service.UMBRAL:
+        raise SystemExit(f"❌ similitud del par reordenado {similitud:.2f} < {dedup_service.UMBRAL}")
+    with db_temporal():
+        agregar_ejercicios([_ejercicio("1", a)])
+        agregados, _, marcas = agregar_ejercicios([_ejercicio("2", b)])
+        if agregados != 1 or [m['ejercicio']['enunciado'] for m in marcas] != [b]:
+            raise SystemExit(f"❌ agregar_ejercicios no marcó el casi-duplicado: {marcas}")
+        (id_a,) = [r['id'] for r in repository.read_ejercicios(columnas=('id', 'enunciado')) if r['enunciado'] == a]
+        if [i for i, _ in marcas[0]['similares']] != [id_a]:
+            raise SystemExit(f"❌ el casi-duplicado debería apuntar a #{id_a}: {marcas[0]['similares']}")
+    return similitud
+
+
+def _historial_por_join():
+    """Los reportes de historial calculados directamente desde ejercicios_semestre ⋈ ejercicios."""
+    with repository.conexion() as conn:
+        asignaciones = conn.execute("""
+            SELECT es.semestre_id, es.ejercicio_id, COALESCE(e.tema, ''), COALESCE(e.subtema, '')
+            FROM ejercicios_semestre es LEFT JOIN ejercicios e ON e.id = es.ejercicio_id
+        """).fetchall()
+        semestres = conn.execute("SELECT id, nombre, fecha_inicio, fecha_fin FROM semestres ORDER BY id DESC").fetchall()
+        activos = conn.execute("SELECT id, tema, COALESCE(subtema, '') FROM ejercicios WHERE retirado = 0").fetchall()
+    resumen = [
+        {'id': s, 'nombre': nombre, 'fecha_inicio': inicio, 'fecha_fin': fin,
+         'asignaciones': sum(1 for a in asignaciones if a[0] == s),
+         'ejercicios': len({a[1] for a in asignaciones if a[0] == s}),
+         'temas': len({a[2] for a in asignaciones if a[0] == s})}
+        for s, nombre, inicio, fin in semestres
+    ]
+    banco = Counter((tema, subtema) for _, tema, subtema in activos)
+
+    def uso_por_tema(semestre_id):
+        filas = [a for a in asignaciones if semestre_id is None or a[0] == semestre_id]
+        uso = Counter((a[2], a[3]) for a in filas)
+        distintos = Counter((tema, subtema) for _, _, tema, subtema in {(a[0] if semestre_id else 0, *a[1:]) for a in filas})
+        return [{'tema': t, 'subtema': st, 'asignaciones': uso[(t, st)], 'ejercicios': distintos[(t, st)],
+                 'banco': banco[(t, st)]} for t, st in sorted(uso.keys() | banco.keys())]
+
+    semestres_por_ejercicio = Counter(e for _, e in {a[:2] for a in asignaciones})
+    frecuencia = Counter(semestres_por_ejercicio.get(i, 0) for i, _, _ in activos)
+    nunca = Counter((t, st) for i, t, st in activos if i not in semestres_por_ejercicio)
+    return {
+        'resumen_semestres': resumen,
+        'uso_por_tema': {s: uso_por_tema(s) for s in [None] + [fila[0] for fila in semestres]},
+        'frecuencia_reuso': dict(sorted(frecuencia.items())),
+        'nunca_usados_por_tema': sorted((t, st, n) for (t, st), n in nunca.items()),
+    }
+
+
+def _historial_por_reportes(semestre_ids):
+    return {
+        'resumen_semestres': repository.read_resumen_semestres(),
+        'uso_por_tema': {s: repository.read_uso_por_tema(s) for s in [None] + semestre_ids},
+        'frecuencia_reuso': repository.read_frecuencia_reuso(),
+        'nunca_usados_por_tema': [tuple(f) for f in repository.read_nunca_usados_por_tema()],
+    }
+
+
+def verificar_historial():
+    with db_temporal():
+        agregar_ejercicios([_ejercicio(str(i), f"Resolver $y' = {i}x^{i % 3} + y$", tema=f"Tema {i % 3}")
+                            for i in range(1, 13)])
+        ids = [r['id'] for r in repository.read_ejercicios(columnas=('id',))]
+        semestres = [repository.create_semestre(f"2026-{i}") for i in (1, 2)]
+
+        def comparar(paso):
+            esperado = _historial_por_join()
+            obtenido = _historial_por_reportes(sorted(semestres, reverse=True))
+            for reporte, valor in esperado.items():
+                if obtenido[reporte] != valor:
+                    raise SystemExit(f"❌ {reporte} tras {paso}:\n  reporte {obtenido[reporte]}\n  join    {valor}")
+
+        repository.registrar_asignaciones(semestres[0], [ids[:4], ids[2:6], ids[:2]])
+        repository.registrar_asignaciones(semestres[1], [ids[3:8], ids[:3]])
+        comparar("insertar asignaciones")
+        with repository.conexion() as conn:
+            conn.execute("DELETE FROM ejercicios_semestre WHERE semestre_id = ? AND ejercicio_id IN (?, ?)",
+                         (semestres[0], ids[0], ids[3]))
+            conn.commit()
+        comparar("borrar asignaciones")
+        repository.update_ejercicio_por_id(ids[1], {'tema': "Tema 0", 'subtema': "Nuevo"})
+        repository.update_ejercicio_por_id(ids[4], {'subtema': "Nuevo"})
+        repository.update_ejercicio_por_id(ids[2], {'tema': "Tema 9"})
+        comparar("editar tema/subtema")
+        repository.registrar_asignaciones(semestres[1], [ids[1:3]])
+        repository.update_ejercicio_por_id(ids[1], {'tema': "Tema 1", 'subtema': None})
+        comparar("reasignar y volver a editar")
+    return None
+
+
+def verificar_lectura_catalogo():
+    with db_temporal():
+        agregar_ejercicios([_ejercicio("1", "Resolver $y' = y$")])
+        version, filas = repository.read_catalogo()
+        with repository.conexion() as conn:
+            conn.execute("UPDATE ejercicios SET retirado = 1")   # sin commit: la transacción es de "otro"
+            for leer in (repository.read_catalogo, repository.read_tablas_snapshot):
+                leer()
+                if not conn.in_transaction:
+                    raise SystemExit(f"❌ {leer.__name__} confirmó la transacción en curso")
+            if repository.read_catalogo()[1]:
+                raise SystemExit("❌ read_catalogo no leyó dentro de la transacción en curso")
+            conn.rollback()
+        if repository.read_catalogo() != (version, filas):
+            raise SystemExit("❌ el rollback no restauró el catálogo")
+    return None
+
+
+def verificar_practica_suelta():
+    import servidor
+
+    with db_temporal():
+        agregar_ejercicios([_ejercicio(str(i), f"Resolver $y' = {i}x + y$") for i in range(1, 9)])
+        pedido = {'ejercicios': 3, 'semestre': "2026-2", 'registrar': True}
+        primera = [e['id'] for e in servidor._practicas(pedido)['ejercicios']]
+        semestre_id = repository.read_semestre_por_nombre("2026-2")['id']
+        asignadas = sorted(i for ids in repository.read_asignaciones(semestre_id).values() for i in ids)
+        if asignadas != sorted(primera):
+            raise SystemExit(f"❌ la práctica {primera} no quedó registrada: {asignadas}")
+        segunda = [e['id'] for e in servidor._practicas(dict(pedido, registrar=False))['ejercicios']]
+        if set(segunda) & set(primera):
+            raise SystemExit(f"❌ la práctica {segunda} repite ejercicios ya usados en el semestre {primera}")
+        if len(repository.read_asignaciones(semestre_id)) != 1:
+            raise SystemExit("❌ registrar=False guardó la práctica")
+    return None
+
+
+def verificar_arbol_cacheado():
+    if not expression_service.sympy_disponible():
+        return "sin SymPy, omitido"
+    formula = r"(2xy + \sin y)\,dx + (x^2 + x\cos y)\,dy = 0"
+    arbol = expression_service.latex_a_sympy(formula)
+    if expression_service._deserializar(expression_service._serializar(arbol)) != arbol:
+        raise SystemExit("❌ el árbol serializado no se reconstruye igual")
+    with db_temporal() as db:
+        testigo = os.path.join(os.path.dirname(db), "ejecutado")
+        ajeno = f"Symbol(open({testigo!r}, 'w').name)"
+        clave = expression_service.clave_expresion(formula)
+        repository.guardar_expresiones([(clave, zlib.compress(ajeno.encode()), None)])
+        expression_service._memoria.clear()
+        try:
+            if expression_service.expresion(formula) != arbol:
+                raise SystemExit("❌ un blob ajeno reemplazó a la expresión")
+        finally:
+            expression_service._memoria.clear()
+        if os.path.exists(testigo):
+            raise SystemExit("❌ el blob de la tabla expresiones ejecutó código")
+    return None
+
+
+CASOS = {
+    'casi_duplicados': verificar_casi_duplicados,
+    'historial': verificar_historial,
+    'lectura_catalogo': verificar_lectura_catalogo,
+    'practica_suelta': verificar_practica_suelta,
+    'arbol_cacheado': verificar_arbol_cacheado,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verificaciones de comportamiento sobre una DB temporal")
+    parser.add_argument("-c", "--casos", nargs="+", choices=list(CASOS), default=list(CASOS))
+    args = parser.parse_args()
+    for caso in args.casos:
+        detalle = CASOS[caso]()
+        print(f"✅ {caso}" + (f" ({detalle})" if detalle is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
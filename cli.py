@@ -0,0 +1,408 @@
+"""
+Entrada no interactiva (scripts, cron): python -m cli <comando> ...
+
+    python -m cli ingest [RUTAS...] [-j N]       sincroniza data/*.tex (o RUTAS) con la DB
+    python -m cli search "exactas e^{x}" [-n 20]  búsqueda de texto completo
+    python -m cli generate -n 10 [-e 200] [-s SEMILLA] [--registrar] [--instancias]
+    python -m cli export DIR [--semestre NOMBRE | --ids 1,2,3] [--formato md] [--clave] [--pdf] [--instancias]
+    python -m cli stats
+    python -m cli templates [-n 30] [-j N]         completa el pool de instancias de las plantillas paramétricas
+    python -m cli snapshot ARCHIVO                 respaldo binario compacto del banco (services/snapshot_service.py)
+    python -m cli restore ARCHIVO [--fusionar]     restaura (o agrega lo que falta de) un snapshot
+    python -m cli serve [--host H] [--puerto P] [--hilos N] [--vigilar]   servicio HTTP/JSON local (servidor.py)
+    python -m cli watch [DIR] [--espera S]        ingesta automática de los .tex que cambian en data/
+
+Sin banner, sin efectos de tipeo y sin rich: cada comando importa sólo los
+módulos que usa, dentro de su función, para que el arranque sea mínimo
+(ver benchmarks/bench_startup.py). Con --json la salida es JSON; con
+--instrumentar / --perfil RUTA se miden los caminos críticos (instrumentacion.py).
+"""
+import argparse
+import sys
+
+
+def _imprimir_json(datos):
+    import json
+    json.dump(datos, sys.stdout, ensure_ascii=False, indent=2, default=list)
+    sys.stdout.write("\n")
+
+
+def _una_linea(texto) -> str:
+    return " ".join((texto or "").split())
+
+
+def _lista_ids(texto):
+    """type= de --ids: "1,2,3" -> [1, 2, 3]; un id que no es entero es un error de uso."""
+    try:
+        ids = [int(i) for i in texto.split(",") if i.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ids separados por coma (enteros): {texto!r}")
+    if not ids:
+        raise argparse.ArgumentTypeError("lista de ids vacía")
+    return ids
+
+
+# ------------------ COMANDOS ------------------ #
+def cmd_ingest(args) -> int:
+    import os
+    from latex_parser import listar_tex_files
+    from services.ingest_service import sincronizar_archivos
+
+    rutas = args.rutas or [os.path.join("data", f) for f in listar_tex_files("data")]
+    if not rutas:
+        print("No hay archivos .tex para ingerir", file=sys.stderr)
+        return 1
+    resumen = sincronizar_archivos(rutas, workers=args.paralelo)
+    if args.json:
+        _imprimir_json(resumen)
+    else:
+        print(f"omitidos={resumen['omitidos']} agregados={resumen['agregados']} "
+              f"duplicados={resumen['duplicados']} actualizados={resumen['actualizados']} "
+              f"retirados={resumen['retirados']} errores={len(resumen['errores'])}")
+        for ruta, error in resumen['errores']:
+            print(f"error: {ruta}: {error}", file=sys.stderr)
+        for ruta, otra in resumen['conflictos']:
+            print(f"aviso: {ruta}: mismo nombre que {otra}; sólo se agregaron los nuevos (sin diff)",
+                  file=sys.stderr)
+        _avisar_similares(resumen['similares'])
+    return 1 if resumen['errores'] else 0
+
+
+def _avisar_similares(marcas, flush=False):
+    """Una línea por ejercicio agregado que se parece a otro (dedup_service.marcar_similares)."""
+    for marca in marcas:
+        ej = marca['ejercicio']
+        ids = ", ".join(f"#{i} ({s:.0%})" for i, s in marca['similares']) or "mismo lote"
+        print(f"similar: {ej.get('archivo_origen', '')} {ej.get('numero')} -> {ids}", file=sys.stderr, flush=flush)
+
+
+def cmd_search(args) -> int:
+    from services import search_service
+
+    resultados = search_service.buscar(args.texto, args.limite)
+    marcas = str.maketrans({search_service.MARCA_INICIO: "[", search_service.MARCA_FIN: "]"})
+    for r in resultados:
+        for campo, valor in r.items():
+            if isinstance(valor, str):
+                r[campo] = valor.translate(marcas)
+    if args.json:
+        _imprimir_json(resultados)
+    else:
+        for r in resultados:
+            print(f"{r['id']}\t{r['archivo_origen']}#{r['numero']}\t{_una_linea(r['enunciado'])}")
+    return 0 if resultados else 1
+
+
+def cmd_generate(args) -> int:
+    from db import repository
+    from services import practice_service
+
+    if args.estudiantes is None and args.instancias:
+        practica = practice_service.generar_practica(args.ejercicios, args.semilla, con_instancias=True)
+        if args.json:
+            _imprimir_json(practica)
+        else:
+            for ej in practica:
+                instancia = f"#{ej['instancia_id']}" if 'instancia_id' in ej else ""
+                print(f"{ej['id']}{instancia}\t{_una_linea(ej['enunciado'])}")
+        return 0 if practica else 1
+    if args.estudiantes is None:
+        ids = practice_service.GeneradorPracticas.desde_db().practica(args.ejercicios, args.semilla)
+        if args.json:
+            _imprimir_json(ids)
+        else:
+            ejercicios = repository.read_ejercicios_por_ids(ids)
+            for i in ids:
+                print(f"{i}\t{_una_linea(ejercicios[i]['enunciado'])}")
+        return 0 if ids else 1
+
+    semestre_id = None
+    if args.semestre:
+        semestre = repository.read_semestre_por_nombre(args.semestre)
+        semestre_id = semestre['id'] if semestre else repository.create_semestre(args.semestre)
+    try:
+        variantes, estadisticas = practice_service.generar_lote(
+            args.estudiantes, args.ejercicios, args.semilla, semestre_id,
+            workers=args.paralelo, registrar=args.registrar
+        )
+    except ValueError as e:
+        print(f"{e} (usá --semestre NOMBRE)", file=sys.stderr)
+        return 1
+    instancias = None
+    if args.instancias:
+        from services import template_service
+        instancias = template_service.sortear_instancias(variantes, args.semilla)
+    if args.json:
+        _imprimir_json({'variantes': variantes, 'estadisticas': estadisticas,
+                        **({'instancias': instancias} if instancias is not None else {})})
+    else:
+        for n, ids in enumerate(variantes, start=1):
+            if instancias is not None:
+                ids = [f"{e}#{i}" if i is not None else e for e, i in zip(ids, instancias[n - 1])]
+            print(f"{n}\t{','.join(map(str, ids))}")
+        print(" ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in estadisticas.items()),
+              file=sys.stderr)
+    return 0
+
+
+def cmd_export(args) -> int:
+    from db import repository
+    from services import export_service
+
+    semilla = args.semilla
+    if args.ids:
+        variantes = [args.ids]
+        semilla = semilla if semilla is not None else ",".join(map(str, args.ids))
+    else:
+        semestre = (repository.read_semestre_por_nombre(args.semestre) if args.semestre
+                    else repository.read_semestre_actual())
+        if semestre is None:
+            print("No hay semestre (usá --semestre NOMBRE o --ids)", file=sys.stderr)
+            return 1
+        asignaciones = repository.read_asignaciones(semestre['id'])
+        variantes = [asignaciones[v] for v in sorted(asignaciones)]
+        if not variantes:
+            print(f"El semestre {semestre['nombre']} no tiene prácticas asignadas", file=sys.stderr)
+            return 1
+        semilla = semilla if semilla is not None else semestre['nombre']
+
+    instancias = None
+    if args.instancias:
+        from services import template_service
+        instancias = template_service.sortear_instancias(variantes, semilla)
+    resultado = export_service.exportar_lote(
+        variantes, args.directorio, args.formato or ('tex',), con_respuestas=args.clave, forzar=args.forzar,
+        instancias=instancias
+    )
+    pdfs = []
+    if args.pdf:
+        tex = [r for r in resultado['escritos'] + resultado['omitidos'] if r.endswith(".tex")]
+        pdfs = [p for p in map(export_service.compilar_pdf, tex) if p]
+    if args.json:
+        _imprimir_json({**resultado, 'pdfs': pdfs})
+    else:
+        print(f"escritos={len(resultado['escritos'])} sin_cambios={len(resultado['omitidos'])} pdfs={len(pdfs)}")
+    return 0
+
+
+def cmd_stats(args) -> int:
+    from db import repository
+
+    estadisticas = repository.read_estadisticas()
+    if args.json:
+        _imprimir_json(estadisticas)
+        return 0
+    print(f"ejercicios={estadisticas['ejercicios']} retirados={estadisticas['retirados']} "
+          f"archivos={estadisticas['archivos_ingestados']} semestres={estadisticas['semestres']} "
+          f"asignaciones={estadisticas['asignaciones']}")
+    for tema, n in estadisticas['por_tema'].items():
+        print(f"{n}\t{tema}")
+    if estadisticas['validaciones']:
+        print("validaciones: " + " ".join(f"{k}={v}" for k, v in estadisticas['validaciones'].items()))
+    return 0
+
+
+def cmd_templates(args) -> int:
+    from db import repository
+    from services import template_service
+
+    try:
+        resumen = template_service.generar_pool(args.por_plantilla, workers=args.paralelo, timeout=args.timeout)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    pool = repository.read_resumen_instancias()
+    if args.json:
+        _imprimir_json({**resumen, 'pool': pool})
+        return 0
+    print(f"plantillas={resumen['plantillas']} generadas={resumen['generadas']} "
+          + " ".join(f"{k}={v}" for k, v in sorted(resumen['por_estado'].items())))
+    print("pool: " + " ".join(f"{k}={v}" for k, v in sorted(pool.items())))
+    for plantilla_id, detalle in resumen['errores']:
+        print(f"error: plantilla {plantilla_id}: {detalle}", file=sys.stderr)
+    return 1 if resumen['errores'] else 0
+
+
+def cmd_snapshot(args) -> int:
+    from services import snapshot_service
+
+    resultado = snapshot_service.exportar(args.archivo)
+    if args.json:
+        _imprimir_json(resultado)
+    else:
+        print(" ".join(f"{t}={n}" for t, n in resultado['filas'].items())
+              + f" bytes={resultado['bytes']} sin_comprimir={resultado['bytes_sin_comprimir']}")
+    return 0
+
+
+def cmd_restore(args) -> int:
+    from services import snapshot_service
+
+    try:
+        resultado = snapshot_service.restaurar(args.archivo, fusionar=args.fusionar)
+    except (OSError, snapshot_service.SnapshotInvalido) as e:
+        print(f"error: {args.archivo}: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        _imprimir_json(resultado)
+    else:
+        print(" ".join(f"{k}={v}" for k, v in resultado.items() if k != 'filas'))
+    return 0
+
+
+def _completar_instancias():
+    """Completa el pool de instancias en segundo plano (si hay SymPy)."""
+    from services import template_service
+
+    def informar(resumen):
+        if resumen['generadas']:
+            print(f"instancias: generadas={resumen['generadas']} "
+                  + " ".join(f"{k}={v}" for k, v in sorted(resumen['por_estado'].items())),
+                  file=sys.stderr, flush=True)
+    template_service.generar_pool_en_segundo_plano(informar)
+
+
+def _informar_sincronizacion(rutas, resumen):
+    import os
+    import time
+
+    nombres = ", ".join(os.path.basename(r) for r in rutas)
+    print(f"{time.strftime('%H:%M:%S')} {nombres}: agregados={resumen['agregados']} "
+          f"duplicados={resumen['duplicados']} actualizados={resumen['actualizados']} "
+          f"retirados={resumen['retirados']} sin_cambios={resumen['omitidos']}", file=sys.stderr, flush=True)
+    for ruta, error in resumen['errores']:
+        print(f"error: {ruta}: {error}", file=sys.stderr, flush=True)
+    for ruta, otra in resumen['conflictos']:
+        print(f"aviso: {ruta}: mismo nombre que {otra}; sólo se agregaron los nuevos (sin diff)",
+              file=sys.stderr, flush=True)
+    _avisar_similares(resumen['similares'], flush=True)
+    if resumen['agregados'] or resumen['actualizados']:
+        _completar_instancias()
+
+
+def cmd_watch(args) -> int:
+    from services import watch_service
+
+    print(f"Vigilando {args.directorio} (Ctrl+C para salir)", file=sys.stderr)
+    watch_service.vigilar(args.directorio, _informar_sincronizacion, intervalo=args.intervalo,
+                          espera=args.espera, workers=args.paralelo or 1)
+    return 0
+
+
+def cmd_serve(args) -> int:
+    import servidor
+
+    _completar_instancias()
+    vigilante = None
+    if args.vigilar:
+        from services import watch_service
+        vigilante = watch_service.Vigilante(args.vigilar, al_sincronizar=_informar_sincronizacion)
+        vigilante.iniciar()
+    try:
+        servidor.servir(args.host, args.puerto, args.hilos)
+    finally:
+        if vigilante is not None:
+            vigilante.detener()
+    return 0
+
+
+# ------------------ ARGUMENTOS ------------------ #
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cli", description="EDO - USFX: comandos no interactivos")
+    parser.add_argument("--db", metavar="RUTA", default=None, help="base de datos a usar (por defecto EDO_DB_PATH o db/EDO_DB.db)")
+    parser.add_argument("--json", action="store_true", help="salida en JSON")
+    parser.add_argument("--instrumentar", action="store_true",
+                        help="al terminar, mostrar tiempos/contadores de parser, repositorio y servicios (stderr)")
+    parser.add_argument("--perfil", metavar="RUTA", default=None, help="perfilar con cProfile y guardar el .pstats en RUTA")
+    parser.add_argument("-j", "--paralelo", type=int, nargs="?", const=0, default=None, metavar="N",
+                        help="procesos para ingest/generate/templates (sin N: uno por CPU)")
+    comandos = parser.add_subparsers(dest="comando", metavar="COMANDO", required=True)
+
+    p = comandos.add_parser("ingest", help="sincronizar archivos .tex con la DB (sólo lo que cambió)")
+    p.add_argument("rutas", nargs="*", help="archivos .tex (por defecto data/*.tex)")
+    p.set_defaults(funcion=cmd_ingest)
+
+    p = comandos.add_parser("search", help="búsqueda de texto completo")
+    p.add_argument("texto")
+    p.add_argument("-n", "--limite", type=int, default=20)
+    p.set_defaults(funcion=cmd_search)
+
+    p = comandos.add_parser("generate", help="generar una práctica o un lote (una por estudiante)")
+    p.add_argument("-n", "--ejercicios", type=int, default=10, help="ejercicios por práctica (10)")
+    p.add_argument("-e", "--estudiantes", type=int, default=None, help="generar un lote para E estudiantes")
+    p.add_argument("-s", "--semilla", default=None)
+    p.add_argument("--semestre", default=None, help="semestre del lote (por defecto el en curso; se crea si no existe)")
+    p.add_argument("--registrar", action="store_true", help="guardar el lote en ejercicios_semestre")
+    p.add_argument("--instancias", action="store_true",
+                   help="los ejercicios paramétricos salen con una instancia del pool (ver templates)")
+    p.set_defaults(funcion=cmd_generate)
+
+    p = comandos.add_parser("export", help="exportar prácticas a .tex / .md")
+    p.add_argument("directorio")
+    p.add_argument("--semestre", default=None, help="exportar las prácticas asignadas en ese semestre (por defecto el en curso)")
+    p.add_argument("--ids", type=_lista_ids, default=None, help="exportar una práctica con esos ids (separados por coma)")
+    p.add_argument("--formato", choices=("tex", "md"), action="append", help="repetible; por defecto tex")
+    p.add_argument("--clave", action="store_true", help="exportar también la clave de respuestas")
+    p.add_argument("--pdf", action="store_true", help="compilar los .tex con pdflatex (si está instalado)")
+    p.add_argument("--forzar", action="store_true", help="reescribir aunque no haya cambios")
+    p.add_argument("--instancias", action="store_true",
+                   help="los ejercicios paramétricos salen con una instancia del pool")
+    p.add_argument("-s", "--semilla", default=None,
+                   help="semilla del sorteo de instancias (por defecto el semestre o los ids)")
+    p.set_defaults(funcion=cmd_export)
+
+    p = comandos.add_parser("stats", help="conteos del banco")
+    p.set_defaults(funcion=cmd_stats)
+
+    p = comandos.add_parser("templates", help="generar y verificar instancias de las plantillas paramétricas")
+    p.add_argument("-n", "--por-plantilla", type=int, default=30, help="instancias nuevas por plantilla (30)")
+    p.add_argument("--timeout", type=float, default=10.0, help="segundos por verificación (10)")
+    p.set_defaults(funcion=cmd_templates)
+
+    p = comandos.add_parser("snapshot", help="exportar el banco (ejercicios, semestres, asignaciones) a un snapshot binario")
+    p.add_argument("archivo")
+    p.set_defaults(funcion=cmd_snapshot)
+
+    p = comandos.add_parser("restore", help="restaurar un snapshot (reemplaza el banco en una transacción)")
+    p.add_argument("archivo")
+    p.add_argument("--fusionar", action="store_true",
+                   help="agregar sólo lo que falta (ejercicios deduplicados por huella de enunciado)")
+    p.set_defaults(funcion=cmd_restore)
+
+    p = comandos.add_parser("serve", help="servicio HTTP/JSON local (consultas, búsqueda y prácticas)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--puerto", type=int, default=8765)
+    p.add_argument("--hilos", type=int, default=8, help="hilos (y conexiones) para la DB (8)")
+    p.add_argument("--vigilar", nargs="?", const="data", default=None, metavar="DIR",
+                   help="además, ingerir automáticamente los .tex que cambian en DIR (data)")
+    p.set_defaults(funcion=cmd_serve)
+
+    p = comandos.add_parser("watch", help="ingerir automáticamente los .tex nuevos o editados")
+    p.add_argument("directorio", nargs="?", default="data")
+    p.add_argument("--intervalo", type=float, default=1.0, help="segundos entre sondeos (1)")
+    p.add_argument("--espera", type=float, default=2.0,
+                   help="segundos sin cambios antes de ingerir un archivo (debounce, 2)")
+    p.set_defaults(funcion=cmd_watch)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.instrumentar or args.perfil:
+        import instrumentacion
+        instrumentacion.activar(args.perfil)
+    if args.db:
+        import os
+        from db import repository
+        directorio = os.path.dirname(os.path.abspath(args.db))
+        if not os.path.isdir(directorio):
+            print(f"error: --db {args.db}: no existe el directorio {directorio}", file=sys.stderr)
+            return 1
+        if not os.path.exists(args.db):
+            print(f"aviso: {args.db} no existe; se crea una base vacía", file=sys.stderr)
+        repository.configurar(args.db)
+    return args.funcion(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
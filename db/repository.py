@@ -1,15 +1,546 @@
 # db/repository.py
+import atexit
+import hashlib
+import os
 import sqlite3
-from typing import Dict, List, Optional
+import threading
+from array import array
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-DB_PATH = "db/EDO_DB.db"
+import instrumentacion
+from latex_parser import huella_enunciado
+
+# Ruta de la DB: variable de entorno EDO_DB_PATH o db/EDO_DB.db junto a este módulo
+# (ya no depende del directorio desde el que se ejecuta). Se puede cambiar en
+# caliente con configurar() o asignando DB_PATH.
+DB_PATH = os.environ.get("EDO_DB_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "EDO_DB.db")
+
+# tamaño de lote por defecto para las operaciones masivas (una transacción por lote)
+BATCH_SIZE = 500
+
+# resultados por fila de create_ejercicios_bulk
+INSERTADO = "insertado"
+DUPLICADO = "duplicado"
+
+# ajustes de cada conexión: WAL permite lectores concurrentes mientras un proceso
+# escribe; busy_timeout espera al escritor en vez de fallar con "database is locked"
+BUSY_TIMEOUT_S = 10.0
+STATEMENT_CACHE = 256
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",       # ~16 MB de caché de páginas
+    "PRAGMA mmap_size = 268435456",     # 256 MB mapeados en memoria
+    "PRAGMA temp_store = MEMORY",
+)
+
+# rutas de DB ya migradas en este proceso (las migraciones son idempotentes)
+_migradas = set()
+_migracion_lock = threading.Lock()
+# conexiones reutilizables: una por hilo y por ruta de DB
+_local = threading.local()
+_abiertas: List[sqlite3.Connection] = []
+_abiertas_lock = threading.Lock()
+
+def configurar(db_path: str):
+    """Cambia la DB usada por el repositorio (las próximas conexiones usan la nueva ruta)."""
+    global DB_PATH
+    DB_PATH = db_path
+
+def _nueva_conexion() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_S, cached_statements=STATEMENT_CACHE)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if DB_PATH not in _migradas:
+        with _migracion_lock:
+            if DB_PATH not in _migradas:
+                init_db(conn)
+                _migradas.add(DB_PATH)
+    return conn
 
 def get_connection():
-    """Retorna una conexión a la base de datos SQLite."""
-    return sqlite3.connect(DB_PATH)
+    """
+    Retorna una conexión NUEVA a la base de datos SQLite (ya configurada y
+    migrada). Quien la pide la cierra; para el uso normal ver conexion().
+    """
+    return _nueva_conexion()
+
+@contextmanager
+def conexion() -> Iterator[sqlite3.Connection]:
+    """
+    Conexión reutilizable del hilo actual (una por hilo, proceso y ruta de DB).
+    No se cierra al salir del `with`: la siguiente operación del mismo hilo la
+    reutiliza junto con su caché de sentencias preparadas. Si el bloque falla
+    con una transacción abierta se hace rollback.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    clave = (os.getpid(), DB_PATH)
+    conn = conns.get(clave)
+    if conn is None:
+        conn = conns[clave] = _nueva_conexion()
+        with _abiertas_lock:
+            _abiertas.append(conn)
+    try:
+        yield conn
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+@contextmanager
+def _conexion_o(conn: Optional[sqlite3.Connection]) -> Iterator[sqlite3.Connection]:
+    """
+    `conn` si viene dada (p.ej. UnitOfWork.conn: la transacción es del llamador,
+    que confirma) o la conexión del hilo. Las escrituras confirman sólo si conn es None.
+    """
+    if conn is not None:
+        yield conn
+    else:
+        with conexion() as propia:
+            yield propia
+
+@contextmanager
+def _lectura_consistente(conn: sqlite3.Connection) -> Iterator[None]:
+    """
+    Las lecturas del bloque ven un mismo estado de la DB. Si la conexión ya está
+    en una transacción se lee dentro de ella (sin BEGIN ni commit: la
+    transacción es de otro); si no, se abre una sólo para el bloque.
+    """
+    if conn.in_transaction:
+        yield
+        return
+    conn.execute("BEGIN")
+    try:
+        yield
+    finally:
+        conn.commit()
+
+def cerrar_conexiones():
+    """Cierra las conexiones reutilizables del hilo actual."""
+    conns = getattr(_local, "conns", None) or {}
+    for conn in conns.values():
+        with _abiertas_lock:
+            if conn in _abiertas:
+                _abiertas.remove(conn)
+        conn.close()
+    conns.clear()
+
+def conexion_testigo() -> sqlite3.Connection:
+    """
+    Conexión aparte (sin registrar ni migrar) para leer read_data_version: como
+    no escribe nunca, su data_version cambia con CUALQUIER escritura confirmada
+    en la DB (de este u otro proceso). La cierra quien la pide.
+    """
+    return sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_S, check_same_thread=False)
+
+def read_data_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+@atexit.register
+def _cerrar_todas():
+    # cierre ordenado al salir (hace checkpoint del WAL)
+    with _abiertas_lock:
+        for conn in _abiertas:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _abiertas.clear()
+
+# ----------------- ESQUEMA ----------------- #
+def _columnas(conn, tabla: str) -> List[str]:
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({tabla})")]
+
+# tablas base del banco (las de db/EDO_DB.db); init_db las crea si la DB es nueva
+_ESQUEMA_BASE = (
+    """
+    CREATE TABLE IF NOT EXISTS ejercicios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero INTEGER,                  -- Ej. "1", "2", etc.
+        tema TEXT NOT NULL,              -- Tema principal (ej. "Ecuaciones de variables separables")
+        subtema TEXT,                    -- Subtema específico (ej. "Hallar Y si:")
+        enunciado TEXT NOT NULL,         -- El enunciado completo en LaTeX
+        condiciones TEXT,                -- Condiciones iniciales (si existen)
+        respuesta TEXT,                  -- La solución en LaTeX
+        archivo_origen TEXT,             -- Nombre del archivo .tex
+        fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS semestres (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,           -- Ej. "2025-2"
+        fecha_inicio DATE,
+        fecha_fin DATE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ejercicios_semestre (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        semestre_id INTEGER NOT NULL,
+        ejercicio_id INTEGER NOT NULL,
+        fecha_asignacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        usado_en_practica BOOLEAN DEFAULT 0,
+        FOREIGN KEY (semestre_id) REFERENCES semestres(id),
+        FOREIGN KEY (ejercicio_id) REFERENCES ejercicios(id)
+    )
+    """,
+)
+
+def init_db(conn):
+    """
+    Crea las tablas base si la DB es nueva (_ESQUEMA_BASE) y aplica las
+    migraciones pendientes sobre el esquema existente (idempotente):
+      - ejercicios.retirado: 1 cuando el ejercicio desapareció de su archivo de origen.
+      - archivos_ingestados: manifiesto de archivos .tex ya ingeridos.
+      - ejercicios.huella: hash del enunciado normalizado, con índice UNIQUE entre
+        los ejercicios activos (la DB impide los duplicados).
+      - ejercicios_minhash / ejercicios_lsh: firmas MinHash y buckets LSH para
+        detectar casi-duplicados (services/dedup_service.py).
+      - ejercicios_fts: índice FTS5 (contenido externo) sobre los textos de
+        ejercicios, sincronizado por triggers.
+      - ejercicios_semestre.variante: a qué variante (estudiante) de la práctica
+        del semestre se asignó el ejercicio.
+      - validaciones: caché de resultados de services/validation_service.py,
+        por hash de los textos validados.
+      - expresiones: árboles SymPy ya parseados por fórmula LaTeX
+        (services/expression_service.py).
+      - índices de ejercicios_semestre por (semestre_id, ejercicio_id) y
+        (ejercicio_id, semestre_id), y los agregados del historial (ver _init_historial).
+      - catalogo_version: contador de cambios de ejercicios (triggers), para
+        invalidar la caché en memoria (services/catalog_service.py).
+      - plantillas / instancias: ejercicios paramétricos y su pool de instancias
+        ya verificadas (services/template_service.py).
+    """
+    # BEGIN IMMEDIATE serializa la migración entre hilos/procesos que abren la DB a la vez
+    conn.execute("BEGIN IMMEDIATE")
+    for sql in _ESQUEMA_BASE:
+        conn.execute(sql)
+    columnas = _columnas(conn, "ejercicios")
+    if "retirado" not in columnas:
+        conn.execute("ALTER TABLE ejercicios ADD COLUMN retirado BOOLEAN NOT NULL DEFAULT 0")
+    if "huella" not in columnas:
+        conn.execute("ALTER TABLE ejercicios ADD COLUMN huella TEXT")
+
+    # backfill de huellas faltantes (filas anteriores a la migración)
+    conn.create_function("huella_enunciado", 1, huella_enunciado, deterministic=True)
+    conn.execute("UPDATE ejercicios SET huella = huella_enunciado(enunciado) WHERE huella IS NULL")
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_ejercicios_huella'").fetchone():
+        # duplicados previos a la huella: se conserva el de menor id y el resto queda retirado
+        conn.execute("""
+            UPDATE ejercicios SET retirado = 1
+            WHERE retirado = 0 AND id NOT IN (
+                SELECT MIN(id) FROM ejercicios WHERE retirado = 0 GROUP BY huella
+            )
+        """)
+        conn.execute("CREATE UNIQUE INDEX ux_ejercicios_huella ON ejercicios(huella) WHERE retirado = 0")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archivos_ingestados (
+            ruta TEXT PRIMARY KEY,           -- Ruta del .tex tal como se ingirió
+            tamano INTEGER NOT NULL,         -- Tamaño en bytes
+            mtime_ns INTEGER NOT NULL,       -- Fecha de modificación (ns)
+            hash_contenido TEXT NOT NULL,    -- sha256 del contenido
+            version_parser TEXT NOT NULL,    -- latex_parser.PARSER_VERSION usada
+            fecha_ingesta TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ejercicios_archivo_numero ON ejercicios(archivo_origen, numero)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ejercicios_tema_subtema ON ejercicios(tema, subtema)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ejercicios_subtema ON ejercicios(subtema)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ejercicios_minhash (
+            ejercicio_id INTEGER PRIMARY KEY,
+            huella TEXT NOT NULL,            -- Huella del enunciado con la que se calculó la firma
+            firma BLOB NOT NULL,             -- Valores MinHash (uint32 little-endian)
+            FOREIGN KEY (ejercicio_id) REFERENCES ejercicios(id)
+        )
+    """)
+    if "version_firma" not in _columnas(conn, "ejercicios_minhash"):
+        # dedup_service.FIRMA_VERSION con la que se calculó; las de otra versión se recalculan
+        conn.execute("ALTER TABLE ejercicios_minhash ADD COLUMN version_firma INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ejercicios_lsh (
+            banda INTEGER NOT NULL,          -- Índice de banda de la firma
+            bucket INTEGER NOT NULL,         -- Hash de las filas de esa banda
+            ejercicio_id INTEGER NOT NULL,
+            PRIMARY KEY (banda, bucket, ejercicio_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_ejercicio ON ejercicios_lsh(ejercicio_id)")
+    _init_fts(conn)
+    if "variante" not in _columnas(conn, "ejercicios_semestre"):
+        conn.execute("ALTER TABLE ejercicios_semestre ADD COLUMN variante INTEGER")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS expresiones (
+            clave TEXT PRIMARY KEY,          -- Hash del LaTeX y de la versión del traductor
+            arbol BLOB,                      -- Expresión SymPy serializada (srepr + zlib)
+            error TEXT                       -- Motivo si la fórmula no se pudo traducir
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS validaciones (
+            clave TEXT PRIMARY KEY,          -- Hash de (enunciado, condiciones, respuesta, versión del validador)
+            estado TEXT NOT NULL,            -- valido / invalido / no_soportado / tiempo_agotado / error
+            detalle TEXT,
+            duracion REAL,                   -- Segundos que tomó la validación
+            fecha_validacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ejercicios_semestre_semestre ON ejercicios_semestre(semestre_id, ejercicio_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ejercicios_semestre_ejercicio ON ejercicios_semestre(ejercicio_id, semestre_id)")
+    _init_historial(conn)
+    _init_version_catalogo(conn)
+    _init_instancias(conn)
+    conn.commit()
+
+# columnas indexadas por FTS5 (mismo orden que en la tabla virtual)
+COLUMNAS_FTS = ('enunciado', 'condiciones', 'respuesta', 'tema', 'subtema')
+
+def _init_fts(conn):
+    """
+    Crea ejercicios_fts (FTS5 de contenido externo: no duplica los textos) y los
+    triggers que lo mantienen al día. El tokenizer unicode61 corta en todo lo que
+    no es letra/dígito, así que en LaTeX separa los nombres de comando (\\frac ->
+    frac) y las llaves, ^ y _ (e^{x} -> e, x); remove_diacritics ignora tildes.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'ejercicios_fts'").fetchone():
+        return
+    cols = ", ".join(COLUMNAS_FTS)
+    nuevos = ", ".join(f"new.{c}" for c in COLUMNAS_FTS)
+    viejos = ", ".join(f"old.{c}" for c in COLUMNAS_FTS)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE ejercicios_fts USING fts5(
+            {cols},
+            content = 'ejercicios', content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER ejercicios_fts_ai AFTER INSERT ON ejercicios BEGIN
+            INSERT INTO ejercicios_fts(rowid, {cols}) VALUES (new.id, {nuevos});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER ejercicios_fts_ad AFTER DELETE ON ejercicios BEGIN
+            INSERT INTO ejercicios_fts(ejercicios_fts, rowid, {cols}) VALUES ('delete', old.id, {viejos});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER ejercicios_fts_au AFTER UPDATE OF {cols} ON ejercicios BEGIN
+            INSERT INTO ejercicios_fts(ejercicios_fts, rowid, {cols}) VALUES ('delete', old.id, {viejos});
+            INSERT INTO ejercicios_fts(rowid, {cols}) VALUES (new.id, {nuevos});
+        END
+    """)
+    # indexar las filas existentes
+    conn.execute("INSERT INTO ejercicios_fts(ejercicios_fts) VALUES ('rebuild')")
+
+def _init_historial(conn):
+    """
+    Agregados del historial de semestres, mantenidos por triggers sobre
+    ejercicios_semestre (cada asignación insertada o borrada los actualiza), para
+    que los reportes lean tablas chicas en vez de recorrer todas las asignaciones:
+      - uso_semestre_ejercicio: asignaciones por (semestre, ejercicio), con el
+        tema/subtema actual del ejercicio;
+      - uso_semestre_tema: asignaciones y ejercicios distintos por (semestre, tema, subtema);
+      - uso_ejercicio: en cuántos semestres y cuántas veces se usó cada ejercicio.
+    Un ejercicio sin fila en uso_ejercicio nunca se usó. Editar el tema o
+    subtema de un ejercicio mueve su uso de bucket (ver _init_historial_temas).
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'uso_ejercicio'").fetchone():
+        _init_historial_temas(conn)
+        return
+    conn.execute("""
+        CREATE TABLE uso_semestre_ejercicio (
+            semestre_id INTEGER NOT NULL,
+            ejercicio_id INTEGER NOT NULL,
+            tema TEXT NOT NULL,
+            subtema TEXT NOT NULL,
+            asignaciones INTEGER NOT NULL,
+            PRIMARY KEY (semestre_id, ejercicio_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX idx_uso_semestre_ejercicio_ejercicio ON uso_semestre_ejercicio(ejercicio_id, semestre_id)")
+    conn.execute("""
+        CREATE TABLE uso_semestre_tema (
+            semestre_id INTEGER NOT NULL,
+            tema TEXT NOT NULL,
+            subtema TEXT NOT NULL,
+            asignaciones INTEGER NOT NULL,   -- Filas de ejercicios_semestre
+            ejercicios INTEGER NOT NULL,     -- Ejercicios distintos
+            PRIMARY KEY (semestre_id, tema, subtema)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE uso_ejercicio (
+            ejercicio_id INTEGER PRIMARY KEY,
+            semestres INTEGER NOT NULL,      -- Semestres distintos en que se usó
+            asignaciones INTEGER NOT NULL,   -- Veces que se asignó en total
+            ultimo_semestre_id INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX idx_uso_ejercicio_semestres ON uso_ejercicio(semestres, asignaciones)")
+
+    par = "p.semestre_id = {0}.semestre_id AND p.ejercicio_id = {0}.ejercicio_id"
+    conn.execute(f"""
+        CREATE TRIGGER ejercicios_semestre_uso_ai AFTER INSERT ON ejercicios_semestre BEGIN
+            -- el par (semestre, ejercicio) todavía no está en uso_semestre_ejercicio si es nuevo
+            INSERT INTO uso_ejercicio (ejercicio_id, semestres, asignaciones, ultimo_semestre_id)
+            VALUES (new.ejercicio_id, 1, 1, new.semestre_id)
+            ON CONFLICT (ejercicio_id) DO UPDATE SET
+                semestres = semestres + NOT EXISTS (SELECT 1 FROM uso_semestre_ejercicio p WHERE {par.format('new')}),
+                asignaciones = asignaciones + 1,
+                ultimo_semestre_id = MAX(ultimo_semestre_id, new.semestre_id);
+            INSERT INTO uso_semestre_tema (semestre_id, tema, subtema, asignaciones, ejercicios)
+            SELECT new.semestre_id, COALESCE(e.tema, ''), COALESCE(e.subtema, ''), 1, 1
+            FROM (SELECT 1) LEFT JOIN ejercicios e ON e.id = new.ejercicio_id WHERE true
+            ON CONFLICT (semestre_id, tema, subtema) DO UPDATE SET
+                asignaciones = asignaciones + 1,
+                ejercicios = ejercicios + NOT EXISTS (SELECT 1 FROM uso_semestre_ejercicio p WHERE {par.format('new')});
+            INSERT INTO uso_semestre_ejercicio (semestre_id, ejercicio_id, tema, subtema, asignaciones)
+            SELECT new.semestre_id, new.ejercicio_id, COALESCE(e.tema, ''), COALESCE(e.subtema, ''), 1
+            FROM (SELECT 1) LEFT JOIN ejercicios e ON e.id = new.ejercicio_id WHERE true
+            ON CONFLICT (semestre_id, ejercicio_id) DO UPDATE SET asignaciones = asignaciones + 1;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER ejercicios_semestre_uso_ad AFTER DELETE ON ejercicios_semestre BEGIN
+            UPDATE uso_semestre_ejercicio SET asignaciones = asignaciones - 1
+            WHERE semestre_id = old.semestre_id AND ejercicio_id = old.ejercicio_id;
+            -- si el par quedó en 0, el ejercicio dejó de usarse en ese semestre
+            UPDATE uso_semestre_tema SET
+                asignaciones = asignaciones - 1,
+                ejercicios = ejercicios - EXISTS (SELECT 1 FROM uso_semestre_ejercicio p WHERE {par.format('old')} AND p.asignaciones = 0)
+            WHERE (semestre_id, tema, subtema) = (
+                SELECT semestre_id, tema, subtema FROM uso_semestre_ejercicio p WHERE {par.format('old')}
+            );
+            UPDATE uso_ejercicio SET
+                asignaciones = asignaciones - 1,
+                semestres = semestres - EXISTS (SELECT 1 FROM uso_semestre_ejercicio p WHERE {par.format('old')} AND p.asignaciones = 0),
+                ultimo_semestre_id = (
+                    SELECT MAX(semestre_id) FROM uso_semestre_ejercicio p
+                    WHERE p.ejercicio_id = old.ejercicio_id AND p.asignaciones > 0
+                )
+            WHERE ejercicio_id = old.ejercicio_id;
+            DELETE FROM uso_semestre_ejercicio WHERE semestre_id = old.semestre_id AND ejercicio_id = old.ejercicio_id AND asignaciones = 0;
+            DELETE FROM uso_semestre_tema WHERE semestre_id = old.semestre_id AND asignaciones = 0;
+            DELETE FROM uso_ejercicio WHERE ejercicio_id = old.ejercicio_id AND asignaciones = 0;
+        END
+    """)
+    _recalcular_historial(conn)
+    _init_historial_temas(conn)
+
+def _init_historial_temas(conn):
+    """
+    Trigger que, al cambiar el tema o subtema de un ejercicio ya usado, pasa sus
+    asignaciones de cada semestre del bucket viejo de uso_semestre_tema al nuevo.
+    Las DBs anteriores al trigger guardaban el tema de la asignación: si alguno
+    quedó desfasado del ejercicio, los agregados se recalculan una vez.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'ejercicios_uso_tema_au'").fetchone():
+        return
+    conn.execute("""
+        CREATE TRIGGER ejercicios_uso_tema_au AFTER UPDATE OF tema, subtema ON ejercicios
+        WHEN COALESCE(old.tema, '') != COALESCE(new.tema, '') OR COALESCE(old.subtema, '') != COALESCE(new.subtema, '')
+        BEGIN
+            UPDATE uso_semestre_tema SET
+                asignaciones = uso_semestre_tema.asignaciones - p.asignaciones,
+                ejercicios = uso_semestre_tema.ejercicios - 1
+            FROM uso_semestre_ejercicio p
+            WHERE p.ejercicio_id = new.id AND p.semestre_id = uso_semestre_tema.semestre_id
+              AND p.tema = uso_semestre_tema.tema AND p.subtema = uso_semestre_tema.subtema;
+            INSERT INTO uso_semestre_tema (semestre_id, tema, subtema, asignaciones, ejercicios)
+            SELECT semestre_id, COALESCE(new.tema, ''), COALESCE(new.subtema, ''), asignaciones, 1
+            FROM uso_semestre_ejercicio WHERE ejercicio_id = new.id
+            ON CONFLICT (semestre_id, tema, subtema) DO UPDATE SET
+                asignaciones = asignaciones + excluded.asignaciones,
+                ejercicios = ejercicios + 1;
+            UPDATE uso_semestre_ejercicio SET tema = COALESCE(new.tema, ''), subtema = COALESCE(new.subtema, '')
+            WHERE ejercicio_id = new.id;
+            DELETE FROM uso_semestre_tema WHERE asignaciones = 0
+              AND semestre_id IN (SELECT semestre_id FROM uso_semestre_ejercicio WHERE ejercicio_id = new.id);
+        END
+    """)
+    desfasado = conn.execute("""
+        SELECT 1 FROM uso_semestre_ejercicio p JOIN ejercicios e ON e.id = p.ejercicio_id
+        WHERE p.tema != COALESCE(e.tema, '') OR p.subtema != COALESCE(e.subtema, '') LIMIT 1
+    """).fetchone()
+    if desfasado:
+        for tabla in ('uso_semestre_ejercicio', 'uso_semestre_tema', 'uso_ejercicio'):
+            conn.execute(f"DELETE FROM {tabla}")
+        _recalcular_historial(conn)
+
+def _recalcular_historial(conn):
+    """Vuelve a llenar los agregados del historial desde ejercicios_semestre (tablas vacías)."""
+    conn.execute("""
+        INSERT INTO uso_semestre_ejercicio (semestre_id, ejercicio_id, tema, subtema, asignaciones)
+        SELECT es.semestre_id, es.ejercicio_id, COALESCE(e.tema, ''), COALESCE(e.subtema, ''), COUNT(*)
+        FROM ejercicios_semestre es LEFT JOIN ejercicios e ON e.id = es.ejercicio_id
+        GROUP BY es.semestre_id, es.ejercicio_id
+    """)
+    conn.execute("""
+        INSERT INTO uso_semestre_tema (semestre_id, tema, subtema, asignaciones, ejercicios)
+        SELECT semestre_id, tema, subtema, SUM(asignaciones), COUNT(*)
+        FROM uso_semestre_ejercicio GROUP BY semestre_id, tema, subtema
+    """)
+    conn.execute("""
+        INSERT INTO uso_ejercicio (ejercicio_id, semestres, asignaciones, ultimo_semestre_id)
+        SELECT ejercicio_id, COUNT(*), SUM(asignaciones), MAX(semestre_id)
+        FROM uso_semestre_ejercicio GROUP BY ejercicio_id
+    """)
+
+def _init_version_catalogo(conn):
+    """
+    catalogo_version: una sola fila con un contador que sube con cada fila de
+    ejercicios insertada, modificada o borrada (por cualquier conexión o proceso).
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalogo_version'").fetchone():
+        return
+    conn.execute("""
+        CREATE TABLE catalogo_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT INTO catalogo_version (id, version) VALUES (1, 0)")
+    for sufijo, evento in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+        conn.execute(f"""
+            CREATE TRIGGER ejercicios_version_{sufijo} AFTER {evento} ON ejercicios BEGIN
+                UPDATE catalogo_version SET version = version + 1 WHERE id = 1;
+            END
+        """)
+
+def _init_instancias(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS plantillas (
+            ejercicio_id INTEGER PRIMARY KEY,    -- Ejercicio base (con los valores por defecto)
+            definicion TEXT NOT NULL,            -- JSON: textos con \\param{...}{...} y parámetros
+            huella TEXT NOT NULL,                -- Hash de la definición: si cambia, se descartan sus instancias
+            FOREIGN KEY (ejercicio_id) REFERENCES ejercicios(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS instancias (
+            id INTEGER PRIMARY KEY,
+            plantilla_id INTEGER NOT NULL,       -- plantillas.ejercicio_id
+            parametros TEXT NOT NULL,            -- Valores usados, p. ej. 'a=3;b=-2' (orden alfabético)
+            huella TEXT,                         -- Huella del enunciado instanciado (como ejercicios.huella)
+            enunciado TEXT NOT NULL,
+            condiciones TEXT,
+            respuesta TEXT,
+            estado TEXT NOT NULL,                -- Resultado de la validación (sólo 'valido' se sortea)
+            detalle TEXT,
+            UNIQUE (plantilla_id, parametros),
+            FOREIGN KEY (plantilla_id) REFERENCES plantillas(ejercicio_id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_instancias_estado ON instancias(estado, plantilla_id)")
 
 # ----------------- CREATE ----------------- #
-def create_ejercicio(ej: Dict):
+def create_ejercicio(ej: Dict) -> bool:
     """
     Inserta un ejercicio en la DB.
     ej = {
@@ -21,81 +552,1123 @@ def create_ejercicio(ej: Dict):
         'respuesta': str,
         'archivo_origen': str
     }
+    Retorna False si ya existía otro con la misma huella de enunciado (no se inserta).
     """
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO ejercicios(numero, tema, subtema, enunciado, condiciones, respuesta, archivo_origen)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute(_INSERT_EJERCICIO, _fila_ejercicio(ej))
+        insertado = c.rowcount == 1
+        conn.commit()
+    return insertado
+
+_INSERT_EJERCICIO = """
+    INSERT INTO ejercicios(numero, tema, subtema, enunciado, condiciones, respuesta, archivo_origen, huella)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+
+def _fila_ejercicio(ej: Dict) -> tuple:
+    return (
         ej.get('numero'),
         ej.get('tema'),
         ej.get('subtema'),
         ej.get('enunciado'),
         ej.get('condiciones'),
         ej.get('respuesta'),
-        ej.get('archivo_origen')
-    ))
-    conn.commit()
-    conn.close()
+        ej.get('archivo_origen'),
+        huella_enunciado(ej.get('enunciado'))
+    )
 
-# ----------------- READ ----------------- #
-def read_ejercicios(filtros: Optional[Dict[str,str]] = None) -> List[Dict]:
+def _insertar_lote(c, lote: List[Dict]) -> List[str]:
     """
-    Devuelve la lista de ejercicios.
-    filtros: dict opcional con columnas y valores para filtrar.
+    Inserta un lote dentro de la transacción en curso. El índice UNIQUE sobre la
+    huella descarta los duplicados (ON CONFLICT DO NOTHING); rowcount dice cuáles.
     """
-    conn = get_connection()
+    resultados = []
+    for ej in lote:
+        c.execute(_INSERT_EJERCICIO, _fila_ejercicio(ej))
+        resultados.append(INSERTADO if c.rowcount == 1 else DUPLICADO)
+    return resultados
+
+def create_ejercicios_bulk(ejercicios: Iterable[Dict], batch_size: int = BATCH_SIZE,
+                           conn: Optional[sqlite3.Connection] = None) -> List[str]:
+    """
+    Inserta muchos ejercicios con una sola conexión, por lotes de `batch_size`.
+    Un ejercicio es duplicado si ya existe otro (activo) con la misma huella de
+    enunciado, en la DB o antes en la entrada; la búsqueda usa el índice UNIQUE.
+
+    conn: conexión a reutilizar (p.ej. UnitOfWork.conn); en ese caso NO se hace
+    commit y la transacción queda en manos del llamador. Sin conn se usa la
+    conexión del hilo y se confirma una transacción por lote.
+
+    Retorna el resultado de cada ejercicio, en orden: INSERTADO o DUPLICADO.
+    """
+    if conn is not None:
+        return _insertar_todo(conn, ejercicios, batch_size, confirmar=False)
+    with conexion() as propia:
+        return _insertar_todo(propia, ejercicios, batch_size, confirmar=True)
+
+def _insertar_todo(conn: sqlite3.Connection, ejercicios: Iterable[Dict], batch_size: int,
+                   confirmar: bool) -> List[str]:
     c = conn.cursor()
+    resultados: List[str] = []
+    it = iter(ejercicios)
+    while True:
+        lote = list(islice(it, batch_size))
+        if not lote:
+            break
+        resultados.extend(_insertar_lote(c, lote))
+        if confirmar:
+            conn.commit()
+    return resultados
+
+class UnitOfWork:
+    """
+    Una conexión y una transacción para varias operaciones del repositorio.
+    Confirma al salir del `with` sin errores; si hay una excepción hace rollback.
+    Usa una conexión propia (no la del hilo), así los commits de otras funciones
+    del repositorio no cortan esta transacción.
+
+        with repository.UnitOfWork() as uow:
+            resultados = uow.create_ejercicios_bulk(ejercicios)
+    """
+
+    def __init__(self):
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def __enter__(self) -> "UnitOfWork":
+        self.conn = get_connection()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+            self.conn = None
+        return False
+
+    def create_ejercicios_bulk(self, ejercicios: Iterable[Dict], batch_size: int = BATCH_SIZE) -> List[str]:
+        return create_ejercicios_bulk(ejercicios, batch_size, conn=self.conn)
+
+    def update_ejercicio_por_id(self, ejercicio_id: int, cambios: Dict):
+        update_ejercicio_por_id(ejercicio_id, cambios, conn=self.conn)
+
+    def retirar_ejercicios(self, ids: List[int]):
+        retirar_ejercicios(ids, conn=self.conn)
+
+    def guardar_plantillas(self, filas: Iterable[Tuple[str, str, str]], archivo_origen: Optional[str] = None) -> int:
+        return guardar_plantillas(filas, archivo_origen, conn=self.conn)
+
+    def upsert_manifiesto(self, ruta: str, **firma):
+        upsert_manifiesto(ruta, **firma, conn=self.conn)
+
+# ----------------- READ ----------------- #
+# columnas que se pueden pedir/filtrar en las lecturas (el resto se rechaza)
+COLUMNAS_EJERCICIO = ('id', 'numero', 'enunciado', 'condiciones', 'respuesta', 'tema', 'subtema', 'archivo_origen')
+# columnas por defecto de read_ejercicios (mismo orden y claves de siempre)
+COLUMNAS_LISTADO = ('numero', 'enunciado', 'condiciones', 'respuesta', 'tema', 'subtema', 'archivo_origen')
+# columnas admitidas en filtros por prefijo / LIKE
+COLUMNAS_TEXTO_FILTRABLES = ('tema', 'subtema', 'archivo_origen')
+
+def _validar_columnas(columnas: Iterable[str]):
+    invalidas = [c for c in columnas if c not in COLUMNAS_EJERCICIO]
+    if invalidas:
+        raise ValueError(f"Columnas desconocidas: {', '.join(invalidas)}")
+
+def _armar_consulta(columnas: Iterable[str], filtros: Optional[Dict] = None,
+                    prefijos: Optional[Dict[str, str]] = None, patrones: Optional[Dict[str, str]] = None,
+                    despues_de: Optional[int] = None, limite: Optional[int] = None,
+                    extras: Iterable[str] = ()) -> tuple:
+    """
+    Arma el SELECT (sobre ejercicios activos, ordenado por id) y sus parámetros.
+    extras: condiciones SQL fijas (sin parámetros) que se agregan con AND.
+    """
+    columnas = list(columnas)
+    _validar_columnas(columnas)
+    condiciones = ["retirado = 0", *extras]
+    params: List = []
+
+    for k, v in (filtros or {}).items():
+        _validar_columnas([k])
+        condiciones.append(f"{k} = ?")
+        params.append(v)
+    for k, v in (prefijos or {}).items():
+        if k not in COLUMNAS_TEXTO_FILTRABLES:
+            raise ValueError(f"No se puede filtrar por prefijo en: {k}")
+        # rango [prefijo, prefijo + U+10FFFF): equivale a LIKE 'prefijo%' pero usa el índice
+        condiciones.append(f"{k} >= ? AND {k} < ?")
+        params.extend([v, v + "\U0010ffff"])
+    for k, v in (patrones or {}).items():
+        if k not in COLUMNAS_TEXTO_FILTRABLES:
+            raise ValueError(f"No se puede filtrar por patrón en: {k}")
+        condiciones.append(f"{k} LIKE ?")
+        params.append(v)
+    if despues_de is not None:
+        condiciones.append("id > ?")
+        params.append(despues_de)
+
+    query = f"SELECT {', '.join(columnas)} FROM ejercicios WHERE {' AND '.join(condiciones)} ORDER BY id"
+    if limite is not None:
+        query += " LIMIT ?"
+        params.append(limite)
+    return query, params
+
+def read_ejercicios(filtros: Optional[Dict[str,str]] = None, columnas: Optional[Iterable[str]] = None,
+                    despues_de: Optional[int] = None, limite: Optional[int] = None,
+                    prefijos: Optional[Dict[str, str]] = None,
+                    patrones: Optional[Dict[str, str]] = None) -> List[Dict]:
+    """
+    Devuelve la lista de ejercicios (activos, ordenados por id).
+    filtros: dict opcional con columnas y valores para filtrar (igualdad).
+    columnas: proyección; por defecto COLUMNAS_LISTADO.
+    despues_de / limite: paginación por cursor (keyset): devuelve hasta `limite`
+        ejercicios con id > despues_de. Con `limite` se incluye siempre 'id' para
+        poder pedir la página siguiente con despues_de = último id.
+    prefijos: {'tema': 'Ecuaciones'} -> tema que empieza con ese texto.
+    patrones: {'subtema': '%exacta%'} -> LIKE sobre tema/subtema/archivo_origen.
+    """
+    columnas = list(columnas or COLUMNAS_LISTADO)
+    if limite is not None and 'id' not in columnas:
+        columnas.insert(0, 'id')
+    query, params = _armar_consulta(columnas, filtros, prefijos, patrones, despues_de, limite)
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute(query, params)
+        rows = c.fetchall()
+
+    return [dict(zip(columnas, r)) for r in rows]
+
+def iter_ejercicios_db(filtros: Optional[Dict[str, str]] = None, columnas: Optional[Iterable[str]] = None,
+                       prefijos: Optional[Dict[str, str]] = None, patrones: Optional[Dict[str, str]] = None,
+                       despues_de: Optional[int] = None, tamano_lote: int = BATCH_SIZE) -> Iterator[Dict]:
+    """
+    Igual que read_ejercicios pero en streaming: recorre el resultado con
+    fetchmany(tamano_lote) y genera un dict por fila, sin cargar toda la tabla.
+    """
+    columnas = list(columnas or COLUMNAS_LISTADO)
+    query, params = _armar_consulta(columnas, filtros, prefijos, patrones, despues_de)
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute(query, params)
+        while True:
+            rows = c.fetchmany(tamano_lote)
+            if not rows:
+                break
+            for r in rows:
+                yield dict(zip(columnas, r))
 
-    query = "SELECT numero, enunciado, condiciones, respuesta, tema, subtema, archivo_origen FROM ejercicios"
-    params = []
+def read_catalogo() -> Tuple[int, List[tuple]]:
+    """
+    (versión, filas) con todos los ejercicios activos como tuplas en el orden de
+    COLUMNAS_EJERCICIO, ordenados por id. Versión y filas se leen en la misma
+    transacción: la versión corresponde exactamente a esas filas.
+    """
+    with conexion() as conn, _lectura_consistente(conn):
+        c = conn.cursor()
+        version = c.execute("SELECT version FROM catalogo_version WHERE id = 1").fetchone()[0]
+        c.execute(f"SELECT {', '.join(COLUMNAS_EJERCICIO)} FROM ejercicios WHERE retirado = 0 ORDER BY id")
+        filas = c.fetchall()
+    return version, filas
+
+def read_filas_por_ids(ids: Iterable[int]) -> List[tuple]:
+    """Como read_ejercicios_por_ids pero en tuplas (orden de COLUMNAS_EJERCICIO), sin armar dicts."""
+    ids = list(ids)
+    filas: List[tuple] = []
+    with conexion() as conn:
+        c = conn.cursor()
+        for i in range(0, len(ids), BATCH_SIZE):
+            parte = ids[i:i + BATCH_SIZE]
+            c.execute(f"""
+                SELECT {', '.join(COLUMNAS_EJERCICIO)} FROM ejercicios WHERE id IN ({", ".join("?" * len(parte))})
+            """, parte)
+            filas.extend(c.fetchall())
+    return filas
+
+def read_version_catalogo() -> int:
+    """Contador de cambios de la tabla ejercicios (ver _init_version_catalogo)."""
+    with conexion() as conn:
+        return conn.execute("SELECT version FROM catalogo_version WHERE id = 1").fetchone()[0]
+
+def read_testigo_cambios() -> Tuple[str, int, int, int]:
+    """
+    Testigo barato de "la DB pudo cambiar" para la conexión del hilo actual:
+    (ruta, id de la conexión, PRAGMA data_version, total_changes). data_version
+    cambia cuando OTRA conexión confirma cambios; total_changes, cuando los hace
+    esta misma. Si el testigo no cambió, nada cambió.
+    """
+    with conexion() as conn:
+        return DB_PATH, id(conn), conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+def count_ejercicios(filtros: Optional[Dict[str, str]] = None, prefijos: Optional[Dict[str, str]] = None,
+                     patrones: Optional[Dict[str, str]] = None) -> int:
+    """Cantidad de ejercicios activos que cumplen los filtros."""
+    query, params = _armar_consulta(['id'], filtros, prefijos, patrones)
+    with conexion() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+
+def read_ids_ejercicios(filtros: Optional[Dict[str, str]] = None, prefijos: Optional[Dict[str, str]] = None,
+                       patrones: Optional[Dict[str, str]] = None, nunca_usados: bool = False) -> array:
+    """
+    Ids (ordenados) de los ejercicios activos que cumplen los filtros, como
+    array('q') compacto: alcanza para saltar a cualquier página con un slice y
+    pedir sólo las filas de esa página (read_ejercicios_por_ids).
+    nunca_usados: sólo los que nunca se asignaron en un semestre (ver _init_historial).
+    """
+    extras = ["NOT EXISTS (SELECT 1 FROM uso_ejercicio u WHERE u.ejercicio_id = ejercicios.id)"] if nunca_usados else []
+    query, params = _armar_consulta(['id'], filtros, prefijos, patrones, extras=extras)
+    ids = array('q')
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute(query, params)
+        while True:
+            rows = c.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            ids.extend(r[0] for r in rows)
+    return ids
+
+def search_ejercicios_fts(consulta: str, limite: int = 50, marca_inicio: str = "[", marca_fin: str = "]") -> List[Dict]:
+    """
+    Búsqueda de texto completo (FTS5) sobre los ejercicios activos, ordenada por
+    relevancia (bm25; tema/subtema pesan más que el resto).
+    consulta: expresión MATCH de FTS5 (ver services/search_service.construir_consulta).
+    Los campos de texto vuelven resaltados entre marca_inicio y marca_fin.
+    """
+    resaltados = ", ".join(
+        f"highlight(ejercicios_fts, {i}, :ini, :fin)" for i in range(len(COLUMNAS_FTS))
+    )
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT e.id, e.numero, e.archivo_origen, bm25(ejercicios_fts, 1.0, 0.5, 0.5, 2.0, 2.0) AS puntaje,
+                   {resaltados}
+            FROM ejercicios_fts JOIN ejercicios e ON e.id = ejercicios_fts.rowid
+            WHERE ejercicios_fts MATCH :consulta AND e.retirado = 0
+            ORDER BY puntaje LIMIT :limite
+        """, {'consulta': consulta, 'limite': limite, 'ini': marca_inicio, 'fin': marca_fin})
+        rows = c.fetchall()
+    return [
+        {
+            'id': r[0],
+            'numero': r[1],
+            'archivo_origen': r[2],
+            'puntaje': r[3],
+            **dict(zip(COLUMNAS_FTS, r[4:]))
+        } for r in rows
+    ]
 
-    if filtros:
-        condiciones = []
-        for k, v in filtros.items():
-            condiciones.append(f"{k} = ?")
-            params.append(v)
-        query += " WHERE " + " AND ".join(condiciones)
+def read_ids_fts(consulta: str) -> set:
+    """Ids de los ejercicios activos que coinciden con la expresión MATCH (sin orden ni límite)."""
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT e.id FROM ejercicios_fts JOIN ejercicios e ON e.id = ejercicios_fts.rowid
+            WHERE ejercicios_fts MATCH ? AND e.retirado = 0
+        """, (consulta,))
+        return {r[0] for r in c.fetchall()}
 
-    c.execute(query, params)
-    rows = c.fetchall()
-    conn.close()
+def read_ultimo_id(conn: Optional[sqlite3.Connection] = None) -> int:
+    """Mayor id de ejercicios (0 si la tabla está vacía): los insertados después tienen id mayor."""
+    with _conexion_o(conn) as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM ejercicios").fetchone()[0]
 
-    # mapeo corregido: r[0]=numero, r[1]=enunciado, r[2]=condiciones, r[3]=respuesta, r[4]=tema, r[5]=subtema, r[6]=archivo_origen
+def read_ejercicios_por_archivo(archivo_origen: str) -> List[Dict]:
+    """
+    Devuelve todos los ejercicios (incluidos los retirados) de un archivo de origen,
+    con su id, ordenados por id. Base del diff incremental por archivo.
+    """
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT id, numero, tema, subtema, enunciado, condiciones, respuesta, retirado
+            FROM ejercicios WHERE archivo_origen = ? ORDER BY id
+        """, (archivo_origen,))
+        rows = c.fetchall()
     return [
         {
-            'numero': r[0],
-            'enunciado': r[1],
-            'condiciones': r[2],
-            'respuesta': r[3],
-            'tema': r[4],
-            'subtema': r[5],
-            'archivo_origen': r[6]
+            'id': r[0],
+            'numero': r[1],
+            'tema': r[2],
+            'subtema': r[3],
+            'enunciado': r[4],
+            'condiciones': r[5],
+            'respuesta': r[6],
+            'retirado': bool(r[7])
         } for r in rows
     ]
 
+# ----------------- MANIFIESTO ----------------- #
+def read_manifiesto(ruta: str) -> Optional[Dict]:
+    """Devuelve la entrada del manifiesto para `ruta` o None si nunca se ingirió."""
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT ruta, tamano, mtime_ns, hash_contenido, version_parser
+            FROM archivos_ingestados WHERE ruta = ?
+        """, (ruta,))
+        r = c.fetchone()
+    if r is None:
+        return None
+    return {'ruta': r[0], 'tamano': r[1], 'mtime_ns': r[2], 'hash_contenido': r[3], 'version_parser': r[4]}
+
+def read_rutas_manifiesto() -> List[str]:
+    """Rutas de todos los archivos registrados en el manifiesto."""
+    with conexion() as conn:
+        return [r[0] for r in conn.execute("SELECT ruta FROM archivos_ingestados")]
+
+def upsert_manifiesto(ruta: str, tamano: int, mtime_ns: int, hash_contenido: str, version_parser: str,
+                      conn: Optional[sqlite3.Connection] = None):
+    """Registra (o actualiza) la firma de un archivo ingerido. conn: ver _conexion_o."""
+    with _conexion_o(conn) as propia:
+        c = propia.cursor()
+        c.execute("""
+            INSERT INTO archivos_ingestados(ruta, tamano, mtime_ns, hash_contenido, version_parser)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(ruta) DO UPDATE SET
+                tamano = excluded.tamano,
+                mtime_ns = excluded.mtime_ns,
+                hash_contenido = excluded.hash_contenido,
+                version_parser = excluded.version_parser,
+                fecha_ingesta = CURRENT_TIMESTAMP
+        """, (ruta, tamano, mtime_ns, hash_contenido, version_parser))
+        if conn is None:
+            propia.commit()
+
+def read_ejercicios_por_ids(ids: Iterable[int]) -> Dict[int, Dict]:
+    """Devuelve {id: ejercicio} para los ids dados (los inexistentes se omiten)."""
+    ids = list(ids)
+    resultado: Dict[int, Dict] = {}
+    if not ids:
+        return resultado
+    with conexion() as conn:
+        c = conn.cursor()
+        for i in range(0, len(ids), BATCH_SIZE):
+            parte = ids[i:i + BATCH_SIZE]
+            c.execute(f"""
+                SELECT id, numero, enunciado, condiciones, respuesta, tema, subtema, archivo_origen
+                FROM ejercicios WHERE id IN ({", ".join("?" * len(parte))})
+            """, parte)
+            for r in c.fetchall():
+                resultado[r[0]] = {
+                    'id': r[0],
+                    'numero': r[1],
+                    'enunciado': r[2],
+                    'condiciones': r[3],
+                    'respuesta': r[4],
+                    'tema': r[5],
+                    'subtema': r[6],
+                    'archivo_origen': r[7]
+                }
+    return resultado
+
+# ----------------- CASI-DUPLICADOS (MinHash/LSH) ----------------- #
+def read_pendientes_minhash(despues_de: int = 0, limite: int = BATCH_SIZE, version: int = 0,
+                            conn: Optional[sqlite3.Connection] = None) -> List[tuple]:
+    """
+    Ejercicios activos sin firma MinHash o con firma desactualizada (cambió el
+    enunciado o se calculó con otra versión que `version`), con id > despues_de.
+    Devuelve hasta `limite` tuplas (id, enunciado, huella) ordenadas por id.
+    """
+    with _conexion_o(conn) as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT e.id, e.enunciado, e.huella
+            FROM ejercicios e LEFT JOIN ejercicios_minhash m ON m.ejercicio_id = e.id
+            WHERE e.id > ? AND e.retirado = 0
+              AND (m.ejercicio_id IS NULL OR m.huella IS NOT e.huella OR m.version_firma != ?)
+            ORDER BY e.id LIMIT ?
+        """, (despues_de, version, limite))
+        rows = c.fetchall()
+    return rows
+
+def guardar_firmas_minhash(filas: List[tuple], version: int = 0, conn: Optional[sqlite3.Connection] = None):
+    """
+    Guarda (o reemplaza) firmas y buckets en una sola transacción.
+    filas: [(ejercicio_id, huella, firma_bytes, [(banda, bucket), ...]), ...]
+    version: versión del cálculo de las firmas (ver read_pendientes_minhash).
+    conn: ver _conexion_o.
+    """
+    if not filas:
+        return
+    with _conexion_o(conn) as propia:
+        c = propia.cursor()
+        c.executemany("DELETE FROM ejercicios_lsh WHERE ejercicio_id = ?", [(f[0],) for f in filas])
+        c.executemany("""
+            INSERT OR REPLACE INTO ejercicios_minhash(ejercicio_id, huella, firma, version_firma) VALUES (?, ?, ?, ?)
+        """, [(f[0], f[1], f[2], version) for f in filas])
+        c.executemany("""
+            INSERT OR IGNORE INTO ejercicios_lsh(banda, bucket, ejercicio_id) VALUES (?, ?, ?)
+        """, [(banda, bucket, f[0]) for f in filas for banda, bucket in f[3]])
+        if conn is None:
+            propia.commit()
+
+def read_candidatos_lsh(buckets: List[tuple], conn: Optional[sqlite3.Connection] = None) -> Dict[tuple, List[int]]:
+    """
+    Busca por índice los ejercicios activos que comparten alguno de los buckets.
+    buckets: [(banda, bucket), ...]  ->  {(banda, bucket): [ejercicio_id, ...]}
+    """
+    resultado: Dict[tuple, List[int]] = {}
+    buckets = list(set(buckets))
+    if not buckets:
+        return resultado
+    with _conexion_o(conn) as conn:
+        c = conn.cursor()
+        for i in range(0, len(buckets), BATCH_SIZE):
+            parte = buckets[i:i + BATCH_SIZE]
+            valores = ", ".join("(?, ?)" for _ in parte)
+            # CROSS JOIN fija el orden: de cada bucket pedido al índice, nunca un scan de ejercicios
+            c.execute(f"""
+                SELECT l.banda, l.bucket, l.ejercicio_id
+                FROM (VALUES {valores}) v
+                CROSS JOIN ejercicios_lsh l CROSS JOIN ejercicios e
+                WHERE l.banda = v.column1 AND l.bucket = v.column2
+                  AND e.id = l.ejercicio_id AND e.retirado = 0
+            """, [v for par in parte for v in par])
+            for banda, bucket, ejercicio_id in c.fetchall():
+                resultado.setdefault((banda, bucket), []).append(ejercicio_id)
+    return resultado
+
+def read_firmas_minhash(ids: Iterable[int], conn: Optional[sqlite3.Connection] = None) -> Dict[int, bytes]:
+    """Devuelve {ejercicio_id: firma} para los ids dados."""
+    ids = list(set(ids))
+    resultado: Dict[int, bytes] = {}
+    if not ids:
+        return resultado
+    with _conexion_o(conn) as conn:
+        c = conn.cursor()
+        for i in range(0, len(ids), BATCH_SIZE):
+            parte = ids[i:i + BATCH_SIZE]
+            c.execute(f"""
+                SELECT ejercicio_id, firma FROM ejercicios_minhash
+                WHERE ejercicio_id IN ({", ".join("?" * len(parte))})
+            """, parte)
+            resultado.update(c.fetchall())
+    return resultado
+
+def read_colisiones_lsh() -> List[List[int]]:
+    """Grupos de ejercicios activos que caen en el mismo bucket de alguna banda."""
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT GROUP_CONCAT(l.ejercicio_id)
+            FROM ejercicios_lsh l JOIN ejercicios e ON e.id = l.ejercicio_id
+            WHERE e.retirado = 0
+            GROUP BY l.banda, l.bucket HAVING COUNT(*) > 1
+        """)
+        grupos = [[int(i) for i in r[0].split(",")] for r in c.fetchall()]
+    return grupos
+
+# ----------------- SEMESTRES / PRÁCTICAS ----------------- #
+def read_semestre_actual() -> Optional[Dict]:
+    """
+    Semestre en curso: el que contiene la fecha de hoy (fecha_inicio..fecha_fin);
+    si ninguno la contiene, el último registrado. None si no hay semestres.
+    """
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT id, nombre, fecha_inicio, fecha_fin FROM semestres
+            ORDER BY (date('now') BETWEEN fecha_inicio AND fecha_fin) DESC, id DESC
+            LIMIT 1
+        """)
+        r = c.fetchone()
+    if r is None:
+        return None
+    return {'id': r[0], 'nombre': r[1], 'fecha_inicio': r[2], 'fecha_fin': r[3]}
+
+def read_semestre_por_nombre(nombre: str) -> Optional[Dict]:
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, nombre, fecha_inicio, fecha_fin FROM semestres WHERE nombre = ? ORDER BY id DESC", (nombre,))
+        r = c.fetchone()
+    if r is None:
+        return None
+    return {'id': r[0], 'nombre': r[1], 'fecha_inicio': r[2], 'fecha_fin': r[3]}
+
+def create_semestre(nombre: str, fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None) -> int:
+    """Registra un semestre y devuelve su id."""
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO semestres (nombre, fecha_inicio, fecha_fin) VALUES (?, ?, ?)",
+            (nombre, fecha_inicio, fecha_fin)
+        )
+        conn.commit()
+        return c.lastrowid
+
+def registrar_asignaciones(semestre_id: int, variantes: Iterable[Iterable[int]]) -> int:
+    """
+    Guarda en ejercicios_semestre las prácticas de un lote (variante i = lista de
+    ids del estudiante i), marcadas como usadas, en UNA transacción.
+    Retorna la cantidad de filas insertadas.
+    """
+    filas = (
+        (semestre_id, ejercicio_id, i)
+        for i, ids in enumerate(variantes)
+        for ejercicio_id in ids
+    )
+    with conexion() as conn:
+        c = conn.cursor()
+        c.executemany("""
+            INSERT INTO ejercicios_semestre (semestre_id, ejercicio_id, usado_en_practica, variante)
+            VALUES (?, ?, 1, ?)
+        """, filas)
+        conn.commit()
+        return c.rowcount
+
+def read_asignaciones(semestre_id: int) -> Dict[int, List[int]]:
+    """{variante: [ids]} de las prácticas asignadas en el semestre (en orden de asignación)."""
+    asignaciones: Dict[int, List[int]] = {}
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT variante, ejercicio_id FROM ejercicios_semestre
+            WHERE semestre_id = ? AND variante IS NOT NULL
+            ORDER BY variante, id
+        """, (semestre_id,))
+        for variante, ejercicio_id in c.fetchall():
+            asignaciones.setdefault(variante, []).append(ejercicio_id)
+    return asignaciones
+
+def read_estadisticas() -> Dict:
+    """Conteos generales del banco (ejercicios por tema, semestres, asignaciones, validaciones)."""
+    with conexion() as conn:
+        c = conn.cursor()
+        activos, retirados = c.execute(
+            "SELECT COALESCE(SUM(retirado = 0), 0), COALESCE(SUM(retirado = 1), 0) FROM ejercicios"
+        ).fetchone()
+        por_tema = c.execute("""
+            SELECT tema, COUNT(*) FROM ejercicios WHERE retirado = 0
+            GROUP BY tema ORDER BY COUNT(*) DESC, tema
+        """).fetchall()
+        archivos = c.execute("SELECT COUNT(*) FROM archivos_ingestados").fetchone()[0]
+        semestres = c.execute("SELECT COUNT(*) FROM semestres").fetchone()[0]
+        asignaciones = c.execute("SELECT COUNT(*) FROM ejercicios_semestre").fetchone()[0]
+        validaciones = c.execute("SELECT estado, COUNT(*) FROM validaciones GROUP BY estado ORDER BY estado").fetchall()
+    return {
+        'ejercicios': activos,
+        'retirados': retirados,
+        'por_tema': dict(por_tema),
+        'archivos_ingestados': archivos,
+        'semestres': semestres,
+        'asignaciones': asignaciones,
+        'validaciones': dict(validaciones),
+    }
+
+def read_ids_por_estrato(excluir_semestre_id: Optional[int] = None) -> Dict[Tuple[str, str], array]:
+    """
+    {(tema, subtema): array de ids} de los ejercicios activos, recorriendo sólo
+    (id, tema, subtema) por el índice idx_ejercicios_tema_subtema.
+    excluir_semestre_id: omite los ya usados en una práctica de ese semestre.
+    """
+    consulta = "SELECT id, tema, COALESCE(subtema, '') FROM ejercicios e WHERE retirado = 0"
+    params: list = []
+    if excluir_semestre_id is not None:
+        consulta += """
+            AND NOT EXISTS (
+                SELECT 1 FROM ejercicios_semestre es
+                WHERE es.ejercicio_id = e.id AND es.semestre_id = ? AND es.usado_en_practica = 1
+            )"""
+        params.append(excluir_semestre_id)
+    consulta += " ORDER BY tema, subtema, id"
+
+    estratos: Dict[Tuple[str, str], array] = {}
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute(consulta, params)
+        while True:
+            filas = c.fetchmany(BATCH_SIZE)
+            if not filas:
+                break
+            for ejercicio_id, tema, subtema in filas:
+                ids = estratos.get((tema, subtema))
+                if ids is None:
+                    ids = estratos[(tema, subtema)] = array('q')
+                ids.append(ejercicio_id)
+    return estratos
+
+# ----------------- HISTORIAL ----------------- #
+# (lee los agregados uso_* que mantienen los triggers de _init_historial)
+def read_resumen_semestres() -> List[Dict]:
+    """Semestres (del más reciente al más antiguo) con asignaciones, ejercicios distintos y temas usados."""
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT s.id, s.nombre, s.fecha_inicio, s.fecha_fin,
+                   COALESCE(SUM(t.asignaciones), 0), COALESCE(SUM(t.ejercicios), 0), COUNT(DISTINCT t.tema)
+            FROM semestres s LEFT JOIN uso_semestre_tema t ON t.semestre_id = s.id
+            GROUP BY s.id ORDER BY s.id DESC
+        """)
+        rows = c.fetchall()
+    return [
+        {'id': r[0], 'nombre': r[1], 'fecha_inicio': r[2], 'fecha_fin': r[3],
+         'asignaciones': r[4], 'ejercicios': r[5], 'temas': r[6]}
+        for r in rows
+    ]
+
+def read_uso_por_tema(semestre_id: Optional[int] = None) -> List[Dict]:
+    """
+    Uso por (tema, subtema): asignaciones, ejercicios distintos usados y
+    ejercicios activos del banco en ese subtema. Sin semestre_id, sobre todo el
+    historial. Incluye los subtemas del banco que nunca se usaron.
+    """
+    with conexion() as conn:
+        c = conn.cursor()
+        if semestre_id is None:
+            c.execute("""
+                SELECT tema, subtema, SUM(asignaciones), COUNT(DISTINCT ejercicio_id) FROM uso_semestre_ejercicio
+                GROUP BY tema, subtema
+            """)
+        else:
+            c.execute("""
+                SELECT tema, subtema, asignaciones, ejercicios FROM uso_semestre_tema WHERE semestre_id = ?
+            """, (semestre_id,))
+        uso = {(r[0], r[1]): (r[2], r[3]) for r in c.fetchall()}
+        c.execute("""
+            SELECT tema, COALESCE(subtema, ''), COUNT(*) FROM ejercicios WHERE retirado = 0
+            GROUP BY tema, subtema
+        """)
+        banco = {(r[0], r[1]): r[2] for r in c.fetchall()}
+    return [
+        {'tema': tema, 'subtema': subtema, 'asignaciones': uso.get((tema, subtema), (0, 0))[0],
+         'ejercicios': uso.get((tema, subtema), (0, 0))[1], 'banco': banco.get((tema, subtema), 0)}
+        for tema, subtema in sorted(uso.keys() | banco.keys())
+    ]
+
+def read_frecuencia_reuso() -> Dict[int, int]:
+    """{cantidad de semestres en que se usó: cantidad de ejercicios activos}; la clave 0 son los nunca usados."""
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT u.semestres, COUNT(*) FROM uso_ejercicio u JOIN ejercicios e ON e.id = u.ejercicio_id
+            WHERE e.retirado = 0 AND u.semestres > 0 GROUP BY u.semestres
+        """)
+        frecuencia = dict(c.fetchall())
+        c.execute("""
+            SELECT COUNT(*) FROM ejercicios e
+            WHERE e.retirado = 0 AND NOT EXISTS (SELECT 1 FROM uso_ejercicio u WHERE u.ejercicio_id = e.id)
+        """)
+        frecuencia[0] = c.fetchone()[0]
+    return dict(sorted(frecuencia.items()))
+
+def read_mas_reusados(limite: int = 20) -> List[Dict]:
+    """Ejercicios activos usados en más semestres (y más veces), con el último semestre en que se usaron."""
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT e.id, e.numero, e.tema, e.subtema, e.enunciado, e.archivo_origen,
+                   u.semestres, u.asignaciones, s.nombre
+            FROM uso_ejercicio u
+            JOIN ejercicios e ON e.id = u.ejercicio_id
+            LEFT JOIN semestres s ON s.id = u.ultimo_semestre_id
+            WHERE e.retirado = 0
+            ORDER BY u.semestres DESC, u.asignaciones DESC
+            LIMIT ?
+        """, (limite,))
+        rows = c.fetchall()
+    return [
+        {'id': r[0], 'numero': r[1], 'tema': r[2], 'subtema': r[3], 'enunciado': r[4], 'archivo_origen': r[5],
+         'semestres': r[6], 'asignaciones': r[7], 'ultimo_semestre': r[8]}
+        for r in rows
+    ]
+
+def read_nunca_usados_por_tema() -> List[Tuple[str, str, int]]:
+    """[(tema, subtema, cantidad)] de ejercicios activos que nunca se asignaron en un semestre."""
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT tema, COALESCE(subtema, ''), COUNT(*) FROM ejercicios e
+            WHERE e.retirado = 0 AND NOT EXISTS (SELECT 1 FROM uso_ejercicio u WHERE u.ejercicio_id = e.id)
+            GROUP BY tema, subtema ORDER BY tema, subtema
+        """)
+        return c.fetchall()
+
+# ----------------- PLANTILLAS / INSTANCIAS ----------------- #
+def _huella_definicion(definicion: str) -> str:
+    return hashlib.blake2b(definicion.encode("utf-8"), digest_size=16).hexdigest()
+
+def guardar_plantillas(filas: Iterable[Tuple[str, str, str]], archivo_origen: Optional[str] = None,
+                       conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    filas: (archivo_origen, numero, definicion JSON). Asocia cada definición al
+    ejercicio activo con ese (archivo_origen, numero); si la definición cambió,
+    sus instancias se descartan. Con archivo_origen, la lista es la del archivo
+    completo: las plantillas de ese archivo que ya no están se borran.
+    conn: ver _conexion_o.
+    Retorna cuántas plantillas se crearon o cambiaron.
+    """
+    cambiadas = 0
+    vigentes = set()
+    with _conexion_o(conn) as propia:
+        c = propia.cursor()
+        for origen, numero, definicion in filas:
+            fila = c.execute(
+                "SELECT id FROM ejercicios WHERE archivo_origen = ? AND numero = ? AND retirado = 0",
+                (origen, numero)
+            ).fetchone()
+            if fila is None:
+                continue
+            vigentes.add(fila[0])
+            huella = _huella_definicion(definicion)
+            previa = c.execute("SELECT huella FROM plantillas WHERE ejercicio_id = ?", (fila[0],)).fetchone()
+            if previa is not None and previa[0] == huella:
+                continue
+            c.execute("DELETE FROM instancias WHERE plantilla_id = ?", (fila[0],))
+            c.execute("INSERT OR REPLACE INTO plantillas(ejercicio_id, definicion, huella) VALUES (?, ?, ?)",
+                      (fila[0], definicion, huella))
+            cambiadas += 1
+        if archivo_origen is not None:
+            sobrantes = [r[0] for r in c.execute("""
+                SELECT p.ejercicio_id FROM plantillas p JOIN ejercicios e ON e.id = p.ejercicio_id
+                WHERE e.archivo_origen = ?
+            """, (archivo_origen,)) if r[0] not in vigentes]
+            c.executemany("DELETE FROM instancias WHERE plantilla_id = ?", [(i,) for i in sobrantes])
+            c.executemany("DELETE FROM plantillas WHERE ejercicio_id = ?", [(i,) for i in sobrantes])
+        if conn is None:
+            propia.commit()
+    return cambiadas
+
+def read_plantillas() -> List[Tuple[int, str, str]]:
+    """[(ejercicio_id, definicion, huella)] de las plantillas de ejercicios activos."""
+    with conexion() as conn:
+        return conn.execute("""
+            SELECT p.ejercicio_id, p.definicion, p.huella
+            FROM plantillas p JOIN ejercicios e ON e.id = p.ejercicio_id
+            WHERE e.retirado = 0 ORDER BY p.ejercicio_id
+        """).fetchall()
+
+def read_parametros_instancias() -> Dict[int, set]:
+    """{plantilla_id: {parametros}} de las instancias ya generadas (en cualquier estado)."""
+    existentes: Dict[int, set] = {}
+    with conexion() as conn:
+        for plantilla_id, parametros in conn.execute("SELECT plantilla_id, parametros FROM instancias"):
+            existentes.setdefault(plantilla_id, set()).add(parametros)
+    return existentes
+
+def read_huellas_ocupadas() -> set:
+    """Huellas de enunciado de los ejercicios activos y de las instancias ya generadas."""
+    with conexion() as conn:
+        huellas = {r[0] for r in conn.execute("SELECT huella FROM ejercicios WHERE retirado = 0")}
+        huellas.update(r[0] for r in conn.execute("SELECT huella FROM instancias WHERE huella IS NOT NULL"))
+    return huellas
+
+def guardar_instancias(filas: Iterable[Tuple[int, str, str, Optional[str], str, str, str, str, str]]) -> int:
+    """
+    filas: (plantilla_id, huella de la plantilla, parametros, huella del
+    enunciado, enunciado, condiciones, respuesta, estado, detalle). Una fila
+    sólo se guarda si la plantilla sigue teniendo esa huella (no se mezclan
+    instancias de una definición que cambió mientras se generaban).
+    Retorna cuántas se guardaron.
+    """
+    with conexion() as conn:
+        c = conn.cursor()
+        guardadas = 0
+        for plantilla_id, huella, parametros, huella_instancia, enunciado, condiciones, respuesta, estado, detalle in filas:
+            c.execute("""
+                INSERT OR IGNORE INTO instancias(plantilla_id, parametros, huella, enunciado, condiciones, respuesta, estado, detalle)
+                SELECT ?, ?, ?, ?, ?, ?, ?, ? WHERE EXISTS (
+                    SELECT 1 FROM plantillas WHERE ejercicio_id = ? AND huella = ?
+                )
+            """, (plantilla_id, parametros, huella_instancia, enunciado, condiciones, respuesta, estado, detalle,
+                  plantilla_id, huella))
+            guardadas += c.rowcount
+        conn.commit()
+    return guardadas
+
+def read_ids_instancias(estado: str = "valido") -> Dict[int, array]:
+    """{plantilla_id: array de ids de instancias} (en ese estado) de las plantillas de ejercicios activos."""
+    pool: Dict[int, array] = {}
+    with conexion() as conn:
+        c = conn.execute("""
+            SELECT i.plantilla_id, i.id FROM instancias i JOIN ejercicios e ON e.id = i.plantilla_id
+            WHERE i.estado = ? AND e.retirado = 0 ORDER BY i.plantilla_id, i.id
+        """, (estado,))
+        for plantilla_id, instancia_id in c:
+            ids = pool.get(plantilla_id)
+            if ids is None:
+                ids = pool[plantilla_id] = array('q')
+            ids.append(instancia_id)
+    return pool
+
+def read_instancias_por_ids(ids: Iterable[int]) -> Dict[int, Dict]:
+    """{id: {'id', 'plantilla_id', 'parametros', 'enunciado', 'condiciones', 'respuesta'}}"""
+    ids = list(ids)
+    resultado: Dict[int, Dict] = {}
+    with conexion() as conn:
+        c = conn.cursor()
+        for i in range(0, len(ids), BATCH_SIZE):
+            parte = ids[i:i + BATCH_SIZE]
+            c.execute(f"""
+                SELECT id, plantilla_id, parametros, enunciado, condiciones, respuesta
+                FROM instancias WHERE id IN ({", ".join("?" * len(parte))})
+            """, parte)
+            for r in c.fetchall():
+                resultado[r[0]] = dict(zip(('id', 'plantilla_id', 'parametros', 'enunciado', 'condiciones', 'respuesta'), r))
+    return resultado
+
+def read_resumen_instancias() -> Dict[str, int]:
+    """{estado: cantidad} de las instancias de plantillas activas, más 'plantillas'."""
+    with conexion() as conn:
+        c = conn.cursor()
+        resumen = dict(c.execute("""
+            SELECT i.estado, COUNT(*) FROM instancias i JOIN ejercicios e ON e.id = i.plantilla_id
+            WHERE e.retirado = 0 GROUP BY i.estado
+        """).fetchall())
+        resumen['plantillas'] = c.execute("""
+            SELECT COUNT(*) FROM plantillas p JOIN ejercicios e ON e.id = p.ejercicio_id WHERE e.retirado = 0
+        """).fetchone()[0]
+    return resumen
+
+# ----------------- SNAPSHOTS ----------------- #
+# columnas de cada tabla que viajan en un snapshot (services/snapshot_service.py), en orden de restauración
+COLUMNAS_SNAPSHOT = {
+    'semestres': ('id', 'nombre', 'fecha_inicio', 'fecha_fin'),
+    'ejercicios': ('id', 'numero', 'tema', 'subtema', 'enunciado', 'condiciones', 'respuesta',
+                   'archivo_origen', 'fecha_registro', 'retirado', 'huella'),
+    'ejercicios_semestre': ('id', 'semestre_id', 'ejercicio_id', 'fecha_asignacion', 'usado_en_practica', 'variante'),
+}
+# derivadas de ejercicios por id: al reemplazar el banco quedan vacías y se rehacen solas
+# (firmas MinHash en la próxima ingesta, instancias con generar_pool, manifiesto con la próxima sincronización)
+_TABLAS_DERIVADAS = ('instancias', 'plantillas', 'ejercicios_lsh', 'ejercicios_minhash', 'archivos_ingestados')
+# triggers por fila que el reemplazo suspende y compensa al final con una sola operación
+_TRIGGERS_REEMPLAZO = ('ejercicios_fts_%', 'ejercicios_semestre_uso_%', 'ejercicios_version_%')
+
+def read_tablas_snapshot() -> Dict[str, List[tuple]]:
+    """{tabla: filas} de COLUMNAS_SNAPSHOT, leídas en una sola transacción (un estado consistente)."""
+    with conexion() as conn, _lectura_consistente(conn):
+        return {
+            tabla: conn.execute(f"SELECT {', '.join(columnas)} FROM {tabla} ORDER BY id").fetchall()
+            for tabla, columnas in COLUMNAS_SNAPSHOT.items()
+        }
+
+@contextmanager
+def _sin_triggers(conn: sqlite3.Connection, patrones: Iterable[str]):
+    """
+    Quita los triggers (LIKE patrones) dentro de la transacción en curso y los
+    vuelve a crear al salir. Si el bloque falla no se recrean: el rollback de
+    la transacción los restituye (el DDL de SQLite es transaccional).
+    """
+    guardados = []
+    for patron in patrones:
+        guardados += conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", (patron,)
+        ).fetchall()
+    for nombre, _ in guardados:
+        conn.execute(f"DROP TRIGGER {nombre}")
+    yield
+    for _, sql in guardados:
+        conn.execute(sql)
+
+def reemplazar_con_snapshot(tablas: Dict[str, Iterable[tuple]]) -> Dict[str, int]:
+    """
+    Reemplaza semestres, ejercicios y asignaciones por las filas dadas (mismos
+    ids; columnas de COLUMNAS_SNAPSHOT) en UNA transacción: si algo falla, la
+    DB queda como estaba. Los triggers por fila (FTS, historial, versión del
+    catálogo) se suspenden y al final se reconstruyen el índice FTS y los
+    agregados del historial y se sube una vez la versión del catálogo.
+    Retorna {tabla: filas insertadas}.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        with _sin_triggers(conn, _TRIGGERS_REEMPLAZO):
+            for tabla in _TABLAS_DERIVADAS + ('uso_semestre_ejercicio', 'uso_semestre_tema', 'uso_ejercicio',
+                                              'ejercicios_semestre', 'ejercicios', 'semestres'):
+                conn.execute(f"DELETE FROM {tabla}")
+            insertadas = {}
+            for tabla, columnas in COLUMNAS_SNAPSHOT.items():
+                c = conn.executemany(
+                    f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})",
+                    tablas.get(tabla, ())
+                )
+                insertadas[tabla] = c.rowcount
+            conn.execute("INSERT INTO ejercicios_fts(ejercicios_fts) VALUES ('rebuild')")
+            _recalcular_historial(conn)
+            conn.execute("UPDATE catalogo_version SET version = version + 1 WHERE id = 1")
+        conn.commit()
+        return insertadas
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _fusionar_ejercicios(conn: sqlite3.Connection, filas: Iterable[tuple], resumen: Dict) -> Dict[int, int]:
+    """
+    Inserta los ejercicios con huella nueva y reactiva los que vienen activos y
+    en la DB sólo están retirados. Retorna {id en el snapshot: id local}.
+    """
+    c = conn.cursor()
+    ultimo_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM ejercicios").fetchone()[0]
+    # huella -> (id local, retirado); el orden hace que gane el activo de menor id
+    por_huella = {huella: (i, retirado) for huella, i, retirado in
+                  c.execute("SELECT huella, id, retirado FROM ejercicios ORDER BY retirado DESC, id DESC")}
+    ids: Dict[int, int] = {}
+    with _sin_triggers(conn, ('ejercicios_fts_%', 'ejercicios_version_%')):
+        # los activos primero: si una huella viene activa y retirada, queda la activa
+        retirado = COLUMNAS_SNAPSHOT['ejercicios'].index('retirado')
+        for fila in sorted(filas, key=lambda f: bool(f[retirado])):
+            huella = fila[-1] or huella_enunciado(fila[4])
+            local, local_retirado = por_huella.get(huella, (None, None))
+            if local is None:
+                c.execute(f"""
+                    INSERT INTO ejercicios ({', '.join(COLUMNAS_SNAPSHOT['ejercicios'][1:])})
+                    VALUES ({', '.join('?' * (len(fila) - 1))})
+                """, fila[1:-1] + (huella,))
+                local = c.lastrowid
+                por_huella[huella] = (local, fila[retirado])
+                resumen['ejercicios'] += 1
+            elif local_retirado and not fila[retirado]:
+                # es la única fila con esa huella (si hubiera una activa, habría ganado): no choca con el UNIQUE
+                c.execute("UPDATE ejercicios SET retirado = 0 WHERE id = ?", (local,))
+                por_huella[huella] = (local, 0)
+                resumen['ejercicios_reactivados'] += 1
+            else:
+                resumen['ejercicios_existentes'] += 1
+            ids[fila[0]] = local
+        # lo que harían los triggers, una vez para todos los nuevos (AUTOINCREMENT: ids > ultimo_id)
+        cols = ", ".join(COLUMNAS_FTS)
+        c.execute(f"INSERT INTO ejercicios_fts(rowid, {cols}) SELECT id, {cols} FROM ejercicios WHERE id > ?",
+                  (ultimo_id,))
+        c.execute("UPDATE catalogo_version SET version = version + 1 WHERE id = 1")
+    return ids
+
+def fusionar_snapshot(tablas: Dict[str, Iterable[tuple]]) -> Dict[str, int]:
+    """
+    Agrega las filas de un snapshot a la DB actual en UNA transacción:
+      - un ejercicio cuya huella de enunciado ya existe no se inserta (se usa el
+        de la DB, preferentemente activo); si viene activo y en la DB sólo está
+        retirado, se reactiva. Los demás reciben ids nuevos;
+      - los semestres se identifican por nombre;
+      - las asignaciones se traducen a los ids locales y se omiten las que ya
+        están (mismo semestre, ejercicio, variante y fecha): fusionar dos veces
+        el mismo snapshot no duplica nada.
+    Como en el reemplazo, los triggers por fila de FTS y de la versión del
+    catálogo se suspenden y los ejercicios nuevos se indexan con un solo
+    INSERT ... SELECT.
+    Retorna {'ejercicios', 'ejercicios_existentes', 'ejercicios_reactivados', 'semestres',
+             'semestres_existentes', 'asignaciones', 'asignaciones_existentes'}.
+    """
+    resumen = dict.fromkeys(('ejercicios', 'ejercicios_existentes', 'ejercicios_reactivados',
+                             'semestres', 'semestres_existentes',
+                             'asignaciones', 'asignaciones_existentes'), 0)
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        ids_ejercicio = _fusionar_ejercicios(conn, tablas.get('ejercicios', ()), resumen)
+        c = conn.cursor()
+
+        por_nombre = {nombre: i for i, nombre in c.execute("SELECT id, nombre FROM semestres ORDER BY id DESC")}
+        ids_semestre: Dict[int, int] = {}
+        for semestre_id, nombre, fecha_inicio, fecha_fin in tablas.get('semestres', ()):
+            local = por_nombre.get(nombre)
+            if local is None:
+                c.execute("INSERT INTO semestres (nombre, fecha_inicio, fecha_fin) VALUES (?, ?, ?)",
+                          (nombre, fecha_inicio, fecha_fin))
+                local = por_nombre[nombre] = c.lastrowid
+                resumen['semestres'] += 1
+            else:
+                resumen['semestres_existentes'] += 1
+            ids_semestre[semestre_id] = local
+
+        existentes = set(c.execute(
+            "SELECT semestre_id, ejercicio_id, variante, fecha_asignacion FROM ejercicios_semestre"
+        ))
+        nuevas = []
+        for _, semestre_id, ejercicio_id, fecha, usado, variante in tablas.get('ejercicios_semestre', ()):
+            clave = (ids_semestre.get(semestre_id), ids_ejercicio.get(ejercicio_id), variante, fecha)
+            if None in clave[:2]:
+                continue  # referencia a una fila que no viajó en el snapshot
+            if clave in existentes:
+                resumen['asignaciones_existentes'] += 1
+                continue
+            existentes.add(clave)
+            nuevas.append((clave[0], clave[1], fecha, usado, variante))
+        c.executemany("""
+            INSERT INTO ejercicios_semestre (semestre_id, ejercicio_id, fecha_asignacion, usado_en_practica, variante)
+            VALUES (?, ?, ?, ?, ?)
+        """, nuevas)
+        resumen['asignaciones'] = len(nuevas)
+        conn.commit()
+        return resumen
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+# ----------------- VALIDACIONES ----------------- #
+def read_validaciones(claves: Iterable[str]) -> Dict[str, Dict]:
+    """{clave: {'estado', 'detalle', 'duracion'}} de las claves ya validadas."""
+    claves = list(claves)
+    resultado: Dict[str, Dict] = {}
+    with conexion() as conn:
+        c = conn.cursor()
+        for i in range(0, len(claves), BATCH_SIZE):
+            parte = claves[i:i + BATCH_SIZE]
+            c.execute(f"""
+                SELECT clave, estado, detalle, duracion FROM validaciones
+                WHERE clave IN ({", ".join("?" * len(parte))})
+            """, parte)
+            for r in c.fetchall():
+                resultado[r[0]] = {'estado': r[1], 'detalle': r[2], 'duracion': r[3]}
+    return resultado
+
+def guardar_validaciones(filas: Iterable[Tuple[str, str, str, float]]):
+    """Guarda (clave, estado, detalle, duracion) en una transacción (reemplaza las existentes)."""
+    with conexion() as conn:
+        conn.executemany("""
+            INSERT INTO validaciones (clave, estado, detalle, duracion) VALUES (?, ?, ?, ?)
+            ON CONFLICT(clave) DO UPDATE SET
+                estado = excluded.estado, detalle = excluded.detalle,
+                duracion = excluded.duracion, fecha_validacion = CURRENT_TIMESTAMP
+        """, filas)
+        conn.commit()
+
+# ----------------- EXPRESIONES ----------------- #
+def read_expresiones(claves: Iterable[str]) -> Dict[str, Tuple[Optional[bytes], Optional[str]]]:
+    """{clave: (arbol, error)} de las fórmulas ya cacheadas."""
+    claves = list(claves)
+    resultado: Dict[str, Tuple[Optional[bytes], Optional[str]]] = {}
+    with conexion() as conn:
+        c = conn.cursor()
+        for i in range(0, len(claves), BATCH_SIZE):
+            parte = claves[i:i + BATCH_SIZE]
+            c.execute(f"SELECT clave, arbol, error FROM expresiones WHERE clave IN ({', '.join('?' * len(parte))})", parte)
+            for clave, arbol, error in c.fetchall():
+                resultado[clave] = (arbol, error)
+    return resultado
+
+def guardar_expresiones(filas: Iterable[Tuple[str, Optional[bytes], Optional[str]]]):
+    """Guarda (clave, arbol, error) en una transacción; las claves existentes se dejan como están."""
+    with conexion() as conn:
+        conn.executemany("INSERT OR IGNORE INTO expresiones (clave, arbol, error) VALUES (?, ?, ?)", filas)
+        conn.commit()
+
 # ----------------- EXISTENCE ----------------- #
 def exists_ejercicio(numero: str) -> bool:
     """
     Retorna True si ya existe un ejercicio con ese número.
     """
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM ejercicios WHERE numero = ?", (numero,))
-    res = c.fetchone()
-    conn.close()
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM ejercicios WHERE numero = ?", (numero,))
+        res = c.fetchone()
     return res is not None
 
 def exists_ejercicio_por_enunciado(enunciado: str) -> bool:
     """
-    Retorna True si ya existe un ejercicio con el mismo enunciado (texto exacto).
+    Retorna True si ya existe un ejercicio con el mismo enunciado, comparando la
+    huella normalizada (espacios y macros de espaciado no cuentan). Usa el índice.
     """
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM ejercicios WHERE TRIM(enunciado) = TRIM(?)", (enunciado,))
-    res = c.fetchone()
-    conn.close()
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM ejercicios WHERE huella = ? AND retirado = 0", (huella_enunciado(enunciado),))
+        res = c.fetchone()
     return res is not None
 
 
@@ -107,20 +1680,58 @@ def update_ejercicio(numero: str, cambios: Dict):
     """
     if not cambios:
         return
-    conn = get_connection()
-    c = conn.cursor()
-    sets = ", ".join([f"{k} = ?" for k in cambios.keys()])
-    c.execute(f"UPDATE ejercicios SET {sets} WHERE numero = ?", (*cambios.values(), numero))
-    conn.commit()
-    conn.close()
+    if 'enunciado' in cambios:
+        cambios = {**cambios, 'huella': huella_enunciado(cambios['enunciado'])}
+    with conexion() as conn:
+        c = conn.cursor()
+        sets = ", ".join([f"{k} = ?" for k in cambios.keys()])
+        c.execute(f"UPDATE ejercicios SET {sets} WHERE numero = ?", (*cambios.values(), numero))
+        conn.commit()
+
+def update_ejercicio_por_id(ejercicio_id: int, cambios: Dict, conn: Optional[sqlite3.Connection] = None):
+    """
+    Actualiza un ejercicio por su id (el número sólo es único dentro de un archivo).
+    cambios: dict con columnas y nuevos valores.
+    conn: ver _conexion_o (si el UPDATE falla, la transacción del llamador sigue abierta).
+    """
+    if not cambios:
+        return
+    if 'enunciado' in cambios:
+        cambios = {**cambios, 'huella': huella_enunciado(cambios['enunciado'])}
+    with _conexion_o(conn) as propia:
+        c = propia.cursor()
+        sets = ", ".join([f"{k} = ?" for k in cambios.keys()])
+        c.execute(f"UPDATE ejercicios SET {sets} WHERE id = ?", (*cambios.values(), ejercicio_id))
+        if conn is None:
+            propia.commit()
+
+def retirar_ejercicios(ids: List[int], conn: Optional[sqlite3.Connection] = None):
+    """
+    Marca como retirados los ejercicios dados. No se borran para no romper las
+    referencias de ejercicios_semestre (historial). conn: ver _conexion_o.
+    """
+    if not ids:
+        return
+    with _conexion_o(conn) as propia:
+        c = propia.cursor()
+        c.executemany("UPDATE ejercicios SET retirado = 1 WHERE id = ?", [(i,) for i in ids])
+        if conn is None:
+            propia.commit()
 
 # ----------------- DELETE ----------------- #
 def delete_ejercicio(numero: str):
     """
     Elimina un ejercicio por su número.
     """
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM ejercicios WHERE numero = ?", (numero,))
-    conn.commit()
-    conn.close()
+    with conexion() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM ejercicios WHERE numero = ?", (numero,))
+        conn.commit()
+
+# ----------------- INSTRUMENTACIÓN ----------------- #
+# todas las operaciones públicas cuentan llamadas, filas y tiempo cuando la
+# instrumentación está activa (ver instrumentacion.py); apagada cuesta un if
+instrumentacion.instrumentar_modulo(
+    globals(), "repository",
+    excluir=("configurar", "get_connection", "conexion", "cerrar_conexiones", "conexion_testigo", "init_db")
+)
@@ -0,0 +1,191 @@
+"""
+Instrumentación opcional de los caminos críticos (ingesta y consultas).
+
+Apagada por defecto. Se activa con:
+    EDO_INSTRUMENTAR=1              tiempos y contadores; resumen en stderr al salir
+    EDO_PERFIL=salida.pstats        además perfila con cProfile y guarda el pstats
+o con --instrumentar / --perfil RUTA en main.py y cli.py.
+
+Lo que se mide:
+  - cada función decorada con medir() (y todas las públicas del repositorio,
+    ver instrumentar_modulo): llamadas, filas devueltas y tiempo;
+  - contar(): contadores libres de los bucles de servicio;
+  - registrar_archivo(): por archivo parseado, bytes, ejercicios y ejercicios/s.
+
+Apagada, cada punto instrumentado cuesta leer una variable global y un if.
+Con procesos hijos (-j) sólo se acumula en el proceso principal: del parseo en
+el pool se registra el tiempo por archivo que informa cada hijo.
+"""
+import atexit
+import os
+import sys
+import time
+from functools import wraps
+from types import FunctionType
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+_activo = False
+_pid: Optional[int] = None
+_perfilador = None
+_ruta_perfil: Optional[str] = None
+
+_CO_GENERATOR = 0x20
+
+# nombre -> [llamadas, filas, segundos]
+_tiempos: Dict[str, List[float]] = {}
+_contadores: Dict[str, int] = {}
+# (archivo, bytes, ejercicios, segundos)
+_archivos: List[Tuple[str, int, int, float]] = []
+
+
+def activo() -> bool:
+    return _activo
+
+
+def activar(perfil: Optional[str] = None):
+    """Enciende la instrumentación (y cProfile si se da la ruta del .pstats)."""
+    global _activo, _pid, _perfilador, _ruta_perfil
+    if not _activo:
+        _activo = True
+        _pid = os.getpid()
+        atexit.register(_al_salir)
+    if perfil and _perfilador is None:
+        import cProfile
+        _ruta_perfil = perfil
+        _perfilador = cProfile.Profile()
+        _perfilador.enable()
+
+
+def reiniciar():
+    """Descarta lo acumulado (tiempos, contadores y archivos)."""
+    _tiempos.clear()
+    _contadores.clear()
+    _archivos.clear()
+
+
+# ----------------- PUNTOS DE MEDICIÓN ----------------- #
+def _filas(resultado) -> int:
+    """Filas de un resultado: largo de listas/arrays; un dict de filas cuenta sus valores, una fila suelta 1."""
+    if isinstance(resultado, (list, set, frozenset)) or hasattr(resultado, "typecode"):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        primero = next(iter(resultado.values()), None)
+        return len(resultado) if isinstance(primero, (dict, list, tuple)) or hasattr(primero, "typecode") else 1
+    return 0
+
+
+def medir(nombre: str) -> Callable:
+    """Decorador: acumula llamadas, filas devueltas (si es una colección) y tiempo de la función."""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _activo:
+                return funcion(*args, **kwargs)
+            t0 = time.perf_counter()
+            filas = 0
+            try:
+                resultado = funcion(*args, **kwargs)
+                filas = _filas(resultado)
+                return resultado
+            finally:
+                acumulado = _tiempos.get(nombre)
+                if acumulado is None:
+                    acumulado = _tiempos[nombre] = [0, 0, 0.0]
+                acumulado[0] += 1
+                acumulado[1] += filas
+                acumulado[2] += time.perf_counter() - t0
+        return envoltura
+    return decorador
+
+
+def instrumentar_modulo(espacio: Dict, prefijo: str, excluir: Iterable[str] = ()):
+    """
+    Aplica medir() a todas las funciones públicas definidas en el módulo
+    (espacio = globals() del módulo), salvo los generadores y las de `excluir`.
+    """
+    excluir = set(excluir)
+    modulo = espacio['__name__']
+    for nombre, objeto in list(espacio.items()):
+        # (sin `inspect`: importarlo le suma ~10 ms al arranque de la CLI)
+        if (isinstance(objeto, FunctionType) and objeto.__module__ == modulo and not nombre.startswith("_")
+                and nombre not in excluir and not objeto.__code__.co_flags & _CO_GENERATOR):
+            espacio[nombre] = medir(f"{prefijo}.{nombre}")(objeto)
+
+
+def contar(nombre: str, n: int = 1):
+    if _activo:
+        _contadores[nombre] = _contadores.get(nombre, 0) + n
+
+
+def registrar_archivo(ruta: str, ejercicios: int, segundos: float):
+    """Un archivo parseado: tamaño en bytes, ejercicios y tiempo de parseo."""
+    if _activo:
+        try:
+            tamano = os.path.getsize(ruta)
+        except OSError:
+            tamano = 0
+        _archivos.append((os.path.basename(ruta), tamano, ejercicios, segundos))
+
+
+# ----------------- RESUMEN ----------------- #
+def resumen() -> Dict:
+    """
+    {'funciones': {nombre: {'llamadas', 'filas', 'segundos'}},
+     'contadores': {nombre: n},
+     'archivos': [{'archivo', 'bytes', 'ejercicios', 'segundos'}]}
+    """
+    return {
+        'funciones': {n: {'llamadas': int(ll), 'filas': int(f), 'segundos': s}
+                      for n, (ll, f, s) in _tiempos.items()},
+        'contadores': dict(_contadores),
+        'archivos': [{'archivo': a, 'bytes': b, 'ejercicios': e, 'segundos': s} for a, b, e, s in _archivos],
+    }
+
+
+def imprimir_resumen(salida=None):
+    """Tabla de texto con lo medido (por defecto en stderr), ordenada por tiempo total."""
+    salida = salida or sys.stderr
+    escribir = lambda linea="": print(linea, file=salida)
+
+    escribir("\n── Instrumentación ──")
+    if _tiempos:
+        escribir(f"{'función':44s} {'llamadas':>9s} {'filas':>9s} {'total ms':>10s} {'media ms':>9s}")
+        for nombre, (llamadas, filas, segundos) in sorted(_tiempos.items(), key=lambda t: -t[1][2]):
+            escribir(f"{nombre:44s} {llamadas:9d} {filas:9d} {segundos * 1000:10.2f} "
+                     f"{segundos * 1000 / llamadas:9.3f}")
+    if _contadores:
+        escribir()
+        for nombre, n in sorted(_contadores.items()):
+            escribir(f"{nombre:44s} {n:9d}")
+    if _archivos:
+        escribir()
+        escribir(f"{'archivo parseado':44s} {'KB':>9s} {'ejerc.':>9s} {'ms':>10s} {'ej/s':>9s}")
+        for archivo, tamano, ejercicios, segundos in _archivos:
+            escribir(f"{archivo[:44]:44s} {tamano / 1024:9.1f} {ejercicios:9d} {segundos * 1000:10.2f} "
+                     f"{ejercicios / segundos if segundos else 0:9.0f}")
+
+
+def _al_salir():
+    global _perfilador
+    if os.getpid() != _pid:
+        return  # proceso hijo creado con fork: el resumen es del principal
+    if _perfilador is not None:
+        import pstats
+        _perfilador.disable()
+        _perfilador.dump_stats(_ruta_perfil)
+        print(f"\n── Perfil guardado en {_ruta_perfil} (python -m pstats {_ruta_perfil}) ──", file=sys.stderr)
+        pstats.Stats(_perfilador, stream=sys.stderr).sort_stats("cumulative").print_stats(15)
+        _perfilador = None
+    imprimir_resumen()
+
+
+def _desde_entorno():
+    if not (os.environ.get("EDO_INSTRUMENTAR", "0") not in ("", "0") or os.environ.get("EDO_PERFIL")):
+        return
+    import multiprocessing
+    # los procesos hijos heredan el entorno pero no deben medir ni imprimir su propio resumen
+    if multiprocessing.parent_process() is None:
+        activar(os.environ.get("EDO_PERFIL") or None)
+
+
+_desde_entorno()
@@ -11,11 +11,26 @@ Reglas principales (resumidas):
         ... segundo \[ ... \] --> RESPUESTA
      %% EXERCISE_END
  - **NO** se usa la forma comentada "% condition: ..." (ya no existe en el estándar).
+ - Plantillas paramétricas: coeficientes marcados con \param{expr}{valor} en enunciado,
+   condición o respuesta, y (opcional) "% parametros: a = 1..6; b = 2, 4, 8" en el bloque.
+   El ejercicio se guarda con los valores por defecto y la plantilla va en 'plantilla'
+   (ver services/template_service.py).
  - El parser devuelve los strings interiores de \[ ... \] **sin modificar** (se preserva LaTeX).
+ - iter_ejercicios(ruta_o_stream) es la variante streaming (lectura por fragmentos, memoria
+   constante); parsear_latex(ruta) devuelve la lista completa.
 """
+import hashlib
+import json
 import os
 import re
-from typing import List, Dict, Optional
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+import instrumentacion
+
+# Versión de las reglas de extracción: cambiarla fuerza a re-ingerir todos los
+# archivos en la sincronización incremental (ver services/ingest_service.py).
+PARSER_VERSION = "3"
 
 def listar_tex_files(directorio: str = "data") -> List[str]:
     """Devuelve lista de archivos .tex en el directorio dado."""
@@ -23,11 +38,51 @@ def listar_tex_files(directorio: str = "data") -> List[str]:
         return []
     return [f for f in os.listdir(directorio) if f.lower().endswith(".tex")]
 
+# ---------------- patrones precompilados ---------------- #
+# Un único escáner por alternancia: recorre el documento UNA sola vez y emite los
+# eventos (\maketitle, sección, subsección, inicio y fin de ejercicio) en orden de aparición.
+# Las alternativas se agrupan por prefijo literal (\ y %%) para que el motor descarte
+# rápido cada posición. Las secciones son sensibles a mayúsculas; los marcadores no.
+_TOKEN_RE = re.compile(
+    r'\\(?:(?P<mt>maketitle)|(?P<sec>section|subsection)\*?{(?P<title>[^}]*)})'
+    r'|%%\s*(?i:EXERCISE_(?:(?P<start>START)|(?P<end>END)))'
+)
+_MATH_RE = re.compile(r'\\\[(.*?)\\\]', re.S)
+_ID_RE = re.compile(r'%\s*id\s*:\s*([A-Za-z0-9\-\_]+)', re.I)
+_NUM_RE = re.compile(r'^\s*([0-9]+)\)', re.M)
+_INLINE_COND_RE = re.compile(r'(?<!\\),\s*\\quad')
+_TRAILING_RE = re.compile(r'(?:,|\s)+$')
+_LEADING_COND_RE = re.compile(r'^(?:,|\s|\\quad|\\,)+')
+_RPTA_RE = re.compile(r'\\textbf\{Rpta[:\s]*\}\s*\\\[(.*?)\\\]', re.S | re.I)
+# plantillas paramétricas: \param{expresión}{valor por defecto} y "% parametros: ..."
+_PARAM_RE = re.compile(r'\\param\{([^{}]*)\}\{([^{}]*)\}')
+_PARAMETROS_RE = re.compile(r'%\s*par[aá]metros\s*:\s*(.*)', re.I)
+CAMPOS_PLANTILLA = ('enunciado', 'condiciones', 'respuesta')
+
+# tipos de evento emitidos por _iter_bloques
+EV_MAKETITLE = 'maketitle'
+EV_SECTION = 'section'
+EV_SUBSECTION = 'subsection'
+EV_EJERCICIO = 'exercise'
+
+# lectura por fragmentos: tamaño de cada read() y longitud máxima de un token
+# (p.ej. un \section{...}) que puede quedar partido entre dos lecturas
+_CHUNK_SIZE = 1 << 16
+_MAX_TOKEN = 1 << 12
+
+# normalización de enunciados (huella para detectar duplicados)
+_ESPACIADO_RE = re.compile(
+    r'\\\\'
+    r'|\\(?:[,;:!> ]|(?:q?quad|enspace|(?:neg)?(?:thin|med|thick)space)(?![A-Za-z]))'
+    r'|~'
+)
+_BLANCOS_RE = re.compile(r'\s+')
+_ESPACIO_RE = re.compile(r'(\\[A-Za-z]+) (?=[A-Za-z])| ')
+
 # ---------------- utilidades ---------------- #
 def _extract_math_blocks(text: str) -> List[str]:
     """Devuelve lista del contenido interior de cada \[ ... \] en el texto (sin delimitadores)."""
-    pattern = re.compile(r'\\\[(.*?)\\\]', re.S)
-    return [m.group(1).strip() for m in pattern.finditer(text)]
+    return [m.group(1).strip() for m in _MATH_RE.finditer(text)]
 
 def _clean_condition(text: str) -> str:
     """
@@ -39,166 +94,295 @@ def _clean_condition(text: str) -> str:
         return ""
     s = text.strip()
     # eliminar \quad iniciales o comas precedentes
-    s = re.sub(r'^(?:,|\s|\\quad|\\,)+', '', s)
+    s = _LEADING_COND_RE.sub('', s)
     return s.strip()
 
-# ---------------- función principal ---------------- #
-def parsear_latex(path: str) -> List[Dict[str, Optional[str]]]:
+def _iter_bloques(stream: TextIO, chunk_size: int = _CHUNK_SIZE) -> Iterator[Tuple[str, Optional[str]]]:
+    r"""
+    Lee el stream por fragmentos y genera eventos (tipo, dato) en orden de documento:
+      - (EV_MAKETITLE, None)
+      - (EV_SECTION | EV_SUBSECTION, titulo)
+      - (EV_EJERCICIO, texto del bloque desde EXERCISE_START hasta EXERCISE_END)
+    Dentro de un bloque abierto se ignora todo salvo EXERCISE_END (y \maketitle).
+    Sólo se retiene en memoria el fragmento actual más el bloque de ejercicio abierto.
     """
-    Parsea un archivo .tex con el estándar y devuelve lista de ejercicios con:
-      numero, tema, subtema, enunciado, condiciones, respuesta, archivo_origen
+    buf = ""
+    scan = 0        # posición (en buf) desde la que continúa el escaneo
+    inicio = None   # posición (en buf) del EXERCISE_START abierto, si lo hay
+    eof = False
+    while not eof:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buf += chunk
+        # un token que empieza en los últimos _MAX_TOKEN caracteres podría estar incompleto:
+        # se deja para la siguiente lectura
+        limite = len(buf) if eof else len(buf) - _MAX_TOKEN
+        for m in _TOKEN_RE.finditer(buf, scan):
+            if m.start() >= limite:
+                break
+            scan = m.end()
+            if m.group('mt') is not None:
+                yield (EV_MAKETITLE, None)
+            elif inicio is not None:
+                if m.group('end') is not None:
+                    yield (EV_EJERCICIO, buf[inicio:m.start()])
+                    inicio = None
+            elif m.group('sec') is not None:
+                yield (m.group('sec'), m.group('title').strip())
+            elif m.group('start') is not None:
+                inicio = m.start()
+        scan = max(scan, limite)
+
+        # descartar lo ya procesado (salvo el bloque de ejercicio abierto)
+        corte = scan if inicio is None else min(scan, inicio)
+        if corte > 0:
+            buf = buf[corte:]
+            scan -= corte
+            if inicio is not None:
+                inicio -= corte
+
+    # bloque sin EXERCISE_END: se extiende hasta el final del archivo
+    if inicio is not None:
+        yield (EV_EJERCICIO, buf[inicio:])
+
+def _contiene_maketitle(stream: TextIO, chunk_size: int = _CHUNK_SIZE) -> Optional[bool]:
+    r"""
+    Pre-escaneo liviano: indica si el stream contiene \maketitle y lo rebobina a
+    su posición original. Devuelve None si el stream no permite seek.
     """
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"No existe el archivo: {path}")
+    try:
+        if not stream.seekable():
+            return None
+        origen = stream.tell()
+    except (AttributeError, OSError):
+        return None
+    marca = r'\maketitle'
+    cola = ""
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return False
+            if marca in chunk or marca in cola + chunk[:len(marca) - 1]:
+                return True
+            cola = (cola + chunk)[-(len(marca) - 1):]
+    finally:
+        stream.seek(origen)
+
+def _extraer_ejercicio(block_text: str, tema: Optional[str], subtema: Optional[str],
+                       archivo_origen: str) -> Dict[str, Optional[str]]:
+    """Extrae los campos de un bloque EXERCISE_START ... EXERCISE_END ya delimitado."""
+    # numero: comentario % id: X o patrón "N)" al inicio del bloque
+    numero = None
+    m_id = _ID_RE.search(block_text)
+    if m_id:
+        numero = m_id.group(1).strip()
+    else:
+        m_num = _NUM_RE.search(block_text)
+        if m_num:
+            numero = m_num.group(1).strip()
+
+    # Nota: el estándar actual NO usa "% condition: ..." — sólo condiciones inline con ", \quad"
+    math_blocks = _extract_math_blocks(block_text)
+
+    enunciado = ""
+    condiciones = ""
+    respuesta = ""
 
-    with open(path, "r", encoding="utf-8") as f:
-        contenido = f.read()
+    if math_blocks:
+        math1 = math_blocks[0]  # primer \[...\] -> enunciado (posible inline cond)
+
+        # Detectar condición INLINE: COMA no escapada seguida de \quad
+        m_inline = _INLINE_COND_RE.search(math1)
+        if m_inline:
+            # dividir: enunciado = parte anterior a la coma no escapada,
+            # condición = lo que sigue al primer \quad subsecuente
+            comma_idx = m_inline.start()
+            quad_idx = math1.find(r'\quad', comma_idx)
+            if quad_idx == -1:
+                quad_idx = math1.rfind(r'\quad')
+            pre = math1[:comma_idx].rstrip()
+            pre = _TRAILING_RE.sub('', pre)  # limpiar comas/trailing spaces del pre
+            post = math1[quad_idx + len(r'\quad'):].strip() if quad_idx != -1 else math1[comma_idx + 1:].strip()
+            enunciado = pre
+            condiciones = _clean_condition(post)
+        else:
+            # No hay condición inline --> enunciado completo
+            enunciado = math1
+
+        # respuesta = segundo \[...\] si existe
+        if len(math_blocks) >= 2:
+            respuesta = math_blocks[1]
+        else:
+            # fallback: intentar encontrar \textbf{Rpta: } ... \[...\]
+            m_r = _RPTA_RE.search(block_text)
+            if m_r:
+                respuesta = m_r.group(1).strip()
+    else:
+        # Si no hay \[...\] en bloque, fallback: primera línea no comentada = enunciado
+        lines = [ln for ln in block_text.splitlines() if ln.strip() and not ln.strip().startswith('%')]
+        enunciado = lines[0].strip() if lines else ""
+
+    ej = {
+        'numero': numero,
+        'tema': tema or "",
+        'subtema': subtema or "",
+        'enunciado': enunciado,
+        'condiciones': condiciones,
+        'respuesta': respuesta,
+        'archivo_origen': archivo_origen
+    }
+    if '\\param{' in block_text:
+        _marcar_plantilla(ej, block_text)
+    return ej
+
+def _marcar_plantilla(ej: Dict, block_text: str):
+    r"""
+    Ejercicio paramétrico: guarda en ej['plantilla'] (JSON) los textos con las
+    marcas \param{expr}{valor} y la declaración "% parametros: ...", y deja en
+    los campos normales el ejercicio con los valores por defecto.
+    """
+    definicion = {campo: ej[campo] for campo in CAMPOS_PLANTILLA}
+    m = _PARAMETROS_RE.search(block_text)
+    definicion['parametros'] = m.group(1).strip() if m else ""
+    for campo in CAMPOS_PLANTILLA:
+        ej[campo] = _PARAM_RE.sub(lambda p: p.group(2).strip(), ej[campo])
+    ej['plantilla'] = json.dumps(definicion, ensure_ascii=False, sort_keys=True)
 
-    # posición de \maketitle si existe (para detectar la primera sección válida como tema)
-    maketitle_pos = contenido.find(r'\maketitle')
-    if maketitle_pos == -1:
-        maketitle_pos = 0
+# ---------------- huella de enunciados ---------------- #
+def normalizar_enunciado(enunciado: Optional[str]) -> str:
+    r"""
+    Forma canónica de un enunciado para comparar duplicados:
+      - los macros de espaciado (\, \; \: \! \quad \qquad ~ ...) cuentan como espacio;
+      - se eliminan los espacios, salvo el que separa un comando de una letra (\sin y).
+    No altera el LaTeX guardado; sólo se usa para calcular la huella.
+    """
+    s = _ESPACIADO_RE.sub(lambda m: m.group(0) if m.group(0) == '\\\\' else ' ', enunciado or "")
+    s = _BLANCOS_RE.sub(' ', s).strip()
+    return _ESPACIO_RE.sub(lambda m: m.group(1) + ' ' if m.group(1) else '', s)
 
-    # recolectar tokens: secciones/subsecciones y marcadores de ejercicio
-    tokens = []
-    for m in re.finditer(r'\\section\*?{([^}]*)}', contenido):
-        tokens.append({'type': 'section', 'pos': m.start(), 'title': m.group(1).strip()})
-    for m in re.finditer(r'\\subsection\*?{([^}]*)}', contenido):
-        tokens.append({'type': 'subsection', 'pos': m.start(), 'title': m.group(1).strip()})
-    for m in re.finditer(r'%%\s*EXERCISE_START', contenido, flags=re.I):
-        tokens.append({'type': 'exercise_start', 'pos': m.start(), 'title': None})
-    for m in re.finditer(r'%%\s*EXERCISE_END', contenido, flags=re.I):
-        tokens.append({'type': 'exercise_end', 'pos': m.start(), 'title': None})
+def huella_enunciado(enunciado: Optional[str]) -> str:
+    """Huella (hash hex de 32 caracteres) del enunciado normalizado."""
+    return hashlib.blake2b(normalizar_enunciado(enunciado).encode("utf-8"), digest_size=16).hexdigest()
 
-    tokens.sort(key=lambda x: x['pos'])
+# ---------------- ensamblado de ejercicios ---------------- #
+def _ensamblar(eventos: Iterable[Tuple[str, Optional[str]]], archivo_origen: str,
+               hay_maketitle: Optional[bool]) -> Iterator[Dict[str, Optional[str]]]:
+    r"""
+    Aplica las reglas de tema/subtema sobre los eventos y genera cada ejercicio
+    apenas se cierra su bloque.
 
+    hay_maketitle: si el archivo contiene \maketitle (None = desconocido). Sólo hace
+    falta para decidir el rol de una \section que aparezca ANTES de \maketitle: es
+    subtema si luego aparece \maketitle y tema si el archivo no lo tiene. Cuando no se
+    sabe (stream no rebobinable) los ejercicios posteriores se retienen hasta resolverlo.
+    """
     tema = None
     tema_set = False
     current_subtema = None
-    ejercicios: List[Dict[str, Optional[str]]] = []
+    maketitle_visto = False
+
+    pendiente = None      # título de la sección cuyo rol aún no se conoce
+    subtema_fijo = False  # hubo sección/subsección posterior a la pendiente
+    retenidos: List[Tuple[Dict[str, Optional[str]], bool]] = []
 
-    i = 0
-    n_tokens = len(tokens)
-    while i < n_tokens:
-        tok = tokens[i]
-        ttype = tok['type']
+    for tipo, dato in eventos:
+        if tipo == EV_MAKETITLE:
+            if not maketitle_visto:
+                maketitle_visto = True
+                if pendiente is not None:
+                    # había \maketitle después: la sección pendiente era un subtema
+                    for ej, fijo in retenidos:
+                        if not fijo:
+                            ej['subtema'] = pendiente
+                        yield ej
+                    if not subtema_fijo:
+                        current_subtema = pendiente
+                    pendiente = None
+                    retenidos = []
+            continue
 
-        if ttype == 'section':
+        if tipo == EV_SECTION:
             # la PRIMERA sección (después de \maketitle) la guardamos como TEMA general
-            if (not tema_set) and (tok['pos'] >= maketitle_pos):
-                tema = tok['title']
+            if not tema_set and pendiente is None and (maketitle_visto or hay_maketitle is False):
+                tema = dato
                 tema_set = True
+            elif not tema_set and pendiente is None and hay_maketitle is None:
+                pendiente = dato
+                subtema_fijo = False
             else:
                 # posteriores secciones interpretadas como subtema contextual
-                current_subtema = tok['title']
-            i += 1
-            continue
+                current_subtema = dato
+                subtema_fijo = True
+        elif tipo == EV_SUBSECTION:
+            current_subtema = dato
+            subtema_fijo = True
+        elif tipo == EV_EJERCICIO:
+            ej = _extraer_ejercicio(dato, tema, current_subtema, archivo_origen)
+            if pendiente is None:
+                yield ej
+            else:
+                retenidos.append((ej, subtema_fijo))
 
-        if ttype == 'subsection':
-            current_subtema = tok['title']
-            i += 1
-            continue
+    # fin del archivo sin \maketitle: la sección pendiente era el TEMA
+    for ej, _ in retenidos:
+        ej['tema'] = pendiente
+        yield ej
 
-        if ttype == 'exercise_start':
-            # buscar exercise_end correspondiente
-            j = i + 1
-            end_pos = None
-            while j < n_tokens:
-                if tokens[j]['type'] == 'exercise_end':
-                    end_pos = tokens[j]['pos']
-                    break
-                j += 1
-            if end_pos is None:
-                end_pos = len(contenido)
-
-            start_pos = tok['pos']
-            block_text = contenido[start_pos:end_pos]
-
-            # ---------------- extraer campos ----------------
-            # numero: comentario % id: X o patrón "N)" al inicio del bloque
-            numero = None
-            m_id = re.search(r'%\s*id\s*:\s*([A-Za-z0-9\-\_]+)', block_text, flags=re.I)
-            if m_id:
-                numero = m_id.group(1).strip()
-            else:
-                m_num = re.search(r'^\s*([0-9]+)\)', block_text, flags=re.M)
-                if m_num:
-                    numero = m_num.group(1).strip()
-
-            # Nota: el estándar actual NO usa "% condition: ..." — sólo condiciones inline con ", \quad"
-            math_blocks = _extract_math_blocks(block_text)
-
-            enunciado = ""
-            condiciones = ""
-            respuesta = ""
-
-            if math_blocks:
-                math1 = math_blocks[0]  # primer \[...\] -> enunciado (posible inline cond)
-
-                # Detectar condición INLINE: COMA no escapada seguida de \quad
-                # regex: (?<!\\),\s*\\quad
-                m_inline = re.search(r'(?<!\\),\s*\\quad', math1)
-                if m_inline:
-                    # dividir: enunciado = parte anterior a la coma no escapada,
-                    # condición = lo que sigue al primer \quad subsecuente
-                    comma_idx = m_inline.start()
-                    quad_idx = math1.find(r'\quad', comma_idx)
-                    if quad_idx == -1:
-                        quad_idx = math1.rfind(r'\quad')
-                    pre = math1[:comma_idx].rstrip()
-                    pre = re.sub(r'(?:,|\s)+$', '', pre)  # limpiar comas/trailing spaces del pre
-                    post = math1[quad_idx + len(r'\quad'):].strip() if quad_idx != -1 else math1[comma_idx + 1:].strip()
-                    enunciado = pre
-                    condiciones = _clean_condition(post)
-                else:
-                    # No hay condición inline --> enunciado completo
-                    enunciado = math1
-                    condiciones = ""
-
-                # respuesta = segundo \[...\] si existe
-                if len(math_blocks) >= 2:
-                    respuesta = math_blocks[1]
-                else:
-                    # fallback: intentar encontrar \textbf{Rpta: } ... \[...\]
-                    m_r = re.search(r'\\textbf\{Rpta[:\s]*\}\s*\\\[(.*?)\\\]', block_text, flags=re.S | re.I)
-                    if m_r:
-                        respuesta = m_r.group(1).strip()
-                    else:
-                        respuesta = ""
-            else:
-                # Si no hay \[...\] en bloque, fallback: primera línea no comentada = enunciado
-                lines = [ln for ln in block_text.splitlines() if ln.strip() and not ln.strip().startswith('%')]
-                enunciado = lines[0].strip() if lines else ""
-                condiciones = ""
-                respuesta = ""
-
-            ejercicios.append({
-                'numero': numero,
-                'tema': tema or "",
-                'subtema': current_subtema or "",
-                'enunciado': enunciado,
-                'condiciones': condiciones,
-                'respuesta': respuesta,
-                'archivo_origen': os.path.basename(path)
-            })
-
-            # avanzar índice al token después del exercise_end (si existía)
-            if end_pos == len(contenido):
-                i = n_tokens
-            else:
-                i = j + 1
-            continue
+# ---------------- función principal ---------------- #
+def iter_ejercicios(fuente: Union[str, "os.PathLike[str]", TextIO], chunk_size: int = _CHUNK_SIZE,
+                    archivo_origen: Optional[str] = None) -> Iterator[Dict[str, Optional[str]]]:
+    """
+    Versión streaming de parsear_latex: acepta una ruta o un stream de texto ya
+    abierto, lo lee por fragmentos de `chunk_size` caracteres y genera cada ejercicio
+    en cuanto aparece su %% EXERCISE_END. La memoria usada no depende del tamaño
+    del banco (fragmento actual + ejercicio en curso).
+
+    archivo_origen: nombre a registrar; por defecto el basename de la ruta/stream.
+    """
+    if isinstance(fuente, (str, os.PathLike)):
+        path = os.fspath(fuente)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No existe el archivo: {path}")
+        with open(path, "r", encoding="utf-8") as f:
+            yield from iter_ejercicios(f, chunk_size, archivo_origen or os.path.basename(path))
+        return
 
-        i += 1
+    if archivo_origen is None:
+        nombre = getattr(fuente, "name", "")
+        archivo_origen = os.path.basename(nombre) if isinstance(nombre, str) else ""
+    hay_maketitle = _contiene_maketitle(fuente, chunk_size)
+    yield from _ensamblar(_iter_bloques(fuente, chunk_size), archivo_origen, hay_maketitle)
 
+def iter_ejercicios_archivos(paths: Iterable[str], chunk_size: int = _CHUNK_SIZE) -> Iterator[Dict[str, Optional[str]]]:
+    """Encadena iter_ejercicios sobre varios archivos, en el orden recibido."""
+    for path in paths:
+        yield from iter_ejercicios(path, chunk_size)
+
+def parsear_latex(path: str) -> List[Dict[str, Optional[str]]]:
+    """
+    Parsea un archivo .tex con el estándar y devuelve lista de ejercicios con:
+      numero, tema, subtema, enunciado, condiciones, respuesta, archivo_origen
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No existe el archivo: {path}")
+    if not instrumentacion.activo():
+        return list(iter_ejercicios(path))
+    t0 = time.perf_counter()
+    ejercicios = list(iter_ejercicios(path))
+    instrumentacion.registrar_archivo(path, len(ejercicios), time.perf_counter() - t0)
     return ejercicios
 
 # pequeño CLI para pruebas rápidas
 if __name__ == "__main__":
     import argparse, pprint, sys
     parser = argparse.ArgumentParser(description="Parsear archivo .tex (estándar EDO)")
-    parser.add_argument("path", nargs="?", help="ruta al archivo .tex (p.ej. data/estandar.tex)")
+    parser.add_argument("path", nargs="?", help="ruta al archivo .tex (p.ej. data/estandar.tex) o - para stdin")
     args = parser.parse_args()
+    if args.path == "-":
+        for ej in iter_ejercicios(sys.stdin, archivo_origen="stdin"):
+            pprint.pprint(ej, width=140)
+        sys.exit(0)
     if not args.path or not os.path.exists(args.path):
         print("Usar: python latex_parser.py data/estandar.tex")
         sys.exit(1)
@@ -1,15 +1,19 @@
+import argparse
 import os
 import sys
 import time
-from rich.table import Table
+from array import array
+from collections import OrderedDict
+from functools import partial
 from rich.console import Console
 from rich.panel import Panel
-from rich.prompt import Prompt
-from pyfiglet import Figlet
+from rich.prompt import IntPrompt, Prompt
+from rich.markup import escape
 
-from latex_parser import listar_tex_files, parsear_latex
-from services.exercise_service import agregar_ejercicios
-from db import repository  # para leer y filtrar ejercicios de la DB
+import instrumentacion
+
+# rich.table, la DB y los servicios se importan en las opciones que los usan:
+# el menú aparece sin esperarlos (ver benchmarks/bench_startup.py)
 
 console = Console()
 
@@ -25,6 +29,8 @@ def show_title():
     Muestra el título principal del programa con estilo ASCII (usando pyfiglet)
     y dentro de un panel decorativo de la librería 'rich'.
     """
+    from pyfiglet import Figlet  # sólo el menú interactivo muestra el banner
+
     f = Figlet(font="slant")  # Fuente en estilo “slant”, hay muchas más (doom, banner, etc.)
     banner = f.renderText("EDO - USFX")
 
@@ -51,52 +57,217 @@ def hacker_typing(text, delay=0.01, color="cyan"):
     console.print()  # Salto de línea al final
 
 
+# columnas de las tablas de ejercicios: (título, alineación, color)
+COLUMNAS_TABLA = [
+    ("N°", "center", "cyan"),
+    ("Tema", None, "magenta"),
+    ("SubTema", None, "magenta"),
+    ("Enunciado", None, "green"),
+    ("Condiciones", None, "red"),
+    ("Respuesta", None, "yellow"),
+    ("Archivo", None, "blue")
+]
+
+
+def fila_tabla(ej, i):
+    """Celdas (ya normalizadas) de la fila de un ejercicio; i es el número por defecto."""
+    enunciado = " ".join((ej.get('enunciado') or "").splitlines()).strip()
+    respuesta = " ".join((ej.get('respuesta') or "").splitlines()).strip()
+    condiciones = ej.get('condiciones')
+
+    # Normalización de condiciones (list, tuple o string)
+    if isinstance(condiciones, (list, tuple)):
+        condiciones_str = "; ".join(str(c).strip() for c in condiciones if c)
+    else:
+        condiciones_str = str(condiciones or "").strip()
+
+    return (
+        str(ej.get('numero', i)),
+        ej.get('tema', ""),
+        ej.get('subtema', ""),
+        enunciado,
+        condiciones_str,
+        respuesta,
+        ej.get('archivo_origen', "")
+    )
+
+
+def armar_tabla(filas, titulo="📚 Ejercicios"):
+    """Tabla 'rich' con las filas dadas (ver fila_tabla); cada columna con su color."""
+    from rich.table import Table
+
+    table = Table(title=titulo, style="bold cyan")
+    for titulo_columna, align, color in COLUMNAS_TABLA:
+        table.add_column(titulo_columna, justify=align, style=color, no_wrap=True if align else False)
+    for fila in filas:
+        table.add_row(*fila)
+    return table
+
+
 def mostrar_tabla(ejercicios):
     """
     Muestra una tabla con los ejercicios usando la librería 'rich'.
     Cada columna tiene su propio color para diferenciar campos.
+    Para listas largas usar navegar_archivos / paginar_ejercicios.
     """
-    table = Table(title="📚 Ejercicios", style="bold cyan")
-
-    # Definición de columnas con sus estilos
-    columnas = [
-        ("N°", "center", "cyan"),
-        ("Tema", None, "magenta"),
-        ("SubTema", None, "magenta"),
-        ("Enunciado", None, "green"),
-        ("Condiciones", None, "red"),
-        ("Respuesta", None, "yellow"),
-        ("Archivo", None, "blue")
-    ]
+    console.print(armar_tabla([fila_tabla(ej, i) for i, ej in enumerate(ejercicios, start=1)]))
+
+
+def mostrar_resultados_busqueda(resultados):
+    """Tabla de resultados de la búsqueda de texto, con los términos encontrados resaltados."""
+    from db import repository
+    from services import search_service
 
-    # Se agregan las columnas usando un bucle limpio
-    for titulo, align, color in columnas:
-        table.add_column(titulo, justify=align, style=color, no_wrap=True if align else False)
+    def resaltar(texto):
+        return (escape(texto or "")
+                .replace(search_service.MARCA_INICIO, "[bold reverse]")
+                .replace(search_service.MARCA_FIN, "[/bold reverse]"))
 
-    # Se agregan las filas con los datos
-    for i, ej in enumerate(ejercicios, start=1):
-        enunciado = " ".join((ej.get('enunciado') or "").splitlines()).strip()
-        respuesta = " ".join((ej.get('respuesta') or "").splitlines()).strip()
-        condiciones = ej.get('condiciones')
+    mostrar_tabla([
+        {**r, **{c: resaltar(r[c]) for c in repository.COLUMNAS_FTS}}
+        for r in resultados
+    ])
 
-        # Normalización de condiciones (list, tuple o string)
-        if isinstance(condiciones, (list, tuple)):
-            condiciones_str = "; ".join(str(c).strip() for c in condiciones if c)
+
+def opcion_validar_respuestas():
+    """Valida las respuestas del banco (sólo lo nuevo o editado) y lista las que no pasan."""
+    from rich.table import Table
+    from services import validation_service
+
+    if not validation_service.sympy_disponible():
+        console.print("[red]❌ La validación necesita SymPy: pip install sympy[/red]")
+        return
+    with console.status("[bold green]Validando respuestas...[/bold green]"):
+        resumen = validation_service.validar_banco()
+    console.print(
+        f"[cyan]{resumen['total']} ejercicios: {resumen['validados']} validados ahora, "
+        f"{resumen['en_cache']} ya validados antes[/cyan]"
+    )
+    for estado, n in sorted(resumen['por_estado'].items()):
+        color = "green" if estado == validation_service.VALIDO else "yellow"
+        console.print(f"  [{color}]{estado}: {n}[/{color}]")
+
+    observados = [r for r in resumen['resultados'] if r['estado'] != validation_service.VALIDO]
+    if observados:
+        table = Table(title="⚠ Respuestas a revisar", style="bold yellow")
+        table.add_column("N°", justify="center", style="cyan", no_wrap=True)
+        table.add_column("Archivo", style="blue")
+        table.add_column("Estado", style="red")
+        table.add_column("Detalle", style="yellow")
+        for r in observados:
+            table.add_row(str(r['numero']), r['archivo_origen'] or "", r['estado'], escape(r['detalle'] or ""))
+        console.print(table)
+
+
+# cantidad de ejercicios por página en las vistas de la DB
+POR_PAGINA = 20
+# páginas ya formateadas que se guardan para volver a ellas sin re-consultar
+PAGINAS_EN_CACHE = 16
+
+
+def navegar_tabla(total, cargar, filtrar=None, por_pagina=POR_PAGINA, titulo="📚 Ejercicios"):
+    """
+    Visor paginado: sólo se piden y se formatean las filas de la página visible.
+      total: cantidad de filas.
+      cargar(inicio, fin): ejercicios de ese tramo (en orden).
+      filtrar(texto): (total, cargar) del subconjunto que coincide con el texto,
+          o None si el texto no sirve para filtrar.
+    Comandos: s/ENTER siguiente, a anterior, <número> ir a esa página,
+    f filtrar (vacío = quitar el filtro), q salir.
+    """
+    base = (total, cargar)
+    filtro = ""
+    pagina = 0
+    cache = OrderedDict()  # (filtro, página) -> filas formateadas
+    while True:
+        paginas = max(1, -(-total // por_pagina))
+        pagina = min(pagina, paginas - 1)
+
+        clave = (filtro, pagina)
+        filas = cache.get(clave)
+        if filas is None:
+            inicio = pagina * por_pagina
+            filas = [fila_tabla(ej, n) for n, ej in enumerate(cargar(inicio, inicio + por_pagina), start=inicio + 1)]
+            cache[clave] = filas
+            if len(cache) > PAGINAS_EN_CACHE:
+                cache.popitem(last=False)
         else:
-            condiciones_str = str(condiciones or "").strip()
-
-        table.add_row(
-            str(ej.get('numero', i)),
-            ej.get('tema', ""),
-            ej.get('subtema', ""),
-            enunciado,
-            condiciones_str,
-            respuesta,
-            ej.get('archivo_origen', "")
-        )
+            cache.move_to_end(clave)
 
-    console.print(table)
+        if filas:
+            console.print(armar_tabla(filas, titulo))
+        else:
+            console.print("[yellow]⚠️ No hay ejercicios que coincidan[/yellow]")
+        detalle_filtro = f", filtro: {escape(filtro)}" if filtro else ""
+        console.print(f"[cyan]Página {pagina + 1} de {paginas} ({total} ejercicios{detalle_filtro})[/cyan]")
+
+        acciones = ["s) siguiente", "a) anterior", "N°) ir a la página"]
+        if filtrar:
+            acciones.append("f) filtrar")
+        acciones.append("q) salir")
+        respuesta = Prompt.ask(" · ".join(acciones), default="s" if pagina + 1 < paginas else "q").strip().lower()
+
+        if respuesta.isdigit():
+            pagina = min(max(int(respuesta), 1), paginas) - 1
+        elif respuesta == "s":
+            pagina = min(pagina + 1, paginas - 1)
+        elif respuesta == "a":
+            pagina = max(pagina - 1, 0)
+        elif respuesta == "f" and filtrar:
+            texto = Prompt.ask("🔎 Filtrar por texto (vacío = quitar el filtro)", default="").strip()
+            resultado = filtrar(texto) if texto else base
+            if resultado is None:
+                console.print("[yellow]⚠ El texto no tiene términos para filtrar[/yellow]")
+                continue
+            total, cargar = resultado
+            filtro = texto
+            pagina = 0
+        elif respuesta == "q":
+            break
+        else:
+            console.print("[red]Opción inválida[/red]")
+
+
+# campos en los que busca el filtro de navegar_archivos
+CAMPOS_FILTRO = ('tema', 'subtema', 'enunciado', 'condiciones', 'respuesta', 'archivo_origen')
+
+
+def paginar_ejercicios(filtros=None, prefijos=None, por_pagina=POR_PAGINA):
+    """
+    Recorre los ejercicios de la DB página por página. Se leen una sola vez los
+    ids que cumplen los filtros (array compacto) y cada página pide sólo sus
+    filas, así que saltar a cualquier página cuesta lo mismo. El filtro por
+    texto (FTS) se cruza con esos ids sin volver a leer los ejercicios. Ids y
+    filas salen del catálogo en memoria (services/catalog_service.py).
+    """
+    from services import catalog_service
+
+    paginar_ids(catalog_service.ids_ejercicios(filtros=filtros, prefijos=prefijos), por_pagina)
+
+
+def paginar_ids(ids, por_pagina=POR_PAGINA, titulo="📚 Ejercicios"):
+    """navegar_tabla sobre un array de ids (ver paginar_ejercicios)."""
+    from services import catalog_service, search_service
+
+    if not ids:
+        console.print("[yellow]⚠️ No hay ejercicios que coincidan[/yellow]")
+        return
+
+    def cargador(ids):
+        def cargar(inicio, fin):
+            tramo = ids[inicio:fin]
+            ejercicios = catalog_service.ejercicios_por_ids(tramo)
+            return [ejercicios[i] for i in tramo if i in ejercicios]
+        return cargar
 
+    def filtrar(texto):
+        coincidencias = search_service.ids_coincidentes(texto)
+        if coincidencias is None:
+            return None
+        subconjunto = array('q', (i for i in ids if i in coincidencias))
+        return len(subconjunto), cargador(subconjunto)
+
+    navegar_tabla(len(ids), cargador(ids), filtrar, por_pagina, titulo)
 
 
 # ------------------ MENÚ PRINCIPAL ------------------ #
@@ -119,7 +290,15 @@ def show_menu():
 
 
 # ------------------ OPCIÓN 1: CARGAR LATEX ------------------ #
-def opcion_cargar_latex():
+def opcion_cargar_latex(workers=None):
+    """
+    workers: si no es None, al elegir "Todos los archivos" se parsean en paralelo
+    con ese número de procesos (0 = uno por CPU).
+    """
+    from latex_parser import listar_tex_files
+    from services.exercise_service import agregar_ejercicios
+    from services.ingest_service import sincronizar_archivos
+
     clear_screen()
     show_title()
     hacker_typing("\n📥 Escaneando archivos .tex...\n", delay=0.02, color="green")
@@ -134,32 +313,129 @@ def opcion_cargar_latex():
     for i, archivo in enumerate(archivos, start=1):
         console.print(f"[cyan]{i})[/cyan] {archivo}")
     console.print("[yellow]0) Todos los archivos[/yellow]")
-
-    choice = Prompt.ask("\n👉 Selecciona un archivo", choices=[str(i) for i in range(len(archivos) + 1)])
-    ejercicios = []
+    console.print("[green]s) Sincronizar sólo los archivos modificados[/green]")
+
+    choice = Prompt.ask("\n👉 Selecciona un archivo", choices=[str(i) for i in range(len(archivos) + 1)] + ["s"])
+
+    # Sincronización incremental: salta archivos sin cambios y aplica el diff por ejercicio
+    if choice == "s":
+        rutas = [os.path.join("data", archivo) for archivo in archivos]
+        resumen = sincronizar_archivos(rutas, workers=1 if workers is None else (workers or None))
+        console.print(f"[cyan]⏭️ {resumen['omitidos']} archivos sin cambios[/cyan]")
+        console.print(f"[green]✅ {resumen['agregados']} agregados, {resumen['actualizados']} actualizados, "
+                      f"{resumen['retirados']} retirados[/green]")
+        if resumen['duplicados']:
+            console.print(f"[yellow]⚠️ {resumen['duplicados']} ejercicios ya existían y no se agregaron[/yellow]")
+        for ruta, error in resumen['errores']:
+            console.print(f"[bold red]⚠️ {os.path.basename(ruta)}: {error}[/bold red]")
+        for ruta, otra in resumen['conflictos']:
+            console.print(f"[yellow]⚠️ {ruta}: mismo nombre que {otra}; sólo se agregaron los nuevos[/yellow]")
+        mostrar_similares(resumen['similares'])
+        input("\nPresiona ENTER para volver al menú...")
+        return
 
     # Si elige “0” se procesan todos los archivos
     if choice == "0":
-        for archivo in archivos:
-            ejercicios.extend(parsear_latex(os.path.join("data", archivo)))
+        rutas = [os.path.join("data", archivo) for archivo in archivos]
     else:
-        seleccionado = archivos[int(choice) - 1]
-        ejercicios = parsear_latex(os.path.join("data", seleccionado))
-
-    mostrar_tabla(ejercicios)
+        rutas = [os.path.join("data", archivos[int(choice) - 1])]
+    paralelo = workers if choice == "0" else None
+    errores = {}
+
+    # se parsea UNA vez: la vista previa, el filtro y la inserción usan las mismas filas
+    filas = parsear_rutas(rutas, errores, paralelo)
+    for ruta, error in errores.items():
+        console.print(f"[bold red]⚠️ {os.path.basename(ruta)}: {error}[/bold red]")
+    if len(filas) > POR_PAGINA:
+        navegar_filas(filas)
+    else:
+        mostrar_tabla([como_ejercicio(fila) for fila in filas])
 
     # Confirmación antes de agregar a la base de datos
-    if ejercicios and Prompt.ask("\n¿Deseas agregar estos ejercicios a la DB?", choices=["s", "n"]) == "s":
-        agregados, duplicados = agregar_ejercicios(ejercicios)
+    if filas and Prompt.ask("\n¿Deseas agregar estos ejercicios a la DB?", choices=["s", "n"]) == "s":
+        agregados, duplicados, similares = agregar_ejercicios(como_ejercicio(fila) for fila in filas)
         console.print(f"[green]✅ {agregados} ejercicios agregados[/green]")
         if duplicados:
             console.print(f"[yellow]⚠️ {duplicados} ejercicios ya existían y no se agregaron[/yellow]")
+        mostrar_similares(similares)
 
     input("\nPresiona ENTER para volver al menú...")
 
 
+def iter_ejercicios_rutas(rutas, errores, workers=None):
+    """
+    Ejercicios de las rutas, en orden y sin materializar la lista. Un archivo que
+    falla se anota en errores {ruta: mensaje} y se salta.
+    workers: si no es None, los archivos se parsean en paralelo (ingest_service.iter_resultados;
+    en memoria sólo el archivo que se está entregando).
+    """
+    from latex_parser import iter_ejercicios
+    from services.ingest_service import iter_resultados
+
+    if workers is not None:
+        for ruta, resultado, error in iter_resultados(rutas, workers or None):
+            if error is not None:
+                errores[ruta] = error
+            else:
+                yield from resultado
+        return
+    for ruta in rutas:
+        try:
+            yield from iter_ejercicios(ruta)
+        except Exception as e:
+            errores[ruta] = f"{type(e).__name__}: {e}"
+
+
+def mostrar_similares(similares):
+    """Lista los ejercicios agregados que se parecen a otros (dedup_service.marcar_similares)."""
+    if not similares:
+        return
+    console.print(f"[magenta]🔎 {len(similares)} ejercicios agregados se parecen a otros (posibles casi-duplicados):[/magenta]")
+    for marca in similares:
+        ids = ", ".join(f"#{i} ({s:.0%})" for i, s in marca['similares'])
+        console.print(f"   [cyan]{marca['ejercicio'].get('numero')}[/cyan] {marca['ejercicio'].get('archivo_origen', '')} → {ids or 'mismo lote'}")
+
+
+# campos de un ejercicio parseado, en el orden de las tuplas de parsear_rutas
+CAMPOS_PARSEADOS = ('numero', 'tema', 'subtema', 'enunciado', 'condiciones', 'respuesta', 'archivo_origen', 'plantilla')
+
+
+def parsear_rutas(rutas, errores, workers=None):
+    """
+    Ejercicios de las rutas parseados una sola vez, como tuplas (CAMPOS_PARSEADOS):
+    más compactas que un dict por ejercicio. Ver iter_ejercicios_rutas.
+    """
+    return [tuple(ej.get(campo) for campo in CAMPOS_PARSEADOS) for ej in iter_ejercicios_rutas(rutas, errores, workers)]
+
+
+def como_ejercicio(fila):
+    """Dict de ejercicio de una tupla de parsear_rutas."""
+    return dict(zip(CAMPOS_PARSEADOS, fila))
+
+
+def navegar_filas(filas, por_pagina=POR_PAGINA):
+    """
+    navegar_tabla sobre las tuplas de parsear_rutas: cada página arma sólo sus
+    dicts, y un filtro guarda las posiciones que coinciden (array de enteros).
+    """
+    posiciones_filtro = [CAMPOS_PARSEADOS.index(campo) for campo in CAMPOS_FILTRO]
+
+    def filtrar(texto):
+        texto = texto.lower()
+        posiciones = array('L', (
+            n for n, fila in enumerate(filas)
+            if any(texto in str(fila[i] or "").lower() for i in posiciones_filtro)
+        ))
+        return len(posiciones), lambda inicio, fin: [como_ejercicio(filas[n]) for n in posiciones[inicio:fin]]
+
+    navegar_tabla(len(filas), lambda inicio, fin: [como_ejercicio(fila) for fila in filas[inicio:fin]],
+                  filtrar, por_pagina)
+
+
 # ------------------ OPCIÓN 2: CONSULTAR / CRUD ------------------ #
 def opcion_crud_db():
+    from services import dedup_service, search_service
+
     while True:
         clear_screen()
         show_title()
@@ -170,7 +446,10 @@ def opcion_crud_db():
             "2": "Buscar por tema/subtema",
             "3": "Editar ejercicio (pendiente)",
             "4": "Eliminar ejercicio (pendiente)",
-            "5": "Volver al menú principal"
+            "5": "Reporte de casi-duplicados",
+            "6": "Búsqueda por texto",
+            "7": "Validar respuestas con SymPy",
+            "8": "Volver al menú principal"
         }
 
         for key, value in opciones.items():
@@ -179,16 +458,236 @@ def opcion_crud_db():
         choice = Prompt.ask("\n👉 Selecciona una opción", choices=opciones.keys())
 
         if choice == "1":
-            ejercicios = repository.read_ejercicios()
-            mostrar_tabla(ejercicios)
+            paginar_ejercicios()
         elif choice == "2":
-            tema = Prompt.ask("📌 Ingresa el tema (dejar vacío para omitir)", default="")
-            subtema = Prompt.ask("📌 Ingresa el subtema (dejar vacío para omitir)", default="")
-            filtros = {k: v for k, v in {"tema": tema, "subtema": subtema}.items() if v}
-            ejercicios = repository.read_ejercicios(filtros=filtros)
-            mostrar_tabla(ejercicios)
+            tema = Prompt.ask("📌 Ingresa el tema o su comienzo (dejar vacío para omitir)", default="")
+            subtema = Prompt.ask("📌 Ingresa el subtema o su comienzo (dejar vacío para omitir)", default="")
+            prefijos = {k: v for k, v in {"tema": tema, "subtema": subtema}.items() if v}
+            paginar_ejercicios(prefijos=prefijos)
         elif choice in ["3", "4"]:
             console.print("[yellow]Función aún no implementada[/yellow]")
+        elif choice == "5":
+            clusters = dedup_service.reporte_clusters()
+            if not clusters:
+                console.print("[green]✅ No se encontraron casi-duplicados[/green]")
+            for n, cluster in enumerate(clusters, start=1):
+                console.print(f"\n[bold magenta]Grupo {n} ({len(cluster)} ejercicios)[/bold magenta]")
+                mostrar_tabla(cluster)
+        elif choice == "6":
+            texto = Prompt.ask("🔎 Texto a buscar (palabras o LaTeX, p. ej. exactas e^{x})")
+            resultados = search_service.buscar(texto)
+            if not resultados:
+                console.print("[yellow]⚠ Sin resultados[/yellow]")
+            else:
+                mostrar_resultados_busqueda(resultados)
+        elif choice == "7":
+            opcion_validar_respuestas()
+        elif choice == "8":
+            break
+
+        input("\nPresiona ENTER para volver...")
+
+
+# ------------------ OPCIÓN 3: PRÁCTICA ALEATORIA ------------------ #
+def opcion_generar_practica(workers=None):
+    """Genera una práctica aleatoria (o un lote, una por estudiante) estratificada por tema/subtema."""
+    from db import repository
+    from services import export_service, practice_service
+
+    clear_screen()
+    show_title()
+    console.print("\n[bold green]>>> Generar práctica aleatoria <<<[/bold green]\n")
+
+    semestre = repository.read_semestre_actual()
+    if semestre:
+        console.print(f"[cyan]Semestre en curso: {semestre['nombre']} (se omiten los ejercicios ya usados)[/cyan]")
+
+    modo = Prompt.ask("📋 ¿Una práctica o un lote (una por estudiante)?", choices=["1", "lote"], default="1")
+    if modo == "lote":
+        opcion_generar_lote(semestre, workers)
+        return
+
+    cantidad = IntPrompt.ask("🎲 ¿Cuántos ejercicios?", default=10)
+    semilla = Prompt.ask("🔑 Semilla (dejar vacío para una práctica al azar)", default="") or None
+
+    ejercicios = practice_service.generar_practica(cantidad, semilla)
+    if not ejercicios:
+        console.print("[yellow]⚠ No hay ejercicios disponibles[/yellow]")
+        return
+    if len(ejercicios) < cantidad:
+        console.print(f"[yellow]⚠ Sólo hay {len(ejercicios)} ejercicios disponibles[/yellow]")
+    mostrar_tabla(ejercicios)
+
+    if Prompt.ask("📤 ¿Exportar la práctica (.tex y .md, con clave)?", choices=["s", "n"], default="n") == "s":
+        base = os.path.join(export_service.DIRECTORIO_EXPORTACION, f"practica_{semilla or time.strftime('%Y%m%d_%H%M%S')}")
+        for formato in export_service.FORMATOS:
+            export_service.exportar(ejercicios, f"{base}.{formato}")
+            export_service.exportar(ejercicios, f"{base}_clave.{formato}", titulo="Práctica (clave)", con_respuestas=True)
+        console.print(f"[green]✅ Exportada en {base}.*[/green]")
+
+
+def opcion_generar_lote(semestre=None, workers=None):
+    """Lote de prácticas por estudiante: se asignan al semestre y se muestra el solapamiento."""
+    from db import repository
+    from services import export_service, practice_service
+
+    if semestre is None:
+        nombre = Prompt.ask("📅 No hay semestre registrado. Nombre del semestre (ej. 2025-2)")
+        semestre = {'id': repository.create_semestre(nombre), 'nombre': nombre}
+
+    estudiantes = IntPrompt.ask("👥 ¿Cuántos estudiantes?", default=200)
+    cantidad = IntPrompt.ask("🎲 ¿Cuántos ejercicios por práctica?", default=10)
+    semilla = Prompt.ask("🔑 Semilla (dejar vacío para un lote al azar)", default="") or None
+    registrar = Prompt.ask(
+        f"💾 ¿Registrar las asignaciones en el semestre {semestre['nombre']}?", choices=["s", "n"], default="s"
+    ) == "s"
+
+    with console.status("[bold green]Generando prácticas...[/bold green]"):
+        variantes, estadisticas = practice_service.generar_lote(
+            estudiantes, cantidad, semilla, semestre['id'], workers=workers, registrar=registrar
+        )
+    mostrar_estadisticas_lote(estadisticas)
+    if registrar:
+        console.print(f"[green]✅ {sum(map(len, variantes))} asignaciones guardadas en {semestre['nombre']}[/green]")
+
+    if Prompt.ask("📤 ¿Exportar las prácticas (.tex y .md, con clave)?", choices=["s", "n"], default="s") == "s":
+        directorio = os.path.join(export_service.DIRECTORIO_EXPORTACION, semestre['nombre'])
+        with console.status("[bold green]Exportando...[/bold green]"):
+            resultado = export_service.exportar_lote(variantes, directorio, export_service.FORMATOS, con_respuestas=True)
+        console.print(
+            f"[green]✅ {len(resultado['escritos'])} archivos escritos, "
+            f"{len(resultado['omitidos'])} sin cambios en {directorio}[/green]"
+        )
+
+
+def mostrar_estadisticas_lote(estadisticas):
+    """Tabla con el solapamiento entre las prácticas de un lote."""
+    from rich.table import Table
+
+    table = Table(title="👥 Solapamiento del lote", style="bold green")
+    table.add_column("Métrica", style="cyan")
+    table.add_column("Valor", justify="right", style="yellow")
+    etiquetas = [
+        ('estudiantes', "Estudiantes"),
+        ('variantes_distintas', "Prácticas distintas"),
+        ('vecinos_promedio', "En común con el vecino (promedio)"),
+        ('vecinos_max', "En común con el vecino (máximo)"),
+        ('pares_promedio', "En común entre dos cualesquiera (promedio)"),
+        ('pares_max', "En común entre dos cualesquiera (máximo)"),
+        ('ejercicios_usados', "Ejercicios usados"),
+        ('usos_max', "Repeticiones del más usado"),
+    ]
+    for clave, etiqueta in etiquetas:
+        valor = estadisticas[clave]
+        table.add_row(etiqueta, f"{valor:.2f}" if isinstance(valor, float) else str(valor))
+    console.print(table)
+
+
+# ------------------ OPCIÓN 4: HISTORIAL ------------------ #
+def mostrar_semestres(semestres):
+    from rich.table import Table
+
+    table = Table(title="📜 Semestres", style="bold magenta")
+    table.add_column("Semestre", style="cyan")
+    table.add_column("Desde", style="blue")
+    table.add_column("Hasta", style="blue")
+    table.add_column("Asignaciones", justify="right", style="yellow")
+    table.add_column("Ejercicios", justify="right", style="green")
+    table.add_column("Temas", justify="right", style="magenta")
+    for s in semestres:
+        table.add_row(s['nombre'], s['fecha_inicio'] or "", s['fecha_fin'] or "",
+                      str(s['asignaciones']), str(s['ejercicios']), str(s['temas']))
+    console.print(table)
+
+
+def mostrar_reuso(reuso):
+    from rich.table import Table
+
+    table = Table(title="🔁 Reuso entre semestres", style="bold magenta")
+    table.add_column("Usado en", style="cyan")
+    table.add_column("Ejercicios", justify="right", style="yellow")
+    for veces, n in reuso['histograma'].items():
+        etiqueta = "nunca" if veces == 0 else f"{veces} semestre{'s' if veces > 1 else ''}"
+        table.add_row(etiqueta, str(n))
+    console.print(table)
+    console.print(f"[cyan]{reuso['usados']} de {reuso['activos']} ejercicios activos usados alguna vez; "
+                  f"{reuso['reusados']} reusados ({reuso['tasa_reuso']:.0%} de los usados)[/cyan]")
+
+
+def mostrar_uso_por_tema(filas, titulo):
+    from rich.table import Table
+
+    table = Table(title=titulo, style="bold magenta")
+    table.add_column("Tema", style="magenta")
+    table.add_column("SubTema", style="magenta")
+    table.add_column("Asignaciones", justify="right", style="yellow")
+    table.add_column("Usados", justify="right", style="green")
+    table.add_column("En el banco", justify="right", style="blue")
+    table.add_column("Cobertura", justify="right", style="cyan")
+    for f in filas:
+        table.add_row(f['tema'], f['subtema'], str(f['asignaciones']), str(f['ejercicios']),
+                      str(f['banco']), f"{f['cobertura']:.0%}")
+    console.print(table)
+
+
+def opcion_historial():
+    """Historial de semestres: uso por tema/subtema, reuso y ejercicios nunca usados."""
+    from rich.table import Table
+    from services import history_service
+
+    while True:
+        clear_screen()
+        show_title()
+        console.print("\n[bold magenta]>>> Historial de semestres <<<[/bold magenta]\n")
+        semestres = history_service.resumen_semestres()
+        if semestres:
+            mostrar_semestres(semestres)
+        else:
+            console.print("[yellow]⚠️ Todavía no hay semestres registrados[/yellow]")
+        mostrar_reuso(history_service.frecuencia_reuso())
+
+        opciones = {
+            "1": "Uso por tema/subtema de un semestre",
+            "2": "Uso por tema/subtema en todo el historial",
+            "3": "Ejercicios más reusados",
+            "4": "Ejercicios nunca usados",
+            "5": "Volver al menú principal",
+        }
+        for key, value in opciones.items():
+            console.print(f"[cyan]{key}[/cyan]) {value}")
+        choice = Prompt.ask("\n👉 Selecciona una opción", choices=opciones.keys())
+
+        if choice == "1":
+            if not semestres:
+                console.print("[yellow]⚠️ Todavía no hay semestres registrados[/yellow]")
+            else:
+                por_nombre = {s['nombre']: s for s in semestres}
+                nombre = Prompt.ask("📅 Semestre", choices=list(por_nombre), default=semestres[0]['nombre'])
+                mostrar_uso_por_tema(history_service.uso_por_tema(por_nombre[nombre]['id']), f"📊 Uso en {nombre}")
+        elif choice == "2":
+            mostrar_uso_por_tema(history_service.uso_por_tema(), "📊 Uso en todo el historial")
+        elif choice == "3":
+            table = Table(title="🔁 Más reusados", style="bold magenta")
+            table.add_column("N°", justify="center", style="cyan", no_wrap=True)
+            table.add_column("Tema", style="magenta")
+            table.add_column("Enunciado", style="green")
+            table.add_column("Semestres", justify="right", style="yellow")
+            table.add_column("Veces", justify="right", style="yellow")
+            table.add_column("Último", style="blue")
+            for r in history_service.mas_reusados():
+                table.add_row(str(r['numero']), r['tema'] or "", " ".join((r['enunciado'] or "").split()),
+                              str(r['semestres']), str(r['asignaciones']), r['ultimo_semestre'] or "")
+            console.print(table)
+        elif choice == "4":
+            table = Table(title="💤 Nunca usados por subtema", style="bold magenta")
+            table.add_column("Tema", style="magenta")
+            table.add_column("SubTema", style="magenta")
+            table.add_column("Ejercicios", justify="right", style="yellow")
+            for f in history_service.nunca_usados_por_tema():
+                table.add_row(f['tema'], f['subtema'], str(f['nunca_usados']))
+            console.print(table)
+            if Prompt.ask("¿Ver los ejercicios?", choices=["s", "n"], default="n") == "s":
+                paginar_ids(history_service.ids_nunca_usados(), titulo="💤 Nunca usados")
         elif choice == "5":
             break
 
@@ -196,18 +695,36 @@ def opcion_crud_db():
 
 
 # ------------------ MAIN ------------------ #
-def main():
+def parse_args(argv=None):
+    """Argumentos de línea de comandos del menú interactivo."""
+    parser = argparse.ArgumentParser(description="EDO - USFX: Gestor de Prácticas",
+                                     epilog="Sin menú (scripts, cron): python -m cli --help")
+    parser.add_argument(
+        "-j", "--paralelo", type=int, nargs="?", const=0, default=None, metavar="N",
+        help="parsear 'Todos los archivos' / generar lotes en paralelo con N procesos (sin N: uno por CPU)"
+    )
+    parser.add_argument("--instrumentar", action="store_true",
+                        help="al salir, mostrar tiempos/contadores de parser, repositorio y servicios (stderr)")
+    parser.add_argument("--perfil", metavar="RUTA", default=None, help="perfilar con cProfile y guardar el .pstats en RUTA")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Control principal del programa."""
+    args = parse_args(argv)
+    if args.instrumentar or args.perfil:
+        instrumentacion.activar(args.perfil)
+
     while True:
         clear_screen()
         show_title()
         show_menu()
 
         opciones = {
-            "1": opcion_cargar_latex,
+            "1": partial(opcion_cargar_latex, workers=args.paralelo),
             "2": opcion_crud_db,
-            "3": lambda: console.print("\n[green][+] Módulo generador aún en construcción...[/green]"),
-            "4": lambda: console.print("\n[magenta][+] Módulo historial aún en construcción...[/magenta]"),
+            "3": partial(opcion_generar_practica, workers=args.paralelo),
+            "4": opcion_historial,
             "5": "salir",
         }
 
@@ -0,0 +1,241 @@
+"""
+Catálogo de ejercicios en memoria: caché read-through del repositorio para las
+vistas interactivas (tablas, prácticas, reportes), que piden los mismos
+ejercicios una y otra vez.
+
+  - Cada ejercicio es un Ejercicio con __slots__ (sin dict por fila) y con
+    tema, subtema y archivo_origen internados: miles de filas comparten la
+    misma cadena en vez de una copia por fila. Se lee como un dict
+    (ej['tema'], ej.get('tema'), dict(ej)), así que reemplaza a los dicts del
+    repositorio sin tocar a quien los consume.
+  - ejercicios_por_ids() sirve lo que ya tiene y pide a la DB sólo lo que falta.
+    ids_ejercicios() / ejercicios() necesitan el catálogo completo: la primera
+    vez se carga entero (una consulta) junto con índices por tema, subtema,
+    (tema, subtema) y archivo, y los filtros se resuelven en memoria.
+  - Invalidación: antes de cada uso se compara el testigo de la conexión
+    (PRAGMA data_version + total_changes, sin leer tablas). Si cambió, se lee el
+    contador catalogo_version que mantienen los triggers de ejercicios: sólo si
+    ese contador cambió (alguien tocó ejercicios, en este u otro proceso) se
+    descarta la caché. Escribir en otras tablas no la invalida.
+"""
+import sys
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from db import repository
+
+_CAMPOS = repository.COLUMNAS_EJERCICIO
+_INDEXADOS = ('tema', 'subtema', 'archivo_origen')
+
+
+class Ejercicio:
+    """Un ejercicio del catálogo (sólo lectura); acepta el acceso de un dict."""
+    __slots__ = _CAMPOS
+
+    def __init__(self, fila: tuple):
+        (self.id, self.numero, self.enunciado, self.condiciones, self.respuesta,
+         tema, subtema, archivo_origen) = fila
+        self.tema = sys.intern(tema) if tema is not None else None
+        self.subtema = sys.intern(subtema) if subtema is not None else None
+        self.archivo_origen = sys.intern(archivo_origen) if archivo_origen is not None else None
+
+    def __getitem__(self, campo: str):
+        if campo not in _CAMPOS:
+            raise KeyError(campo)
+        return getattr(self, campo)
+
+    def get(self, campo: str, defecto=None):
+        return getattr(self, campo) if campo in _CAMPOS else defecto
+
+    def keys(self) -> Tuple[str, ...]:
+        return _CAMPOS
+
+    def __contains__(self, campo) -> bool:
+        return campo in _CAMPOS
+
+    def a_dict(self) -> Dict:
+        return {c: getattr(self, c) for c in _CAMPOS}
+
+    def __repr__(self):
+        return f"Ejercicio(id={self.id}, numero={self.numero!r}, tema={self.tema!r})"
+
+
+class _Catalogo:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._vaciar()
+        self.version: Optional[int] = None
+        self.testigo = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.recargas = 0
+
+    def _vaciar(self):
+        self.registros: Dict[int, Ejercicio] = {}
+        self.completo = False
+        self.ids = array('q')
+        # columna -> valor -> ids (ordenados)
+        self.indices: Dict[str, Dict[Optional[str], array]] = {c: {} for c in _INDEXADOS}
+        self.por_estrato: Dict[Tuple[Optional[str], Optional[str]], array] = {}
+
+    # ----- invalidación ----- #
+    def verificar(self):
+        """Descarta la caché si los ejercicios cambiaron desde que se cargó."""
+        testigo = repository.read_testigo_cambios()
+        if testigo == self.testigo:
+            return
+        with self._lock:
+            version = repository.read_version_catalogo()
+            if version != self.version:
+                if self.registros:
+                    self.recargas += 1
+                self._vaciar()
+                self.version = version
+            self.testigo = testigo
+
+    def invalidar(self):
+        with self._lock:
+            self._vaciar()
+            self.version = self.testigo = None
+
+    # ----- carga ----- #
+    def cargar_completo(self):
+        with self._lock:
+            if self.completo:
+                return
+            version, filas = repository.read_catalogo()
+            self._vaciar()
+            registros = self.registros
+            ids = self.ids
+            for fila in filas:
+                ej = Ejercicio(fila)
+                registros[ej.id] = ej
+                ids.append(ej.id)
+                for columna in _INDEXADOS:
+                    valor = getattr(ej, columna)
+                    indice = self.indices[columna].get(valor)
+                    if indice is None:
+                        indice = self.indices[columna][valor] = array('q')
+                    indice.append(ej.id)
+                estrato = self.por_estrato.get((ej.tema, ej.subtema))
+                if estrato is None:
+                    estrato = self.por_estrato[(ej.tema, ej.subtema)] = array('q')
+                estrato.append(ej.id)
+            self.version = version
+            self.completo = True
+
+    def por_ids(self, ids: Iterable[int]) -> Dict[int, Ejercicio]:
+        ids = list(ids)
+        registros = self.registros
+        resultado = {i: registros[i] for i in ids if i in registros}
+        faltan = [i for i in ids if i not in resultado]
+        self.aciertos += len(resultado)
+        if faltan and not self.completo:
+            # con el catálogo completo, lo que falta no existe o está retirado
+            self.fallos += len(faltan)
+            with self._lock:
+                for fila in repository.read_filas_por_ids(faltan):
+                    ej = registros[fila[0]] = Ejercicio(fila)
+                    resultado[ej.id] = ej
+        elif faltan:
+            # retirados: no quedan en el catálogo (sólo tiene activos)
+            self.fallos += len(faltan)
+            for fila in repository.read_filas_por_ids(faltan):
+                resultado[fila[0]] = Ejercicio(fila)
+        return resultado
+
+    # ----- filtros ----- #
+    def _ids_columna(self, columna: str, valor: str, prefijo: bool) -> array:
+        indice = self.indices[columna]
+        if not prefijo:
+            return indice.get(valor, array('q'))
+        claves = [k for k in indice if k is not None and k.startswith(valor)]
+        if len(claves) == 1:
+            return indice[claves[0]]
+        return array('q', sorted(i for k in claves for i in indice[k]))
+
+    def filtrar(self, filtros: Optional[Dict] = None, prefijos: Optional[Dict[str, str]] = None) -> array:
+        condiciones = [(c, v, False) for c, v in (filtros or {}).items()]
+        condiciones += [(c, v, True) for c, v in (prefijos or {}).items()]
+        for columna, _, prefijo in condiciones:
+            if columna not in _CAMPOS:
+                raise ValueError(f"Columna inválida: {columna}")
+            if prefijo and columna not in repository.COLUMNAS_TEXTO_FILTRABLES:
+                raise ValueError(f"No se puede filtrar por prefijo en: {columna}")
+        if not condiciones:
+            return self.ids
+
+        indexadas = [(c, v, p) for c, v, p in condiciones if c in _INDEXADOS]
+        resto = [(c, v, p) for c, v, p in condiciones if c not in _INDEXADOS]
+        if indexadas:
+            # se parte del índice más chico y se verifica el resto fila por fila
+            candidatos = min((self._ids_columna(c, v, p) for c, v, p in indexadas), key=len)
+            resto = condiciones
+        else:
+            candidatos = self.ids
+        registros = self.registros
+        return array('q', (
+            i for i in candidatos
+            if all(_cumple(getattr(registros[i], c), v, p) for c, v, p in resto)
+        ))
+
+
+def _cumple(valor, buscado, prefijo: bool) -> bool:
+    if prefijo:
+        return isinstance(valor, str) and valor.startswith(buscado)
+    return valor == buscado or (valor is not None and str(valor) == str(buscado))
+
+
+_catalogo = _Catalogo()
+
+
+# ----------------- API ----------------- #
+def ejercicios_por_ids(ids: Iterable[int]) -> Dict[int, Ejercicio]:
+    """{id: Ejercicio} como repository.read_ejercicios_por_ids, servido desde memoria."""
+    _catalogo.verificar()
+    return _catalogo.por_ids(ids)
+
+
+def _consultar(filtros: Optional[Dict], prefijos: Optional[Dict[str, str]]) -> Tuple[array, Dict[int, Ejercicio]]:
+    _catalogo.verificar()
+    # carga y filtro bajo el mismo lock: otro hilo no puede vaciar la caché en el medio
+    with _catalogo._lock:
+        _catalogo.cargar_completo()
+        return _catalogo.filtrar(filtros, prefijos), _catalogo.registros
+
+
+def ids_ejercicios(filtros: Optional[Dict] = None, prefijos: Optional[Dict[str, str]] = None) -> array:
+    """Ids (ordenados) de los ejercicios activos que cumplen los filtros (igualdad / prefijo)."""
+    return _consultar(filtros, prefijos)[0]
+
+
+def ejercicios(filtros: Optional[Dict] = None, prefijos: Optional[Dict[str, str]] = None) -> List[Ejercicio]:
+    """Como repository.read_ejercicios (activos, por id, mismos filtros), desde memoria."""
+    ids, registros = _consultar(filtros, prefijos)
+    return [registros[i] for i in ids]
+
+
+def estratos() -> Dict[Tuple[Optional[str], Optional[str]], array]:
+    """{(tema, subtema): ids} de los ejercicios activos."""
+    _catalogo.verificar()
+    with _catalogo._lock:
+        _catalogo.cargar_completo()
+        return dict(_catalogo.por_estrato)
+
+
+def invalidar():
+    """Descarta todo lo cacheado (la próxima consulta vuelve a la DB)."""
+    _catalogo.invalidar()
+
+
+def estadisticas() -> Dict:
+    """{'registros', 'completo', 'version', 'aciertos', 'fallos', 'recargas'}"""
+    return {
+        'registros': len(_catalogo.registros),
+        'completo': _catalogo.completo,
+        'version': _catalogo.version,
+        'aciertos': _catalogo.aciertos,
+        'fallos': _catalogo.fallos,
+        'recargas': _catalogo.recargas,
+    }
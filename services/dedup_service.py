@@ -0,0 +1,310 @@
+"""
+Detección de casi-duplicados entre enunciados (MinHash + LSH).
+
+La huella exacta (ejercicios.huella) sólo detecta enunciados idénticos salvo
+espacios. Acá cada enunciado se convierte en tokens LaTeX y luego en shingles
+(k-gramas de tokens); de ahí sale una firma MinHash de FIRMA_K valores que estima
+la similitud de Jaccard entre enunciados. La firma se parte en BANDAS bandas:
+dos ejercicios son candidatos si coinciden en al menos una banda completa, y
+esa búsqueda es una consulta por índice sobre ejercicios_lsh (sub-lineal).
+
+Normalización de tokens:
+  - macros de espaciado y llaves/tamaños (\\left, \\Big, {}) no cuentan;
+  - las variables (letras sueltas) se renombran por frecuencia de aparición, así
+    (2xy + \\sin y)dx y (2tu + \\sin u)dt producen los mismos tokens;
+  - los sumandos de cada grupo ((...), [...], {...}) y de cada lado de un '=' o
+    una ',' se ordenan, cada uno con su signo: (2xy + \\sin y)dx y
+    (\\sin y + 2xy)dx también producen los mismos tokens.
+
+La firma usa "one permutation hashing" con densificación por rotación: un único
+hash por shingle repartido en FIRMA_K compartimentos, en lugar de FIRMA_K
+permutaciones (mucho más barato en Python puro).
+"""
+import hashlib
+import operator
+import re
+import sqlite3
+import struct
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import instrumentacion
+from db import repository
+from services import catalog_service
+from latex_parser import huella_enunciado, normalizar_enunciado
+
+FIRMA_K = 64          # valores por firma (potencia de 2)
+# subir al cambiar tokens/shingles/firma: las firmas guardadas con otra versión se recalculan
+FIRMA_VERSION = 3
+BANDAS = 16           # BANDAS * FILAS == FIRMA_K; umbral LSH ~ (1/BANDAS) ** (1/FILAS) ≈ 0.5
+FILAS = FIRMA_K // BANDAS
+SHINGLE_K = 3         # tokens por shingle
+UMBRAL = 0.6          # similitud estimada mínima para marcar casi-duplicado
+
+_TOKEN_LATEX_RE = re.compile(r'\\[A-Za-z]+|\\.|[A-Za-z]|\d+(?:\.\d+)?|\S')
+_IGNORADOS = {
+    r'\left', r'\right', r'\middle',
+    r'\big', r'\Big', r'\bigg', r'\Bigg',
+    r'\bigl', r'\bigr', r'\Bigl', r'\Bigr', r'\biggl', r'\biggr', r'\Biggl', r'\Biggr',
+}
+_GRUPOS = {'(': ')', '[': ']', '{': '}'}
+_SEPARADORES = {'=', ','}
+_SIGNOS = {'+', '-'}
+_MASCARA_32 = 0xFFFFFFFF
+# los bits bajos del hash eligen el compartimento; el valor usa sólo los de arriba
+_BITS_COMPARTIMENTO = FIRMA_K.bit_length() - 1
+_VACIO = 1 << 64
+_FORMATO_FIRMA = f"<{FIRMA_K}I"
+
+
+# ----------------- FIRMAS ----------------- #
+def tokens_latex(enunciado: Optional[str]) -> List[str]:
+    """Tokens LaTeX normalizados del enunciado (ver docstring del módulo)."""
+    tokens = [t for t in _TOKEN_LATEX_RE.findall(normalizar_enunciado(enunciado)) if t not in _IGNORADOS]
+    frecuencias = Counter(t for t in tokens if len(t) == 1 and t.isalpha())
+    orden = sorted(frecuencias.items(), key=lambda kv: (-kv[1], kv[0]))
+    variables = {letra: f"v{i}" for i, (letra, _) in enumerate(orden)}
+    return _ordenar_sumandos([variables.get(t, t) for t in tokens], 0, None)[0]
+
+
+def _ordenar_sumandos(tokens: List[str], i: int, cierre: Optional[str]) -> Tuple[List[str], int]:
+    """
+    Tokens del grupo que empieza en tokens[i] (hasta `cierre`) con los sumandos
+    de cada lado en orden canónico; las llaves agrupan pero no se emiten.
+    Retorna (tokens, posición siguiente al cierre).
+    """
+    salida: List[str] = []
+    sumandos: List[List[str]] = []
+    actual: List[str] = []
+
+    def volcar():
+        sumandos.append(actual)
+        # cada sumando con signo explícito: "a + b" y "b + a" quedan iguales
+        ordenados = sorted(([*t] if t[0] in _SIGNOS else ['+', *t]) for t in sumandos if t)
+        for j, sumando in enumerate(ordenados):
+            salida.extend(sumando[1:] if j == 0 and sumando[0] == '+' else sumando)
+        sumandos.clear()
+
+    while i < len(tokens):
+        t = tokens[i]
+        i += 1
+        if t == cierre:
+            break
+        if t in _GRUPOS:
+            interior, i = _ordenar_sumandos(tokens, i, _GRUPOS[t])
+            actual.extend(interior if t == '{' else [t, *interior, _GRUPOS[t]])
+        elif t == '}':
+            continue  # llave sin abrir
+        elif t in _SIGNOS and actual:
+            sumandos.append(actual)
+            actual = [t]
+        elif t in _SEPARADORES:
+            volcar()
+            actual = []
+            salida.append(t)
+        else:
+            actual.append(t)
+    volcar()
+    return salida, i
+
+
+def shingles(enunciado: Optional[str], k: int = SHINGLE_K) -> set:
+    """Conjunto de k-gramas de tokens (como strings)."""
+    tokens = tokens_latex(enunciado)
+    if len(tokens) <= k:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+
+def _hash64(texto: str) -> int:
+    return int.from_bytes(hashlib.blake2b(texto.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def firma_minhash(enunciado: Optional[str]) -> Tuple[int, ...]:
+    """Firma MinHash (FIRMA_K valores de 32 bits) del enunciado."""
+    compartimentos = [_VACIO] * FIRMA_K
+    for sh in shingles(enunciado):
+        h = _hash64(sh)
+        i = h & (FIRMA_K - 1)
+        v = h >> _BITS_COMPARTIMENTO
+        if v < compartimentos[i]:
+            compartimentos[i] = v
+
+    # densificación: un compartimento vacío toma el valor del siguiente no vacío
+    # (circular), desplazado por la distancia para no fabricar coincidencias
+    # (una pasada hacia atrás sobre el arreglo duplicado resuelve la vuelta circular)
+    firma = [0] * FIRMA_K
+    siguiente, distancia = 0, 0
+    for j in range(2 * FIRMA_K - 1, -1, -1):
+        v = compartimentos[j % FIRMA_K]
+        if v != _VACIO:
+            siguiente, distancia = v, 0
+        else:
+            distancia += 1
+        if j < FIRMA_K:
+            firma[j] = (siguiente + distancia * 0x9E3779B1) & _MASCARA_32
+    return tuple(firma)
+
+
+def buckets_lsh(firma: Sequence[int]) -> List[Tuple[int, int]]:
+    """
+    [(banda, bucket)] de la firma; bucket = hash de 63 bits de las FILAS valores de la banda.
+    Las bandas toman compartimentos intercalados (banda, banda + BANDAS, ...): con
+    pocos shingles la densificación copia un mismo valor en compartimentos
+    consecutivos, y una banda contigua coincidiría por un solo shingle en común.
+    """
+    resultado = []
+    for banda in range(BANDAS):
+        datos = struct.pack(f"<{FILAS}I", *firma[banda::BANDAS])
+        bucket = int.from_bytes(hashlib.blake2b(datos, digest_size=8).digest(), "little") >> 1
+        resultado.append((banda, bucket))
+    return resultado
+
+
+def similitud(a: Sequence[int], b: Sequence[int]) -> float:
+    """Similitud de Jaccard estimada entre dos firmas."""
+    return sum(map(operator.eq, a, b)) / FIRMA_K
+
+
+def _empaquetar(firma: Sequence[int]) -> bytes:
+    return struct.pack(_FORMATO_FIRMA, *firma)
+
+
+def _desempaquetar(datos: bytes) -> Tuple[int, ...]:
+    return struct.unpack(_FORMATO_FIRMA, datos)
+
+
+# ----------------- ÍNDICE ----------------- #
+@instrumentacion.medir("dedup.indexar_pendientes")
+def indexar_pendientes(batch_size: int = repository.BATCH_SIZE,
+                       firmas: Optional[Dict[str, Tuple[int, ...]]] = None,
+                       conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Calcula y guarda la firma de los ejercicios activos que no la tienen (o cuyo
+    enunciado cambió, o calculada con otra FIRMA_VERSION). Retorna la cantidad indexada.
+    firmas: {huella: firma} ya calculadas (p. ej. por marcar_similares) para no repetirlas.
+    conn: transacción en curso (UnitOfWork.conn) que ve y recibe las firmas; sin commit.
+    """
+    firmas = firmas or {}
+    total = 0
+    ultimo_id = 0
+    while True:
+        pendientes = repository.read_pendientes_minhash(ultimo_id, batch_size, FIRMA_VERSION, conn=conn)
+        if not pendientes:
+            return total
+        ultimo_id = pendientes[-1][0]
+        filas = []
+        for ejercicio_id, enunciado, huella in pendientes:
+            huella = huella or huella_enunciado(enunciado)
+            firma = firmas.get(huella) or firma_minhash(enunciado)
+            filas.append((ejercicio_id, huella, _empaquetar(firma), buckets_lsh(firma)))
+        repository.guardar_firmas_minhash(filas, FIRMA_VERSION, conn=conn)
+        total += len(filas)
+
+
+@instrumentacion.medir("dedup.buscar_similares_lote")
+def buscar_similares_lote(enunciados: Sequence[str], umbral: float = UMBRAL) -> List[List[Tuple[int, float]]]:
+    """
+    Para cada enunciado devuelve [(ejercicio_id, similitud)] de los ejercicios
+    indexados que superan `umbral`, de mayor a menor similitud. Todos los
+    buckets del lote se resuelven con consultas por índice en una pasada.
+    """
+    return _similares_de_firmas([firma_minhash(e) for e in enunciados], umbral)
+
+
+def _similares_de_firmas(firmas: Sequence[Tuple[int, ...]], umbral: float,
+                         conn: Optional[sqlite3.Connection] = None) -> List[List[Tuple[int, float]]]:
+    buckets = [buckets_lsh(f) for f in firmas]
+    por_bucket = repository.read_candidatos_lsh([b for bs in buckets for b in bs], conn=conn)
+
+    candidatos = [{i for b in bs for i in por_bucket.get(b, ())} for bs in buckets]
+    guardadas = {i: _desempaquetar(f) for i, f in
+                 repository.read_firmas_minhash((i for cs in candidatos for i in cs), conn=conn).items()}
+
+    resultado = []
+    for firma, cs in zip(firmas, candidatos):
+        similares = [(i, similitud(firma, guardadas[i])) for i in cs if i in guardadas]
+        resultado.append(sorted([s for s in similares if s[1] >= umbral], key=lambda s: (-s[1], s[0])))
+    return resultado
+
+
+def buscar_similares(enunciado: str, umbral: float = UMBRAL) -> List[Tuple[int, float]]:
+    """[(ejercicio_id, similitud)] de los ejercicios parecidos al enunciado dado."""
+    return buscar_similares_lote([enunciado], umbral)[0]
+
+
+def reporte_clusters(umbral: float = UMBRAL) -> List[List[Dict]]:
+    """
+    Agrupa los ejercicios activos en clusters de casi-duplicados: parte de las
+    colisiones LSH, confirma cada par con la similitud estimada y une los pares
+    (union-find). Devuelve los clusters (listas de ejercicios con 'similitud'
+    respecto del primero), del más grande al más chico.
+    """
+    indexar_pendientes()
+    grupos = repository.read_colisiones_lsh()
+    firmas = {i: _desempaquetar(f) for i, f in
+              repository.read_firmas_minhash(i for g in grupos for i in g).items()}
+
+    padre: Dict[int, int] = {}
+
+    def raiz(x: int) -> int:
+        while padre.setdefault(x, x) != x:
+            padre[x] = padre[padre[x]]
+            x = padre[x]
+        return x
+
+    for grupo in grupos:
+        for i, a in enumerate(grupo):
+            for b in grupo[i + 1:]:
+                if raiz(a) != raiz(b) and similitud(firmas[a], firmas[b]) >= umbral:
+                    padre[raiz(a)] = raiz(b)
+
+    clusters: Dict[int, List[int]] = {}
+    for x in padre:
+        clusters.setdefault(raiz(x), []).append(x)
+    clusters_ids = sorted((sorted(c) for c in clusters.values() if len(c) > 1), key=lambda c: (-len(c), c[0]))
+
+    ejercicios = catalog_service.ejercicios_por_ids(i for c in clusters_ids for i in c)
+    reporte = []
+    for c in clusters_ids:
+        base = firmas[c[0]]
+        reporte.append([{**ejercicios[i], 'similitud': similitud(base, firmas[i])} for i in c if i in ejercicios])
+    return reporte
+
+
+@instrumentacion.medir("dedup.marcar_similares")
+def marcar_similares(ejercicios: Iterable[Dict], umbral: float = UMBRAL,
+                     firmas_por_huella: Optional[Dict[str, Tuple[int, ...]]] = None,
+                     conn: Optional[sqlite3.Connection] = None) -> List[Dict]:
+    """
+    Revisa ejercicios ANTES de insertarlos: compara contra el índice de la DB y
+    contra los anteriores del mismo lote. Devuelve una marca por ejercicio sospechoso:
+        {'ejercicio': ej, 'similares': [(ejercicio_id, similitud), ...],
+         'similares_en_lote': [(posicion, similitud), ...]}
+    firmas_por_huella: si se da, se completa con {huella: firma} de los ejercicios
+    revisados (indexar_pendientes las reutiliza después de insertarlos).
+    conn: ver indexar_pendientes.
+    """
+    ejercicios = list(ejercicios)
+    indexar_pendientes(conn=conn)
+    firmas = [firma_minhash(ej.get('enunciado')) for ej in ejercicios]
+    if firmas_por_huella is not None:
+        for ej, firma in zip(ejercicios, firmas):
+            firmas_por_huella[huella_enunciado(ej.get('enunciado'))] = firma
+    contra_db = _similares_de_firmas(firmas, umbral, conn)
+
+    marcas = []
+    lote: Dict[Tuple[int, int], List[int]] = {}
+    for pos, (ej, firma, similares) in enumerate(zip(ejercicios, firmas, contra_db)):
+        en_lote = set()
+        for b in buckets_lsh(firma):
+            en_lote.update(lote.get(b, ()))
+            lote.setdefault(b, []).append(pos)
+        similares_en_lote = sorted(
+            ((p, similitud(firma, firmas[p])) for p in en_lote),
+            key=lambda s: (-s[1], s[0])
+        )
+        similares_en_lote = [s for s in similares_en_lote if s[1] >= umbral]
+        if similares or similares_en_lote:
+            marcas.append({'ejercicio': ej, 'similares': similares, 'similares_en_lote': similares_en_lote})
+    return marcas
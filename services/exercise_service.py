@@ -1,41 +1,74 @@
 # services/exercise_service.py
-from typing import List, Dict, Tuple
+import sqlite3
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import instrumentacion
 from db import repository
+from services import dedup_service, expression_service
 
-def agregar_ejercicios(ejercicios: List[Dict]) -> Tuple[int, int]:
-    """
-    Agrega una lista de ejercicios a la DB solo si no existen.
-    
-    Retorna:
-        (cantidad_agregados, cantidad_duplicados)
-    """
-    agregados = 0
-    duplicados = 0
-
+def _insertables(ejercicios: Iterable[Dict]) -> Iterator[Dict]:
+    """Filtra los ejercicios sin número o sin enunciado (no se insertan ni cuentan)."""
     for ej in ejercicios:
-        numero = ej.get('numero')
-        if not numero:
+        if not ej.get('numero'):
             # Saltar ejercicios sin número definido
             continue
-
-  #      if repository.exists_ejercicio(numero):
-  #          duplicados += 1
-  #          continue
-        enunciado = ej.get('enunciado', '').strip()
-        if not enunciado:
+        if not (ej.get('enunciado') or '').strip():
             # Saltar si no hay texto de enunciado
             continue
+        yield ej
 
-        if repository.exists_ejercicio_por_enunciado(enunciado):
-            duplicados += 1
-            continue
 
+def _con_plantillas(ejercicios: Iterable[Dict], plantillas: List[Tuple[str, str, str]]) -> Iterator[Dict]:
+    """Deja pasar los ejercicios y anota (archivo_origen, numero, plantilla) de los paramétricos."""
+    for ej in ejercicios:
+        if ej.get('plantilla'):
+            plantillas.append((ej.get('archivo_origen'), ej['numero'], ej['plantilla']))
+        yield ej
 
-        # Insertar en la DB
-        repository.create_ejercicio(ej)
-        agregados += 1
 
-    return agregados, duplicados
+@instrumentacion.medir("exercise.agregar_ejercicios")
+def agregar_ejercicios(ejercicios: Iterable[Dict], batch_size: int = repository.BATCH_SIZE,
+                       umbral: float = dedup_service.UMBRAL,
+                       conn: Optional[sqlite3.Connection] = None) -> Tuple[int, int, List[Dict]]:
+    """
+    Agrega ejercicios a la DB solo si no existen (mismo enunciado) y marca los
+    posibles casi-duplicados (MinHash/LSH) entre los efectivamente agregados:
+    parecidos a otros de la DB o a otros del mismo lote. Los duplicados exactos
+    no se marcan (no se insertan).
+    Acepta cualquier iterable (p.ej. latex_parser.iter_ejercicios) y lo consume
+    por lotes de batch_size: una transacción por lote (repository.create_ejercicios_bulk);
+    cada lote queda indexado antes del siguiente, así los parecidos a lotes
+    anteriores se marcan como parecidos a ejercicios de la DB.
+
+    conn: conexión de una transacción en curso (UnitOfWork.conn): todo se hace
+    en ella sin commit, y el precalentado de expresiones queda a cargo del
+    llamador (después de confirmar; ver expression_service.precalentar_en_segundo_plano).
+
+    Retorna:
+        (cantidad_agregados, cantidad_duplicados, marcas)  -- ver dedup_service.marcar_similares
+    """
+    ultimo_id = repository.read_ultimo_id(conn)
+    plantillas: List[Tuple[str, str, str]] = []
+    agregados = duplicados = 0
+    marcas: List[Dict] = []
+    validos = _con_plantillas(_insertables(ejercicios), plantillas)
+    while lote := list(islice(validos, batch_size)):
+        firmas: Dict[str, Tuple[int, ...]] = {}
+        marcas_lote = dedup_service.marcar_similares(lote, umbral, firmas, conn=conn)
+        resultados = repository.create_ejercicios_bulk(lote, batch_size, conn=conn)
+        # índice de casi-duplicados al día con lo recién insertado (firmas ya calculadas)
+        dedup_service.indexar_pendientes(firmas=firmas, conn=conn)
+
+        insertados = {id(ej) for ej, r in zip(lote, resultados) if r == repository.INSERTADO}
+        marcas.extend(m for m in marcas_lote if id(m['ejercicio']) in insertados)
+        agregados += len(insertados)
+        duplicados += len(resultados) - len(insertados)
+    if plantillas:
+        repository.guardar_plantillas(plantillas, conn=conn)
+    if conn is None:
+        # las expresiones se parsean en segundo plano (SymPy es lento y no debe frenar la carga)
+        expression_service.precalentar_en_segundo_plano(ultimo_id)
+    return agregados, duplicados, marcas
 
 
 def validar_ejercicio(ej: Dict) -> bool:
@@ -54,7 +87,7 @@ def validar_ejercicio(ej: Dict) -> bool:
     return True
 
 
-def agregar_ejercicios_con_validacion(ejercicios: List[Dict]) -> Tuple[int, int]:
+def agregar_ejercicios_con_validacion(ejercicios: Iterable[Dict]) -> Tuple[int, int]:
     """
     Variante que valida antes de agregar.
     Retorna: (agregados, duplicados)
@@ -0,0 +1,264 @@
+r"""
+Exportación de prácticas a .tex (estándar EXERCISE_START/END de data/main.tex) y
+Markdown, con clave de respuestas opcional y compilación a PDF opcional.
+
+  - Las plantillas (preámbulo, secciones, bloque de ejercicio) se compilan una
+    sola vez (string.Template) y el preámbulo armado se cachea por título.
+  - El documento se genera por partes (iter_tex / iter_markdown) y se escribe a
+    un archivo temporal que reemplaza al destino al terminar: nunca se arma el
+    documento entero en memoria ni queda un archivo a medias.
+  - Cada archivo lleva en su primera línea la huella de lo que lo generó
+    (ejercicios, formato, opciones y versión de plantillas). Si el destino ya
+    tiene esa huella se omite: re-exportar un lote sin cambios sólo lee una
+    línea por archivo.
+  - Los lotes (una práctica por estudiante) se reparten entre hilos: el trabajo
+    es de E/S y los ejercicios se leen de la DB una sola vez para todo el lote.
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from string import Template
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from services import catalog_service, template_service
+
+# subir cuando cambie el formato de salida (invalida las huellas de lo exportado)
+VERSION_PLANTILLAS = "1"
+DIRECTORIO_EXPORTACION = "exports"
+FORMATOS = ('tex', 'md')
+
+_PREAMBULO_TEX = Template(r"""\documentclass{article}
+\usepackage[utf8]{inputenc}
+\usepackage{amsmath,amssymb}
+\usepackage{graphicx}
+
+\title{$titulo}
+\author{$autor}
+\date{$fecha}
+
+\begin{document}
+\maketitle
+
+""")
+_SECCION_TEX = Template("\\section*{$titulo}\n\n")
+_SUBSECCION_TEX = Template("\\subsection*{$titulo}\n\n")
+_EJERCICIO_TEX = Template(r"""%% EXERCISE_START
+% id: $numero
+% ejercicio_id: $id
+$numero)
+\[
+$enunciado$condicion
+\]
+$respuesta%% EXERCISE_END
+
+\vspace{8pt}
+
+""")
+_RESPUESTA_TEX = Template("\\[\n$respuesta\n\\]\n")
+_FIN_TEX = "\\end{document}\n"
+
+_PREAMBULO_MD = Template("# $titulo\n\n")
+_SECCION_MD = Template("## $titulo\n\n")
+_SUBSECCION_MD = Template("### $titulo\n\n")
+_EJERCICIO_MD = Template("**$numero)** $$$enunciado$$$condicion\n\n$respuesta")
+_CONDICION_MD = Template(", con $$$condiciones$$")
+_RESPUESTA_MD = Template("> **Respuesta:** $$$respuesta$$\n\n")
+
+_COMENTARIO_HUELLA = {'tex': "% huella: {}\n", 'md': "<!-- huella: {} -->\n"}
+
+
+# ----------------- RENDER ----------------- #
+@lru_cache(maxsize=32)
+def _preambulo_tex(titulo: str, autor: str, fecha: str) -> str:
+    return _PREAMBULO_TEX.substitute(titulo=titulo, autor=autor, fecha=fecha)
+
+
+def _plano(texto: Optional[str]) -> str:
+    return (texto or "").strip()
+
+
+def _linea(texto: Optional[str]) -> str:
+    """Texto en una sola línea (las fórmulas inline de Markdown no admiten saltos)."""
+    return " ".join((texto or "").split())
+
+
+def _por_seccion(ejercicios: Sequence[Dict]) -> Iterator[Tuple[Optional[str], Optional[str], int, Dict]]:
+    """(tema si cambió, subtema si cambió, número en la práctica, ejercicio)."""
+    tema = subtema = None
+    for numero, ej in enumerate(ejercicios, start=1):
+        nuevo_tema = _plano(ej.get('tema'))
+        nuevo_subtema = _plano(ej.get('subtema'))
+        cambio_tema = nuevo_tema != tema
+        cambio_subtema = cambio_tema or nuevo_subtema != subtema
+        tema, subtema = nuevo_tema, nuevo_subtema
+        yield (tema if cambio_tema else None), (subtema if cambio_subtema else None), numero, ej
+
+
+def iter_tex(ejercicios: Sequence[Dict], titulo: str = "Práctica", con_respuestas: bool = False,
+             autor: str = "", fecha: str = "") -> Iterator[str]:
+    r"""
+    Partes del documento .tex en el estándar del parser: un bloque
+    EXERCISE_START/END por ejercicio con el enunciado (y la condición inline con
+    ", \quad") en el primer \[ ... \] y, si con_respuestas, la respuesta en el segundo.
+    """
+    yield _preambulo_tex(titulo, autor, fecha)
+    for tema, subtema, numero, ej in _por_seccion(ejercicios):
+        if tema:
+            yield _SECCION_TEX.substitute(titulo=tema)
+        if subtema:
+            yield _SUBSECCION_TEX.substitute(titulo=subtema)
+        condiciones = _plano(ej.get('condiciones'))
+        respuesta = _plano(ej.get('respuesta'))
+        yield _EJERCICIO_TEX.substitute(
+            numero=numero,
+            id=ej.get('id', ""),
+            enunciado=_plano(ej.get('enunciado')),
+            condicion=f", \\quad {condiciones}" if condiciones else "",
+            respuesta=_RESPUESTA_TEX.substitute(respuesta=respuesta) if con_respuestas and respuesta else ""
+        )
+    yield _FIN_TEX
+
+
+def iter_markdown(ejercicios: Sequence[Dict], titulo: str = "Práctica", con_respuestas: bool = False) -> Iterator[str]:
+    """Partes del documento Markdown (fórmulas inline entre $ ... $, respuestas como citas)."""
+    yield _PREAMBULO_MD.substitute(titulo=titulo)
+    for tema, subtema, numero, ej in _por_seccion(ejercicios):
+        if tema:
+            yield _SECCION_MD.substitute(titulo=tema)
+        if subtema:
+            yield _SUBSECCION_MD.substitute(titulo=subtema)
+        condiciones = _linea(ej.get('condiciones'))
+        respuesta = _linea(ej.get('respuesta'))
+        yield _EJERCICIO_MD.substitute(
+            numero=numero,
+            enunciado=_linea(ej.get('enunciado')),
+            condicion=_CONDICION_MD.substitute(condiciones=condiciones) if condiciones else "",
+            respuesta=_RESPUESTA_MD.substitute(respuesta=respuesta) if con_respuestas and respuesta else ""
+        )
+
+
+# ----------------- ESCRITURA ----------------- #
+def huella_exportacion(ejercicios: Sequence[Dict], formato: str, titulo: str, con_respuestas: bool) -> str:
+    """Huella de todo lo que determina el contenido del archivo exportado."""
+    h = hashlib.blake2b(digest_size=16)
+    for parte in (VERSION_PLANTILLAS, formato, titulo, str(con_respuestas)):
+        h.update(parte.encode("utf-8") + b"\0")
+    for ej in ejercicios:
+        for campo in ('id', 'tema', 'subtema', 'enunciado', 'condiciones', 'respuesta'):
+            h.update(str(ej.get(campo) or "").encode("utf-8") + b"\0")
+    return h.hexdigest()
+
+
+def _huella_existente(ruta: str) -> Optional[str]:
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            primera = f.readline()
+    except OSError:
+        return None
+    partes = primera.split("huella:")
+    return partes[1].replace("-->", "").strip() if len(partes) == 2 else None
+
+
+def exportar(ejercicios: Sequence[Dict], ruta: str, formato: Optional[str] = None, titulo: str = "Práctica",
+             con_respuestas: bool = False, forzar: bool = False) -> bool:
+    """
+    Escribe la práctica en `ruta` (formato 'tex' o 'md'; por defecto según la
+    extensión). Retorna False si el archivo ya estaba al día y se omitió.
+    """
+    formato = formato or os.path.splitext(ruta)[1].lstrip(".").lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    huella = huella_exportacion(ejercicios, formato, titulo, con_respuestas)
+    if not forzar and _huella_existente(ruta) == huella:
+        return False
+
+    partes = iter_tex(ejercicios, titulo, con_respuestas) if formato == 'tex' else iter_markdown(ejercicios, titulo, con_respuestas)
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8", newline="\n") as f:
+        f.write(_COMENTARIO_HUELLA[formato].format(huella))
+        f.writelines(partes)
+    os.replace(temporal, ruta)
+    return True
+
+
+def exportar_practica(ids: Sequence[int], ruta: str, formato: Optional[str] = None, titulo: str = "Práctica",
+                      con_respuestas: bool = False, forzar: bool = False) -> bool:
+    """exportar() a partir de los ids de la práctica (en ese orden)."""
+    ejercicios = catalog_service.ejercicios_por_ids(ids)
+    return exportar([ejercicios[i] for i in ids if i in ejercicios], ruta, formato, titulo, con_respuestas, forzar)
+
+
+def exportar_lote(variantes: Sequence[Sequence[int]], directorio: str = DIRECTORIO_EXPORTACION,
+                  formatos: Iterable[str] = ('tex',), con_respuestas: bool = False, titulo: str = "Práctica",
+                  prefijo: str = "practica", workers: Optional[int] = None,
+                  forzar: bool = False,
+                  instancias: Optional[Sequence[Sequence[Optional[int]]]] = None) -> Dict[str, List[str]]:
+    """
+    Exporta una práctica por estudiante: <directorio>/<prefijo>_<NNN>.<formato>
+    (y <prefijo>_<NNN>_clave.<formato> con las respuestas si con_respuestas).
+    instancias: para cada práctica, el id de instancia de cada ejercicio (o
+    None), como los da template_service.sortear_instancias; la práctica y su
+    clave salen con los textos de esa instancia.
+    Retorna:
+        {'escritos': [rutas], 'omitidos': [rutas sin cambios]}
+    """
+    formatos = tuple(formatos)
+    ejercicios = catalog_service.ejercicios_por_ids({i for v in variantes for i in v})
+    ancho = max(3, len(str(len(variantes))))
+    textos = None
+    if instancias is not None:
+        textos = template_service.textos_instancias(instancias)
+
+    trabajos = []
+    for n, ids in enumerate(variantes, start=1):
+        if textos is not None:
+            pares = [(ejercicios[e], i) for e, i in zip(ids, instancias[n - 1]) if e in ejercicios]
+            practica = template_service.aplicar_instancias([e for e, _ in pares], [i for _, i in pares], textos)
+        else:
+            practica = [ejercicios[i] for i in ids if i in ejercicios]
+        nombre = f"{prefijo}_{n:0{ancho}d}"
+        for formato in formatos:
+            trabajos.append((practica, os.path.join(directorio, f"{nombre}.{formato}"), f"{titulo} {n}", False))
+            if con_respuestas:
+                trabajos.append((practica, os.path.join(directorio, f"{nombre}_clave.{formato}"),
+                                 f"{titulo} {n} (clave)", True))
+
+    os.makedirs(directorio, exist_ok=True)
+    resultado: Dict[str, List[str]] = {'escritos': [], 'omitidos': []}
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4)) as ex:
+        escritos = ex.map(lambda t: exportar(t[0], t[1], None, t[2], t[3], forzar), trabajos)
+        for (_, ruta, _, _), escrito in zip(trabajos, escritos):
+            resultado['escritos' if escrito else 'omitidos'].append(ruta)
+    return resultado
+
+
+# ----------------- PDF ----------------- #
+def compilar_pdf(ruta_tex: str, compilador: str = "pdflatex", timeout: float = 120) -> Optional[str]:
+    """
+    Compila el .tex a PDF (junto al .tex) si hay un compilador LaTeX instalado.
+    Omite la compilación si el PDF es más nuevo que el .tex.
+    Retorna la ruta del PDF, o None si no hay compilador o falla.
+    """
+    ejecutable = shutil.which(compilador)
+    if ejecutable is None:
+        return None
+    ruta_pdf = os.path.splitext(ruta_tex)[0] + ".pdf"
+    if os.path.exists(ruta_pdf) and os.path.getmtime(ruta_pdf) >= os.path.getmtime(ruta_tex):
+        return ruta_pdf
+    directorio = os.path.dirname(os.path.abspath(ruta_tex))
+    try:
+        subprocess.run(
+            [ejecutable, "-interaction=nonstopmode", "-halt-on-error", os.path.basename(ruta_tex)],
+            cwd=directorio, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            timeout=timeout, check=True
+        )
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        return None
+    return ruta_pdf
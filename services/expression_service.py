@@ -0,0 +1,472 @@
+r"""
+Traducción de fórmulas LaTeX a expresiones de SymPy, con caché de los árboles ya
+parseados (SymPy es opcional: pip install sympy).
+
+Parsear LaTeX es lo más caro de cualquier uso simbólico del banco y las mismas
+fórmulas se piden una y otra vez (validar, re-validar tras editar otro campo...).
+expresion(latex) consulta, en orden:
+  1. una LRU en memoria acotada por tamaño (MEMORIA_MAX_BYTES, medido sobre el
+     árbol serializado);
+  2. la tabla expresiones de la DB, por clave de contenido: hash del LaTeX y de
+     VERSION_TRADUCTOR. El árbol se guarda como srepr comprimido (zlib) y se
+     reconstruye sólo con clases de SymPy (nada de pickle: la DB se comparte y
+     un blob no debe poder ejecutar código); un blob que no pasa es un fallo de
+     caché;
+  3. recién entonces traduce y parsea, y guarda en ambos niveles.
+También se cachean los fallos (LatexNoSoportado), para no reintentarlos.
+
+precalentar() llena la caché por lotes (una lectura y una transacción). La
+ingesta pide, ya con la inserción confirmada, precalentar_en_segundo_plano()
+con los ejercicios recién agregados o editados: un hilo aparte los parsea sin
+demorar la carga, así la validación posterior no parsea nada. Si el proceso
+termina antes, lo que falte se parsea al validar.
+"""
+import ast
+import functools
+import hashlib
+import importlib.util
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import instrumentacion
+from db import repository
+
+# subir al cambiar la traducción (invalida las expresiones cacheadas)
+VERSION_TRADUCTOR = "2"
+MEMORIA_MAX_BYTES = 16 << 20
+# la ingesta precalienta la caché (en segundo plano) salvo EDO_PRECALENTAR=0
+PRECALENTAR_EN_INGESTA = os.environ.get("EDO_PRECALENTAR", "1") != "0"
+
+class LatexNoSoportado(ValueError):
+    """El LaTeX usa algo que la traducción a SymPy no cubre."""
+
+
+def sympy_disponible() -> bool:
+    """SymPy es opcional: sin él no hay validación ni caché de expresiones."""
+    return importlib.util.find_spec("sympy") is not None
+
+
+# ----------------- LaTeX -> SymPy ----------------- #
+_TOKEN_RE = re.compile(r"\\[A-Za-z]+|\\.|\d+(?:\.\d+)?|[A-Za-z]|\S")
+_IGNORADOS = {
+    r'\left', r'\right', r'\middle', r'\big', r'\Big', r'\bigg', r'\Bigg',
+    r'\bigl', r'\bigr', r'\Bigl', r'\Bigr', r'\biggl', r'\biggr', r'\Biggl', r'\Biggr',
+    r'\displaystyle', r'\textstyle', r'\,', r'\;', r'\:', r'\!', r'\ ', r'\quad', r'\qquad', '|', '.',
+}
+_FUNCIONES = {
+    r'\sin': 'sin', r'\cos': 'cos', r'\tan': 'tan', r'\cot': 'cot', r'\sec': 'sec', r'\csc': 'csc',
+    r'\sinh': 'sinh', r'\cosh': 'cosh', r'\tanh': 'tanh', r'\ln': 'log', r'\log': 'log', r'\exp': 'exp',
+    r'\arcsin': 'asin', r'\arccos': 'acos', r'\arctan': 'atan',
+}
+_SIMBOLOS = {r'\cdot': '*', r'\times': '*', r'\pi': 'pi', r'\infty': 'oo'}
+_FRACCIONES = {r'\frac', r'\dfrac', r'\tfrac'}
+_CONDICION_INLINE_RE = re.compile(r'(?<!\\),\s*\\q?quad')
+_FIN_ARGUMENTO = {'+', '-', '=', ',', ')', '}', ']', '*', '/', r'\cdot', r'\times'}
+
+
+class _Traductor:
+    """Recorrido recursivo de los tokens LaTeX que emite una expresión en sintaxis de SymPy."""
+
+    def __init__(self, latex: str):
+        self.tokens = [t for t in _TOKEN_RE.findall(latex) if t not in _IGNORADOS]
+        self.i = 0
+
+    def _siguiente(self) -> Optional[str]:
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def _argumento(self) -> str:
+        """Un grupo {...} o un único token (argumento de \\frac, ^, \\sqrt)."""
+        t = self._siguiente()
+        if t is None:
+            raise LatexNoSoportado("falta un argumento")
+        if t == '{':
+            self.i += 1
+            return self.expresion('}')
+        self.i += 1
+        return self._atomo(t)
+
+    def _funcion(self, nombre: str) -> str:
+        r"""
+        \sin^2 x, \ln(x + 1), \cos 2x ... -> sin(x)**(2), log((x + 1)), cos(2 x).
+        Sin paréntesis ni llaves, el argumento son los factores que siguen hasta un
+        operador, otra función o un diferencial (\cos x \sin y -> cos(x) sin(y)).
+        """
+        exponente = None
+        if self._siguiente() == '^':
+            self.i += 1
+            exponente = self._argumento()
+        t = self._siguiente()
+        if t == '(':
+            self.i += 1
+            argumento = self.expresion(')')
+        elif t == '{':
+            argumento = self._argumento()
+        else:
+            partes = []
+            while True:
+                t = self._siguiente()
+                if t is None or t in _FUNCIONES or t in _FRACCIONES or t in _FIN_ARGUMENTO:
+                    break
+                if t == 'd' and self.i + 1 < len(self.tokens) and self.tokens[self.i + 1] in ('x', 'y'):
+                    break
+                self.i += 1
+                if t == '^':
+                    partes.append(f'**({self._argumento()})')
+                elif t == '{':
+                    partes.append(f'({self.expresion("}")})')
+                else:
+                    partes.append(f' {self._atomo(t)} ')
+            if not partes:
+                raise LatexNoSoportado(f"{nombre} sin argumento")
+            argumento = ''.join(partes)
+        llamada = f' {nombre}({argumento})'
+        return f'{llamada}**({exponente}) ' if exponente else f'{llamada} '
+
+    def _atomo(self, t: str) -> str:
+        if t in _SIMBOLOS:
+            return _SIMBOLOS[t]
+        if t.startswith('\\'):
+            raise LatexNoSoportado(f"comando {t}")
+        return t
+
+    def expresion(self, cierre: Optional[str] = None) -> str:
+        partes: List[str] = []
+        while True:
+            t = self._siguiente()
+            if t is None:
+                if cierre is not None:
+                    raise LatexNoSoportado("llaves sin cerrar")
+                break
+            self.i += 1
+            if t == cierre:
+                break
+            if t in _FRACCIONES:
+                num, den = self._argumento(), self._argumento()
+                if (num.split(), den.split()) == (['DY'], ['DX']):
+                    partes.append(' p ')
+                else:
+                    partes.append(f'(({num})/({den}))')
+            elif t == r'\sqrt':
+                indice = None
+                if self._siguiente() == '[':
+                    self.i += 1
+                    indice = self.expresion(']')
+                radicando = self._argumento()
+                partes.append(f'(({radicando})**(1/({indice})))' if indice else f'sqrt({radicando})')
+            elif t == '{':
+                partes.append(f'({self.expresion("}")})')
+            elif t == '^':
+                partes.append(f'**({self._argumento()})')
+            elif t == '_':
+                # subíndice: C_1 -> C1 (sólo como parte del nombre)
+                subindice = self._argumento().replace(' ', '')
+                if not partes:
+                    raise LatexNoSoportado("subíndice sin base")
+                partes[-1] = f' {partes[-1].strip()}{subindice} '
+            elif t == "'":
+                if partes and partes[-1].strip() == 'y' and self._siguiente() != "'":
+                    partes[-1] = ' p '
+                else:
+                    raise LatexNoSoportado("derivadas de orden mayor a 1")
+            elif t in _FUNCIONES:
+                partes.append(self._funcion(_FUNCIONES[t]))
+            elif t == 'd' and self._siguiente() in ('x', 'y'):
+                # diferencial dx / dy
+                partes.append(f' D{self.tokens[self.i].upper()} ')
+                self.i += 1
+            else:
+                partes.append(f' {self._atomo(t)} ')
+        return ''.join(partes)
+
+
+def latex_a_texto(latex: str) -> str:
+    """Traduce una expresión/ecuación LaTeX a texto que entiende sympy.parse_expr."""
+    return _Traductor(latex).expresion()
+
+
+def _sympy():
+    import sympy
+    from sympy.parsing.sympy_parser import implicit_multiplication, parse_expr, standard_transformations
+    transformaciones = standard_transformations + (implicit_multiplication,)
+    return sympy, parse_expr, transformaciones
+
+
+def simbolos() -> Dict:
+    """Símbolos de la traducción (x, y, p = y', DX, DY, constantes) y e = E."""
+    sympy = _sympy()[0]
+    nombres = ('x', 'y', 'p', 'DX', 'DY', 'C', 'c', 'K')
+    locales = {n: sympy.Symbol(n) for n in nombres}
+    locales['e'] = sympy.E
+    return locales
+
+
+def latex_a_sympy(latex: str):
+    """Expresión (o Eq para ecuaciones) de SymPy a partir del LaTeX."""
+    sympy, parse_expr, transformaciones = _sympy()
+    lados = latex.split('=')
+    if len(lados) > 2:
+        raise LatexNoSoportado("más de un '='")
+    try:
+        expresiones = [parse_expr(latex_a_texto(l), local_dict=simbolos(), transformations=transformaciones)
+                       for l in lados]
+    except LatexNoSoportado:
+        raise
+    except Exception as e:
+        raise LatexNoSoportado(f"no se pudo interpretar: {e}") from e
+    return sympy.Eq(*expresiones, evaluate=False) if len(expresiones) == 2 else expresiones[0]
+
+
+def separar_condicion(latex: str) -> Tuple[str, str]:
+    """'ecuación, \\quad resto' -> (ecuación, resto), igual que el parser."""
+    m = _CONDICION_INLINE_RE.search(latex)
+    return (latex[:m.start()], latex[m.end():]) if m else (latex, "")
+
+
+# ----------------- CACHÉ ----------------- #
+class _LRU:
+    """OrderedDict acotado por la suma de los tamaños declarados de sus valores."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._datos: "OrderedDict[str, Tuple[object, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave: str):
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is None:
+                return None
+            self._datos.move_to_end(clave)
+            return valor[0]
+
+    def put(self, clave: str, valor, tamano: int):
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[1]
+            self._datos[clave] = (valor, tamano)
+            self.bytes += tamano
+            while self.bytes > self.max_bytes and len(self._datos) > 1:
+                _, (_, liberado) = self._datos.popitem(last=False)
+                self.bytes -= liberado
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+
+
+_memoria = _LRU(MEMORIA_MAX_BYTES)
+
+
+def clave_expresion(latex: str) -> str:
+    """Clave de contenido de una fórmula (hash del LaTeX y de la versión del traductor)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(VERSION_TRADUCTOR.encode("utf-8") + b"\0" + latex.encode("utf-8"))
+    return h.hexdigest()
+
+
+# nodos que puede tener un srepr: llamadas anidadas a clases de SymPy con literales
+_NODOS_SREPR = (ast.Expression, ast.Call, ast.Name, ast.Load, ast.keyword, ast.Constant,
+                ast.Tuple, ast.List, ast.UnaryOp, ast.USub)
+_nombres_srepr: Optional[Dict[str, object]] = None
+
+
+def _nombres_sympy() -> Dict[str, object]:
+    """Clases de SymPy (Symbol, Integer, Add, Derivative...) y sus singletons (pi, E, oo...)."""
+    global _nombres_srepr
+    if _nombres_srepr is None:
+        sympy = _sympy()[0]
+        nombres = {
+            nombre: valor for nombre, valor in vars(sympy).items()
+            if not nombre.startswith('_') and (
+                isinstance(valor, sympy.Basic) or (isinstance(valor, type) and issubclass(valor, sympy.Basic)))
+        }
+        # como en latex_a_sympy: la ecuación no se evalúa (y evaluarla es lo caro)
+        nombres['Equality'] = functools.partial(sympy.Eq, evaluate=False)
+        _nombres_srepr = nombres
+    return _nombres_srepr
+
+
+def _serializar(arbol) -> bytes:
+    return zlib.compress(_sympy()[0].srepr(arbol).encode("utf-8"))
+
+
+def _deserializar(datos: bytes):
+    """Árbol desde su srepr; ValueError si el blob no es un srepr de clases de SymPy."""
+    try:
+        arbol = ast.parse(zlib.decompress(datos).decode("utf-8"), mode="eval")
+    except (zlib.error, UnicodeDecodeError, SyntaxError) as e:
+        raise ValueError(f"árbol cacheado ilegible: {e}") from e
+    nombres = _nombres_sympy()
+    for nodo in ast.walk(arbol):
+        if not isinstance(nodo, _NODOS_SREPR) or (isinstance(nodo, ast.Name) and nodo.id not in nombres):
+            raise ValueError(f"árbol cacheado con {type(nodo).__name__} no permitido")
+    try:
+        return eval(compile(arbol, "<expresiones>", "eval"), {'__builtins__': {}}, dict(nombres))
+    except Exception as e:
+        raise ValueError(f"árbol cacheado inválido: {e}") from e
+
+
+def _traducir(latex: str) -> Tuple[Optional[bytes], Optional[str], object]:
+    """(árbol serializado | None, error | None, árbol | LatexNoSoportado)."""
+    try:
+        arbol = latex_a_sympy(latex)
+    except LatexNoSoportado as e:
+        return None, str(e), e
+    return _serializar(arbol), None, arbol
+
+
+def _desde_fila(arbol: Optional[bytes], error: Optional[str]):
+    return _deserializar(arbol) if arbol is not None else LatexNoSoportado(error)
+
+
+def expresion(latex: str):
+    """
+    latex_a_sympy() con caché (memoria y DB). Lanza LatexNoSoportado si la
+    fórmula no se puede traducir (también cuando el fallo viene de la caché).
+    """
+    clave = clave_expresion(latex)
+    valor = _memoria.get(clave)
+    if valor is None:
+        fila = repository.read_expresiones([clave]).get(clave)
+        if fila is not None:
+            try:
+                valor = _desde_fila(*fila)
+            except ValueError:
+                # blob ajeno o dañado: se vuelve a parsear (y no se le cree)
+                instrumentacion.contar("expression.arbol_invalido")
+                fila = None
+        if fila is not None:
+            tamano = len(fila[0] or b"") + len(fila[1] or "")
+        else:
+            datos, error, valor = _traducir(latex)
+            repository.guardar_expresiones([(clave, datos, error)])
+            tamano = len(datos or b"") + len(error or "")
+        _memoria.put(clave, valor, tamano)
+    if isinstance(valor, LatexNoSoportado):
+        raise LatexNoSoportado(str(valor))
+    return valor
+
+
+@instrumentacion.medir("expression.precalentar")
+def precalentar(formulas: Iterable[str]) -> int:
+    """
+    Traduce y guarda las fórmulas que no estén en la DB (una lectura y una
+    transacción por lote). Retorna cuántas se tradujeron.
+    """
+    por_clave = {clave_expresion(f): f for f in formulas if f and f.strip()}
+    if not por_clave:
+        return 0
+    existentes = repository.read_expresiones(por_clave)
+    filas = []
+    for clave, latex in por_clave.items():
+        if clave in existentes:
+            continue
+        datos, error, valor = _traducir(latex)
+        filas.append((clave, datos, error))
+        _memoria.put(clave, valor, len(datos or b"") + len(error or ""))
+    repository.guardar_expresiones(filas)
+    return len(filas)
+
+
+def formulas_ejercicio(ej: Dict) -> List[str]:
+    r"""Fórmulas de un ejercicio tal como las pide la validación (sin lo que sigue a ", \quad")."""
+    return [
+        separar_condicion(texto)[0]
+        for texto in (ej.get('enunciado'), ej.get('respuesta'))
+        if texto and texto.strip()
+    ]
+
+
+def _precalentado_activo() -> bool:
+    return PRECALENTAR_EN_INGESTA and sympy_disponible()
+
+
+def precalentar_ejercicios(ejercicios: Iterable[Dict]) -> int:
+    """precalentar() con las fórmulas de los ejercicios (no hace nada sin SymPy o con EDO_PRECALENTAR=0)."""
+    if not _precalentado_activo():
+        return 0
+    return precalentar(f for ej in ejercicios for f in formulas_ejercicio(ej))
+
+
+@instrumentacion.medir("expression.precalentar_nuevos")
+def precalentar_nuevos(despues_de: int) -> int:
+    """Precalienta las fórmulas de los ejercicios con id > despues_de (recién insertados), por lotes."""
+    if not _precalentado_activo():
+        return 0
+    total = 0
+    lote: List[Dict] = []
+    for ej in repository.iter_ejercicios_db(columnas=('id', 'enunciado', 'respuesta'), despues_de=despues_de):
+        lote.append(ej)
+        if len(lote) >= repository.BATCH_SIZE:
+            total += precalentar_ejercicios(lote)
+            lote = []
+    return total + precalentar_ejercicios(lote)
+
+
+# ----------------- PRECALENTADO EN SEGUNDO PLANO ----------------- #
+# lo pedido y todavía no tomado por el hilo: menor id de los recién insertados y fórmulas editadas
+_pendiente_desde: Optional[int] = None
+_pendientes_formulas: List[str] = []
+_hilo: Optional[threading.Thread] = None
+_hilo_lock = threading.Lock()
+
+
+def precalentar_en_segundo_plano(despues_de: Optional[int] = None, ejercicios: Iterable[Dict] = ()) -> bool:
+    """
+    Como precalentar_nuevos(despues_de) + precalentar_ejercicios(ejercicios),
+    pero en un hilo daemon: retorna enseguida. Los pedidos que llegan mientras el
+    hilo trabaja se juntan en la próxima vuelta. Retorna False si no hay nada que
+    hacer (sin SymPy o con EDO_PRECALENTAR=0).
+    """
+    global _pendiente_desde, _hilo
+    if not _precalentado_activo():
+        return False
+    formulas = [f for ej in ejercicios for f in formulas_ejercicio(ej)]
+    with _hilo_lock:
+        if despues_de is not None:
+            _pendiente_desde = despues_de if _pendiente_desde is None else min(_pendiente_desde, despues_de)
+        _pendientes_formulas.extend(formulas)
+        if _hilo is None:
+            _hilo = threading.Thread(target=_precalentar_pendientes, name="edo-expresiones", daemon=True)
+            _hilo.start()
+    return True
+
+
+def _precalentar_pendientes():
+    global _pendiente_desde, _hilo
+    try:
+        while True:
+            with _hilo_lock:
+                desde, formulas = _pendiente_desde, _pendientes_formulas[:]
+                _pendiente_desde = None
+                _pendientes_formulas.clear()
+                if desde is None and not formulas:
+                    _hilo = None
+                    return
+            try:
+                precalentar(formulas)
+                if desde is not None:
+                    precalentar_nuevos(desde)
+            except sqlite3.Error:
+                # (DB bloqueada, disco lleno...) no es grave: lo que falte se parsea al validar
+                instrumentacion.contar("expression.precalentado_fallido")
+    finally:
+        repository.cerrar_conexiones()
+
+
+def esperar_precalentado(timeout: Optional[float] = None) -> bool:
+    """Espera a que el hilo de precalentado termine; retorna False si se venció el timeout."""
+    with _hilo_lock:
+        hilo = _hilo
+    if hilo is not None:
+        hilo.join(timeout)
+        return not hilo.is_alive()
+    return True
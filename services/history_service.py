@@ -0,0 +1,65 @@
+"""
+Historial de semestres: uso del banco por semestre, reuso y ejercicios nunca usados.
+
+Los reportes no recorren ejercicios_semestre: leen los agregados uso_* que los
+triggers de la DB mantienen al insertar o borrar cada asignación (ver
+db/repository._init_historial). El costo de un reporte depende de la cantidad
+de semestres y subtemas, no de los años de asignaciones acumuladas.
+"""
+from typing import Dict, List, Optional
+
+from db import repository
+
+
+def resumen_semestres() -> List[Dict]:
+    """Semestres del más reciente al más antiguo: asignaciones, ejercicios distintos y temas usados."""
+    return repository.read_resumen_semestres()
+
+
+def uso_por_tema(semestre_id: Optional[int] = None) -> List[Dict]:
+    """
+    Uso por (tema, subtema) en un semestre (o en todo el historial) con la
+    cobertura: fracción de los ejercicios activos del subtema que se usaron.
+    """
+    filas = repository.read_uso_por_tema(semestre_id)
+    for f in filas:
+        f['cobertura'] = min(1.0, f['ejercicios'] / f['banco']) if f['banco'] else 0.0
+    return filas
+
+
+def frecuencia_reuso() -> Dict:
+    """
+    Retorna:
+        {'histograma': {semestres: ejercicios}, 'activos', 'nunca_usados',
+         'usados', 'reusados' (en 2+ semestres), 'tasa_reuso' (reusados / usados)}
+    """
+    histograma = repository.read_frecuencia_reuso()
+    nunca = histograma.get(0, 0)
+    usados = sum(n for veces, n in histograma.items() if veces > 0)
+    reusados = sum(n for veces, n in histograma.items() if veces > 1)
+    return {
+        'histograma': histograma,
+        'activos': nunca + usados,
+        'nunca_usados': nunca,
+        'usados': usados,
+        'reusados': reusados,
+        'tasa_reuso': reusados / usados if usados else 0.0,
+    }
+
+
+def mas_reusados(limite: int = 20) -> List[Dict]:
+    """Ejercicios usados en más semestres (desempate: más asignaciones)."""
+    return repository.read_mas_reusados(limite)
+
+
+def nunca_usados_por_tema() -> List[Dict]:
+    """[{'tema', 'subtema', 'nunca_usados'}] de los subtemas con ejercicios activos que nunca se usaron."""
+    return [
+        {'tema': tema, 'subtema': subtema, 'nunca_usados': n}
+        for tema, subtema, n in repository.read_nunca_usados_por_tema()
+    ]
+
+
+def ids_nunca_usados(prefijos: Optional[Dict[str, str]] = None):
+    """array('q') con los ids de los ejercicios activos que nunca se usaron (para paginarlos)."""
+    return repository.read_ids_ejercicios(prefijos=prefijos, nunca_usados=True)
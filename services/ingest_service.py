@@ -0,0 +1,311 @@
+"""
+Ingesta de varios archivos .tex.
+
+El parseo (CPU) se reparte en un ProcessPoolExecutor; los resultados se consumen
+en el MISMO orden en que se pasaron las rutas y se insertan desde un único
+escritor (el proceso principal) vía exercise_service.agregar_ejercicios.
+Un archivo que falla se reporta en `errores` sin abortar el lote.
+
+sincronizar_archivos() es la variante incremental: usa el manifiesto
+archivos_ingestados (tamaño, mtime, hash, versión del parser) para saltar los
+archivos sin cambios y, en los editados, aplica un diff por ejercicio usando
+(archivo_origen, numero) como clave. archivo_origen es el basename: si otro
+archivo del manifiesto, todavía presente, tiene el mismo nombre en otra carpeta,
+no se hace diff (retiraría sus ejercicios) y sólo se agregan los nuevos. El
+diff de cada archivo y su entrada del manifiesto se aplican en una sola
+transacción (repository.UnitOfWork).
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import instrumentacion
+from db import repository
+from latex_parser import PARSER_VERSION, parsear_latex
+from services import expression_service
+from services.exercise_service import agregar_ejercicios
+
+# (ruta, ejercicios | None, mensaje de error | None)
+ResultadoArchivo = Tuple[str, Optional[List[Dict]], Optional[str]]
+
+
+def _describir_error(e: BaseException) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+def iter_resultados(rutas: Sequence[str], workers: Optional[int] = None) -> Iterator[ResultadoArchivo]:
+    """
+    Parsea cada ruta y genera (ruta, ejercicios, error) en el orden de `rutas`.
+    workers: cantidad de procesos (None = uno por CPU); con 1 se parsea en el
+    proceso actual, sin pool.
+    """
+    if workers == 1 or len(rutas) <= 1:
+        for ruta in rutas:
+            try:
+                yield ruta, parsear_latex(ruta), None
+            except Exception as e:
+                yield ruta, None, _describir_error(e)
+        return
+
+    medir = instrumentacion.activo()
+    max_workers = min(workers or os.cpu_count() or 1, len(rutas))
+    with ProcessPoolExecutor(max_workers=max_workers) as ex:
+        futuros = [ex.submit(_parsear_con_tiempo if medir else parsear_latex, ruta) for ruta in rutas]
+        for ruta, futuro in zip(rutas, futuros):
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                yield ruta, None, _describir_error(e)
+                continue
+            if medir:
+                # el tiempo de parseo lo mide el hijo; se registra acá, en el proceso principal
+                resultado, segundos = resultado
+                instrumentacion.registrar_archivo(ruta, len(resultado), segundos)
+            yield ruta, resultado, None
+
+
+def _parsear_con_tiempo(ruta: str) -> Tuple[List[Dict], float]:
+    t0 = time.perf_counter()
+    ejercicios = parsear_latex(ruta)
+    return ejercicios, time.perf_counter() - t0
+
+
+def parsear_archivos(rutas: Sequence[str], workers: Optional[int] = None) -> Tuple[List[Dict], List[Tuple[str, str]]]:
+    """
+    Parsea todos los archivos (en paralelo salvo workers=1).
+    Retorna:
+        (ejercicios en orden determinista, [(ruta, error), ...])
+    """
+    ejercicios: List[Dict] = []
+    errores: List[Tuple[str, str]] = []
+    for ruta, resultado, error in iter_resultados(rutas, workers):
+        if error is not None:
+            errores.append((ruta, error))
+        else:
+            ejercicios.extend(resultado)
+    return ejercicios, errores
+
+
+@instrumentacion.medir("ingest.ingestar_archivos")
+def ingestar_archivos(rutas: Sequence[str], workers: Optional[int] = None
+                      ) -> Tuple[int, int, List[Dict], List[Tuple[str, str]]]:
+    """
+    Parsea en paralelo e inserta en la DB desde un único escritor, archivo por
+    archivo a medida que llegan los resultados (en el orden de `rutas`).
+    Retorna:
+        (agregados, duplicados, marcas de casi-duplicados, [(ruta, error), ...])
+    """
+    errores: List[Tuple[str, str]] = []
+
+    def _ejercicios() -> Iterator[Dict]:
+        for ruta, resultado, error in iter_resultados(rutas, workers):
+            if error is not None:
+                errores.append((ruta, error))
+                continue
+            yield from resultado
+
+    agregados, duplicados, marcas = agregar_ejercicios(_ejercicios())
+    return agregados, duplicados, marcas, errores
+
+
+# ----------------- SINCRONIZACIÓN INCREMENTAL ----------------- #
+_CAMPOS_DIFF = ('tema', 'subtema', 'enunciado', 'condiciones', 'respuesta')
+
+
+def hash_archivo(ruta: str, chunk_size: int = 1 << 20) -> str:
+    """sha256 del contenido del archivo, leído por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(chunk_size), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+@instrumentacion.medir("ingest.firma_si_cambio")
+def _firma_si_cambio(ruta: str) -> Optional[Dict]:
+    """
+    Devuelve la firma actual del archivo si hay que (re)ingerirlo, o None si no
+    cambió desde la última ingesta. Si sólo cambió el mtime (mismo contenido) se
+    actualiza el manifiesto y se considera sin cambios.
+    """
+    st = os.stat(ruta)
+    previo = repository.read_manifiesto(ruta)
+    if (previo and previo['version_parser'] == PARSER_VERSION
+            and previo['tamano'] == st.st_size and previo['mtime_ns'] == st.st_mtime_ns):
+        return None
+
+    firma = {'tamano': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash_contenido': hash_archivo(ruta)}
+    if (previo and previo['version_parser'] == PARSER_VERSION
+            and previo['hash_contenido'] == firma['hash_contenido']):
+        repository.upsert_manifiesto(ruta, version_parser=PARSER_VERSION, **firma)
+        return None
+    return firma
+
+
+def _normalizar_numero(numero) -> str:
+    # la columna numero es INTEGER: "7" se guarda como 7
+    return str(numero).strip()
+
+
+def _homonimo_en_uso(ruta: str) -> Optional[str]:
+    """
+    Otra ruta del manifiesto con el mismo basename que `ruta` cuyas filas pueden
+    mezclarse con las de `ruta`, o None. Un único homónimo que ya no existe se
+    toma como el mismo archivo movido de carpeta; con dos o más, las filas de ese
+    archivo_origen ya vienen de archivos distintos.
+    """
+    nombre = os.path.basename(ruta)
+    homonimos = []
+    for otra in repository.read_rutas_manifiesto():
+        if otra == ruta or os.path.basename(otra) != nombre:
+            continue
+        try:
+            if os.path.samefile(otra, ruta):
+                continue  # el mismo archivo con otra ruta (relativa/absoluta)
+        except OSError:
+            if not os.path.exists(otra):
+                homonimos.append((otra, False))
+                continue
+        homonimos.append((otra, True))
+    if len(homonimos) >= 2 or (homonimos and homonimos[0][1]):
+        return homonimos[0][0]
+    return None
+
+
+@instrumentacion.medir("ingest.aplicar_diff")
+def _aplicar_diff(ruta: str, ejercicios: List[Dict], firma: Dict, resumen: Dict):
+    """
+    Compara los ejercicios parseados con los guardados para ese archivo y aplica
+    el diff junto con la firma del archivo en el manifiesto, en UNA transacción:
+    si algo falla, el archivo queda como estaba y la próxima corrida lo reintenta.
+    """
+    archivo_origen = os.path.basename(ruta)
+    parcial = {'agregados': 0, 'duplicados': 0, 'actualizados': 0, 'retirados': 0,
+               'conflictos': [], 'similares': []}
+    ultimo_id = repository.read_ultimo_id()
+    cambiados: List[Tuple[Dict, Dict]] = []
+    otra = _homonimo_en_uso(ruta)
+    with repository.UnitOfWork() as uow:
+        if otra is not None:
+            # las filas de archivo_origen son (también) de `otra`: sólo se agregan los nuevos
+            nuevos = ejercicios
+            parcial['conflictos'].append((ruta, otra))
+        else:
+            nuevos = _diff_por_numero(uow, archivo_origen, ejercicios, cambiados, parcial)
+        agregados, duplicados, marcas = agregar_ejercicios(nuevos, conn=uow.conn)
+        parcial['agregados'] += agregados
+        parcial['duplicados'] += duplicados
+        parcial['similares'].extend(marcas)
+        if otra is None:
+            # plantillas paramétricas del archivo (las editadas descartan sus instancias, las quitadas se borran)
+            uow.guardar_plantillas(
+                [(archivo_origen, ej['numero'], ej['plantilla'])
+                 for ej in ejercicios if ej.get('numero') and ej.get('plantilla')],
+                archivo_origen=archivo_origen
+            )
+        uow.upsert_manifiesto(ruta, version_parser=PARSER_VERSION, **firma)
+
+    for clave, valor in parcial.items():
+        resumen[clave] += valor
+    # fórmulas nuevas y editadas: se parsean en segundo plano para que la validación las encuentre en caché
+    expression_service.precalentar_en_segundo_plano(ultimo_id, ejercicios=[cambios for _, cambios in cambiados])
+
+
+def _diff_por_numero(uow: repository.UnitOfWork, archivo_origen: str, ejercicios: List[Dict],
+                     cambiados: List[Tuple[Dict, Dict]], parcial: Dict) -> List[Dict]:
+    """
+    Retira y actualiza (en la transacción de `uow`) los ejercicios guardados de
+    archivo_origen según su número; anota los actualizados en `cambiados` y
+    retorna los que hay que agregar.
+    """
+    guardados: Dict[str, Dict] = {}
+    sobrantes: List[int] = []
+    for row in repository.read_ejercicios_por_archivo(archivo_origen):
+        clave = _normalizar_numero(row['numero'])
+        if clave in guardados:
+            sobrantes.append(row['id'])  # filas repetidas con la misma clave: quedan retiradas
+        else:
+            guardados[clave] = row
+
+    nuevos: List[Dict] = []
+    vistos = set()
+    for ej in ejercicios:
+        if not ej.get('numero'):
+            continue
+        clave = _normalizar_numero(ej['numero'])
+        if clave in vistos:
+            continue
+        vistos.add(clave)
+
+        row = guardados.get(clave)
+        if row is None:
+            nuevos.append(ej)
+            continue
+        cambios = {k: ej.get(k) for k in _CAMPOS_DIFF if (row[k] or "") != (ej.get(k) or "")}
+        if row['retirado']:
+            cambios['retirado'] = 0
+        if cambios:
+            cambiados.append((row, cambios))
+
+    # primero se retira lo que ya no está, para liberar huellas que un ejercicio editado pueda reutilizar
+    retirar = sobrantes + [row['id'] for clave, row in guardados.items()
+                           if clave not in vistos and not row['retirado']]
+    uow.retirar_ejercicios(retirar)
+    parcial['retirados'] += len(retirar)
+
+    for row, cambios in cambiados:
+        try:
+            uow.update_ejercicio_por_id(row['id'], cambios)
+            parcial['actualizados'] += 1
+        except sqlite3.IntegrityError:
+            # el enunciado editado ya existe en otro ejercicio activo (el UPDATE fallido no cuenta)
+            if not row['retirado']:
+                uow.retirar_ejercicios([row['id']])
+                parcial['retirados'] += 1
+            parcial['duplicados'] += 1
+    return nuevos
+
+
+@instrumentacion.medir("ingest.sincronizar_archivos")
+def sincronizar_archivos(rutas: Sequence[str], workers: Optional[int] = None) -> Dict:
+    """
+    Re-ingesta incremental: sólo parsea los archivos cuyo contenido cambió (o que
+    nunca se ingirieron, o con otra versión del parser) y aplica el diff por
+    ejercicio: inserta los nuevos, actualiza los modificados y retira los que ya
+    no están en el archivo.
+    Retorna un resumen:
+        {'omitidos', 'agregados', 'duplicados', 'actualizados', 'retirados', 'errores',
+         'conflictos', 'similares'}
+    similares: marcas de posibles casi-duplicados entre los agregados (ver
+    dedup_service.marcar_similares).
+    conflictos: [(ruta, otra_ruta), ...] archivos que comparten nombre con otro ya
+    ingerido; se agregaron sus ejercicios nuevos pero no se aplicó el diff.
+    """
+    resumen = {'omitidos': 0, 'agregados': 0, 'duplicados': 0,
+               'actualizados': 0, 'retirados': 0, 'errores': [], 'conflictos': [], 'similares': []}
+
+    firmas: Dict[str, Dict] = {}
+    for ruta in rutas:
+        try:
+            firma = _firma_si_cambio(ruta)
+        except OSError as e:
+            resumen['errores'].append((ruta, _describir_error(e)))
+            continue
+        if firma is None:
+            resumen['omitidos'] += 1
+            instrumentacion.contar("ingest.archivos_sin_cambios")
+        else:
+            firmas[ruta] = firma
+
+    for ruta, ejercicios, error in iter_resultados(list(firmas), workers):
+        if error is not None:
+            resumen['errores'].append((ruta, error))
+            continue
+        instrumentacion.contar("ingest.archivos_parseados")
+        instrumentacion.contar("ingest.ejercicios_parseados", len(ejercicios))
+        _aplicar_diff(ruta, ejercicios, firmas[ruta], resumen)
+
+    return resumen
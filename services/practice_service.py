@@ -0,0 +1,308 @@
+"""
+Generador de prácticas aleatorias.
+
+Una práctica es una muestra de N ejercicios estratificada por (tema, subtema):
+  1. Se leen una sola vez los ids activos agrupados por estrato (arrays de ids,
+     sin los enunciados), descartando los ya usados en una práctica del semestre
+     en curso.
+  2. Cada estrato tiene un peso (por defecto todos iguales, para repartir la
+     práctica entre los subtemas). Cada uno recibe floor(N * peso) ejercicios
+     (sin pasarse de los que tiene) y los cupos que sobran se sortean con una
+     tabla alias (Vose): cada sorteo es O(1).
+  3. Dentro de cada estrato se eligen los ejercicios con random.sample sobre el
+     array de ids (O(k), sin recorrer el estrato).
+Nada de ORDER BY RANDOM(): el generador se arma una vez y produce cientos de
+prácticas (una por estudiante) en memoria. Con la misma semilla el resultado es
+el mismo.
+
+Lotes (una práctica distinta por estudiante, generar_lote): los cupos por estrato
+salen igual que arriba, pero los ejercicios de la variante i se toman de una
+permutación del estrato compartida por todo el lote, a continuación de los que
+recibió el estudiante i - 1 (al agotarse el estrato se sigue con otra
+permutación). Así los vecinos no comparten ejercicios mientras el estrato
+alcance. El plan (cupos y posiciones) se calcula primero; después cada variante
+es independiente y el lote se reparte entre procesos que reciben una sola vez
+la instantánea (sólo lectura) de ids por estrato. Las asignaciones
+se escriben juntas en ejercicios_semestre en una transacción.
+"""
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from math import ceil
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+from db import repository
+from services import catalog_service, template_service
+
+Estrato = Tuple[str, str]
+Semilla = Union[int, str, None]
+
+
+# ----------------- TABLA ALIAS ----------------- #
+def tabla_alias(pesos: Sequence[float]) -> Tuple[List[float], List[int]]:
+    """Tabla alias de Vose para sortear índices con probabilidad proporcional a `pesos`."""
+    n = len(pesos)
+    total = sum(pesos)
+    escalados = [p * n / total for p in pesos]
+    prob = [1.0] * n
+    alias = list(range(n))
+    chicos = [i for i, p in enumerate(escalados) if p < 1.0]
+    grandes = [i for i, p in enumerate(escalados) if p >= 1.0]
+    while chicos and grandes:
+        c, g = chicos.pop(), grandes.pop()
+        prob[c], alias[c] = escalados[c], g
+        escalados[g] -= 1.0 - escalados[c]
+        (chicos if escalados[g] < 1.0 else grandes).append(g)
+    # lo que queda tiene probabilidad 1 (salvo error de redondeo)
+    return prob, alias
+
+
+def sortear_alias(rng: random.Random, prob: Sequence[float], alias: Sequence[int]) -> int:
+    """Un índice sorteado con la tabla alias (O(1))."""
+    i = int(rng.random() * len(prob))
+    return i if rng.random() < prob[i] else alias[i]
+
+
+# ----------------- GENERADOR ----------------- #
+class GeneradorPracticas:
+    """
+    Muestreador estratificado sobre un conjunto fijo de ids por estrato.
+    pesos: peso relativo por tema o por (tema, subtema) (1.0 si no figura);
+    un peso 0 excluye el estrato.
+    """
+
+    def __init__(self, estratos: Mapping[Estrato, Sequence[int]],
+                 pesos: Optional[Mapping[Union[str, Estrato], float]] = None):
+        pesos = pesos or {}
+        self.estratos: List[Estrato] = []
+        self.ids: List[Sequence[int]] = []
+        self.pesos: List[float] = []
+        for estrato in sorted(estratos):
+            peso = pesos.get(estrato, pesos.get(estrato[0], 1.0))
+            if peso > 0 and estratos[estrato]:
+                self.estratos.append(estrato)
+                self.ids.append(estratos[estrato])
+                self.pesos.append(float(peso))
+        self.disponibles = sum(len(ids) for ids in self.ids)
+        self._alias = tabla_alias(self.pesos) if self.pesos else ([], [])
+        self._permutaciones: Dict[Tuple[int, int, Semilla], List[int]] = {}
+
+    @classmethod
+    def desde_db(cls, semestre_id: Optional[int] = None, excluir_usados: bool = True,
+                 pesos: Optional[Mapping[Union[str, Estrato], float]] = None) -> "GeneradorPracticas":
+        """
+        Generador sobre los ejercicios activos de la DB. Si excluir_usados, omite los
+        usados en prácticas de `semestre_id` (por defecto el semestre en curso).
+        """
+        if excluir_usados and semestre_id is None:
+            actual = repository.read_semestre_actual()
+            semestre_id = actual['id'] if actual else None
+        return cls(repository.read_ids_por_estrato(semestre_id if excluir_usados else None), pesos)
+
+    def _cupos(self, n: int, rng: random.Random) -> List[int]:
+        """Cuántos ejercicios sale de cada estrato (suma n)."""
+        total = sum(self.pesos)
+        capacidades = [len(ids) for ids in self.ids]
+        cupos = [min(c, int(n * p / total)) for c, p in zip(capacidades, self.pesos)]
+        restantes = n - sum(cupos)
+
+        prob, alias = self._alias
+        pesos = self.pesos
+        while restantes:
+            i = sortear_alias(rng, prob, alias)
+            if cupos[i] < capacidades[i]:
+                cupos[i] += 1
+                restantes -= 1
+                continue
+            # estrato lleno: se rehace la tabla sólo con los que tienen lugar
+            # (como mucho una vez por estrato)
+            pesos = [p if cupos[j] < capacidades[j] else 0.0 for j, p in enumerate(pesos)]
+            prob, alias = tabla_alias(pesos)
+        return cupos
+
+    def practica(self, n: int, semilla: Semilla = None) -> List[int]:
+        """
+        Ids de una práctica de n ejercicios (menos si no hay tantos disponibles),
+        agrupados por estrato en orden de tema/subtema.
+        """
+        n = min(n, self.disponibles)
+        if n <= 0:
+            return []
+        rng = random.Random(semilla)
+        seleccion: List[int] = []
+        for ids, k in zip(self.ids, self._cupos(n, rng)):
+            if k:
+                seleccion.extend(sorted(rng.sample(ids, k)))
+        return seleccion
+
+    def planificar(self, estudiantes: int, n: int, semilla: Semilla = None) -> List[Tuple[List[int], List[int]]]:
+        """
+        Plan de un lote: para cada estudiante, (cupos por estrato, posición donde
+        empieza su bloque en cada estrato). Los bloques de cada estrato se suceden
+        de estudiante en estudiante. Es barato (sólo sorteos de cupos) y se hace
+        en el proceso principal; la selección se reparte con variante().
+        """
+        n = min(n, self.disponibles)
+        inicios = [0] * len(self.ids)
+        plan = []
+        for i in range(estudiantes):
+            cupos = self._cupos(n, random.Random(f"{semilla}:{i}")) if n > 0 else [0] * len(self.ids)
+            plan.append((cupos, list(inicios)))
+            for s, k in enumerate(cupos):
+                inicios[s] += k
+        return plan
+
+    def variante(self, cupos: Sequence[int], inicios: Sequence[int], semilla: Semilla = None) -> List[int]:
+        """
+        Ejercicios de un estudiante según su plan: en cada estrato, los cupos[s]
+        siguientes a inicios[s] en la permutación del lote (ver docstring del módulo).
+        """
+        seleccion: List[int] = []
+        for s, (ids, k) in enumerate(zip(self.ids, cupos)):
+            if not k:
+                continue
+            largo = len(ids)
+            elegidos, vistos = [], set()
+            j = inicios[s]
+            # como k <= largo, a lo sumo dos vueltas completan el bloque sin repetir
+            while len(elegidos) < k:
+                vuelta, pos = divmod(j, largo)
+                ejercicio_id = self._permutacion(s, vuelta, semilla)[pos]
+                if ejercicio_id not in vistos:
+                    vistos.add(ejercicio_id)
+                    elegidos.append(ejercicio_id)
+                j += 1
+            seleccion.extend(sorted(elegidos))
+        return seleccion
+
+    def _permutacion(self, s: int, vuelta: int, semilla: Semilla) -> List[int]:
+        """Orden del estrato s en la vuelta dada (cada vuelta se baraja distinto)."""
+        clave = (s, vuelta, semilla)
+        perm = self._permutaciones.get(clave)
+        if perm is None:
+            ids = self.ids[s]
+            perm = self._permutaciones[clave] = random.Random(f"{semilla}:{s}:{vuelta}").sample(ids, len(ids))
+        return perm
+
+    def practicas(self, n: int, cantidad: int, semilla: Semilla = None) -> List[List[int]]:
+        """
+        `cantidad` prácticas independientes (p. ej. una por estudiante). Con semilla,
+        la práctica i usa la semilla derivada "semilla:i", reproducible por separado.
+        """
+        if semilla is None:
+            return [self.practica(n) for _ in range(cantidad)]
+        return [self.practica(n, f"{semilla}:{i}") for i in range(cantidad)]
+
+
+def generar_practica(n: int, semilla: Semilla = None,
+                     pesos: Optional[Mapping[Union[str, Estrato], float]] = None,
+                     con_instancias: bool = False, semestre_id: Optional[int] = None,
+                     registrar: bool = False) -> List[Dict]:
+    """
+    Práctica de n ejercicios (dicts completos) para el semestre en curso.
+    con_instancias: los ejercicios paramétricos salen con una instancia del pool
+    ya verificado (services/template_service.py) en vez del ejercicio base.
+    semestre_id / registrar: como en generar_lote (un lote de un estudiante): sin
+    los ejercicios ya usados en el semestre y, si registrar, asignada en él.
+    """
+    if semestre_id is not None or registrar:
+        ids = generar_lote(1, n, semilla, semestre_id, workers=1, registrar=registrar, pesos=pesos)[0][0]
+    else:
+        ids = GeneradorPracticas.desde_db(pesos=pesos).practica(n, semilla)
+    ejercicios = catalog_service.ejercicios_por_ids(ids)
+    practica = [ejercicios[i] for i in ids if i in ejercicios]
+    if con_instancias:
+        instancias = template_service.sortear_instancias([[ej['id'] for ej in practica]], semilla)[0]
+        practica = template_service.aplicar_instancias(practica, instancias)
+    return practica
+
+
+# ----------------- LOTES ----------------- #
+# instantánea del generador en cada proceso del pool (se recibe una vez por proceso)
+_generador_worker: Optional[GeneradorPracticas] = None
+
+
+def _iniciar_worker(estratos: Dict[Estrato, Sequence[int]], pesos: Optional[Mapping]):
+    global _generador_worker
+    _generador_worker = GeneradorPracticas(estratos, pesos)
+
+
+def _generar_tramo(plan: Sequence[Tuple[List[int], List[int]]], semilla: Semilla) -> List[List[int]]:
+    return [_generador_worker.variante(cupos, inicios, semilla) for cupos, inicios in plan]
+
+
+def generar_variantes(generador: GeneradorPracticas, estudiantes: int, n: int,
+                      semilla: Semilla = None, workers: Optional[int] = None) -> List[List[int]]:
+    """
+    Una práctica por estudiante (lista de ids, en orden de estudiante).
+    workers: procesos (None = uno por CPU); con 1 se genera en el proceso actual.
+    Sin semilla se sortea una, para que todo el lote comparta las permutaciones.
+    """
+    if semilla is None:
+        semilla = random.randrange(1 << 32)
+    plan = generador.planificar(estudiantes, n, semilla)
+    workers = min(workers or os.cpu_count() or 1, estudiantes)
+    if workers <= 1:
+        return _generar_con(generador, plan, semilla)
+
+    estratos = dict(zip(generador.estratos, generador.ids))
+    pesos = dict(zip(generador.estratos, generador.pesos))
+    tamano = ceil(estudiantes / (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker,
+                             initargs=(estratos, pesos)) as ex:
+        futuros = [ex.submit(_generar_tramo, plan[i:i + tamano], semilla) for i in range(0, estudiantes, tamano)]
+        return [variante for f in futuros for variante in f.result()]
+
+
+def _generar_con(generador: GeneradorPracticas, plan, semilla: Semilla) -> List[List[int]]:
+    return [generador.variante(cupos, inicios, semilla) for cupos, inicios in plan]
+
+
+def estadisticas_solapamiento(variantes: Sequence[Sequence[int]]) -> Dict:
+    """
+    Solapamiento entre las prácticas de un lote:
+      vecinos_promedio / vecinos_max: ejercicios en común entre estudiantes consecutivos;
+      pares_promedio / pares_max: ídem entre todos los pares de estudiantes;
+      variantes_distintas, ejercicios_usados y usos_max (veces que se repite el más usado).
+    """
+    conjuntos = [frozenset(v) for v in variantes]
+    vecinos = [len(a & b) for a, b in zip(conjuntos, conjuntos[1:])]
+    pares = [len(a & b) for a, b in combinations(conjuntos, 2)]
+    usos: Dict[int, int] = {}
+    for c in conjuntos:
+        for ejercicio_id in c:
+            usos[ejercicio_id] = usos.get(ejercicio_id, 0) + 1
+    return {
+        'estudiantes': len(conjuntos),
+        'variantes_distintas': len(set(conjuntos)),
+        'vecinos_promedio': sum(vecinos) / len(vecinos) if vecinos else 0.0,
+        'vecinos_max': max(vecinos, default=0),
+        'pares_promedio': sum(pares) / len(pares) if pares else 0.0,
+        'pares_max': max(pares, default=0),
+        'ejercicios_usados': len(usos),
+        'usos_max': max(usos.values(), default=0),
+    }
+
+
+def generar_lote(estudiantes: int, n: int, semilla: Semilla = None, semestre_id: Optional[int] = None,
+                 workers: Optional[int] = None, registrar: bool = True,
+                 pesos: Optional[Mapping[Union[str, Estrato], float]] = None) -> Tuple[List[List[int]], Dict]:
+    """
+    Genera una práctica por estudiante para el semestre (por defecto el en curso),
+    sin los ejercicios ya usados en él. Si registrar, guarda las asignaciones en
+    ejercicios_semestre (una transacción).
+    Retorna:
+        (variantes, estadisticas_solapamiento(variantes))
+    """
+    if semestre_id is None:
+        actual = repository.read_semestre_actual()
+        semestre_id = actual['id'] if actual else None
+    if registrar and semestre_id is None:
+        raise ValueError("No hay semestre registrado para asignar la práctica")
+
+    generador = GeneradorPracticas.desde_db(semestre_id, excluir_usados=semestre_id is not None, pesos=pesos)
+    variantes = generar_variantes(generador, estudiantes, n, semilla, workers)
+    if registrar:
+        repository.registrar_asignaciones(semestre_id, variantes)
+    return variantes, estadisticas_solapamiento(variantes)
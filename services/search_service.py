@@ -0,0 +1,73 @@
+"""
+Búsqueda de texto completo sobre el banco de ejercicios (SQLite FTS5).
+
+El índice (ejercicios_fts, ver db/repository.init_db) tokeniza con unicode61: en
+LaTeX eso separa los nombres de comando de la barra (\\sin -> sin) y corta en
+llaves, ^ y _ (e^{x} -> e, x). Acá el texto que escribe el usuario se tokeniza
+igual y se arma la expresión MATCH:
+  - cada palabra es un término; las de 3+ letras buscan por prefijo
+    (exacta* encuentra "exactas");
+  - un fragmento LaTeX que produce varios tokens (e^{x}, \\frac{dy}{dx}) se
+    busca como frase (tokens consecutivos);
+  - se descartan conectores frecuentes ("con", "de", ...), que no aportan.
+Todos los términos deben aparecer (AND); el orden es por relevancia (bm25).
+"""
+import re
+from typing import Dict, List, Optional, Set
+
+import instrumentacion
+from db import repository
+
+LIMITE = 50
+
+# marcas de resaltado: caracteres de control que no aparecen en los textos, para
+# que la capa de presentación las reemplace por su propio estilo
+MARCA_INICIO = "\x02"
+MARCA_FIN = "\x03"
+
+_TOKEN_RE = re.compile(r"\w+")
+_CONECTORES = {
+    'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'para', 'por', 'que', 'se', 'sin', 'su', 'un', 'una',
+}
+
+
+def construir_consulta(texto: str) -> Optional[str]:
+    """Expresión MATCH de FTS5 para el texto libre del usuario (None si no queda ningún término)."""
+    terminos = []
+    for fragmento in texto.split():
+        tokens = _TOKEN_RE.findall(fragmento.replace('_', ' '))
+        if not tokens:
+            continue
+        if len(tokens) > 1:
+            terminos.append('"' + " ".join(tokens) + '"')
+            continue
+        token = tokens[0]
+        # "\sin" es la función seno, no el conector
+        if token.lower() in _CONECTORES and not fragmento.startswith('\\'):
+            continue
+        if len(token) >= 3 and token.isalpha():
+            terminos.append(f'"{token}"*')
+        else:
+            terminos.append(f'"{token}"')
+    return " AND ".join(terminos) if terminos else None
+
+
+@instrumentacion.medir("search.buscar")
+def buscar(texto: str, limite: int = LIMITE) -> List[Dict]:
+    """
+    Ejercicios activos que coinciden con `texto`, del más al menos relevante.
+    Los campos de texto vienen resaltados entre MARCA_INICIO y MARCA_FIN.
+    """
+    consulta = construir_consulta(texto)
+    if consulta is None:
+        return []
+    return repository.search_ejercicios_fts(consulta, limite, MARCA_INICIO, MARCA_FIN)
+
+
+def ids_coincidentes(texto: str) -> Optional[Set[int]]:
+    """Ids de todos los ejercicios activos que coinciden con `texto` (None si no hay términos)."""
+    consulta = construir_consulta(texto)
+    if consulta is None:
+        return None
+    return repository.read_ids_fts(consulta)
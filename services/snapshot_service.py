@@ -0,0 +1,327 @@
+"""
+Snapshots binarios del banco: ejercicios, semestres y asignaciones en un solo
+archivo compacto para respaldar, restaurar o pasar el banco a otra máquina sin
+copiar la DB ni volver a ingerir los .tex.
+
+Formato (versión FORMATO_VERSION, enteros little-endian):
+
+    MAGIA (8 bytes) | versión (uint16) | reservado (uint16) | largo del índice (uint32)
+    | blake2b-16 del índice | índice (JSON, utf-8) | bloques de columnas
+
+  - Columnar: cada columna de cada tabla es un bloque comprimido con zlib, con
+    su offset, largos y blake2b-16 en el índice. Leer una columna no toca las demás.
+  - Codificaciones:
+      entero       array int64 (nullable: primero un byte por fila, 1 = NULL);
+      texto        byte de NULL por fila, largo en caracteres (uint32) por fila
+                   y todo el texto concatenado en utf-8 (se decodifica una vez
+                   y se corta por offsets);
+      diccionario  los valores distintos van en el índice y la columna es un
+                   código por fila (uint8/16/32 según cuántos haya): tema,
+                   subtema, archivo_origen, numero y fechas se repiten mucho;
+      huella       16 bytes crudos por fila (el hash hex de ejercicios.huella).
+  - Snapshot.abrir() mapea el archivo en memoria (mmap, sólo lectura): el
+    encabezado y el índice se validan al abrir y cada bloque se verifica
+    contra su hash antes de descomprimirlo.
+  - restaurar() reemplaza el banco en una sola transacción
+    (repository.reemplazar_con_snapshot: inserción por lotes, con el índice FTS
+    y el historial reconstruidos una vez al final); con fusionar=True agrega
+    sólo lo que falta, deduplicando ejercicios por huella de enunciado
+    (repository.fusionar_snapshot).
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence
+
+from db import repository
+
+MAGIA = b"EDOSNAP\0"
+FORMATO_VERSION = 1
+NIVEL_COMPRESION = 6
+_ENCABEZADO = struct.Struct("<8sHHI16s")
+
+ENTERO = "entero"
+TEXTO = "texto"
+DICCIONARIO = "diccionario"
+HUELLA = "huella"
+
+# codificación de cada columna de repository.COLUMNAS_SNAPSHOT
+CODIFICACION = {
+    'semestres': {'id': ENTERO, 'nombre': TEXTO, 'fecha_inicio': DICCIONARIO, 'fecha_fin': DICCIONARIO},
+    'ejercicios': {'id': ENTERO, 'numero': DICCIONARIO, 'tema': DICCIONARIO, 'subtema': DICCIONARIO,
+                   'enunciado': TEXTO, 'condiciones': TEXTO, 'respuesta': TEXTO,
+                   'archivo_origen': DICCIONARIO, 'fecha_registro': DICCIONARIO, 'retirado': ENTERO,
+                   'huella': HUELLA},
+    'ejercicios_semestre': {'id': ENTERO, 'semestre_id': ENTERO, 'ejercicio_id': ENTERO,
+                            'fecha_asignacion': DICCIONARIO, 'usado_en_practica': ENTERO, 'variante': ENTERO},
+}
+_SIN_HUELLA = bytes(16)
+
+
+class SnapshotInvalido(ValueError):
+    """El archivo no es un snapshot, es de una versión no soportada o está dañado."""
+
+
+def _huella_bloque(datos) -> str:
+    return hashlib.blake2b(datos, digest_size=16).hexdigest()
+
+
+def _le(arr: array) -> bytes:
+    """Bytes little-endian de un array (el formato no depende de la máquina)."""
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _desde_le(typecode: str, datos) -> array:
+    arr = array(typecode)
+    arr.frombytes(datos)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def _tipo_entero_sin_signo(maximo: int) -> str:
+    for typecode in ('B', 'H', 'I'):
+        if maximo < 1 << (8 * array(typecode).itemsize):
+            return typecode
+    return 'Q'
+
+
+# ----------------- CODIFICACIÓN ----------------- #
+def _nulos(valores: Sequence) -> Optional[bytes]:
+    return bytes(v is None for v in valores) if any(v is None for v in valores) else None
+
+
+def _codificar(codificacion: str, valores: Sequence) -> tuple:
+    """(datos sin comprimir, metadatos de la columna para el índice)."""
+    meta: Dict = {'codificacion': codificacion}
+    if codificacion == ENTERO:
+        nulos = _nulos(valores)
+        meta['nulos'] = nulos is not None
+        datos = _le(array('q', (0 if v is None else int(v) for v in valores)))
+        return (nulos or b"") + datos, meta
+    if codificacion == TEXTO:
+        textos = ["" if v is None else str(v) for v in valores]
+        nulos = _nulos(valores)
+        meta['nulos'] = nulos is not None
+        largos = array('I', map(len, textos))
+        return (nulos or b"") + _le(largos) + "".join(textos).encode("utf-8"), meta
+    if codificacion == DICCIONARIO:
+        codigos: Dict = {}
+        columna = array('I', (codigos.setdefault(v, len(codigos)) for v in valores))
+        meta['valores'] = list(codigos)
+        meta['tipo'] = _tipo_entero_sin_signo(len(codigos))
+        return _le(array(meta['tipo'], columna)), meta
+    if codificacion == HUELLA:
+        return b"".join(bytes.fromhex(v) if v else _SIN_HUELLA for v in valores), meta
+    raise ValueError(f"Codificación desconocida: {codificacion}")
+
+
+def _decodificar(meta: Dict, datos: bytes, filas: int) -> List:
+    codificacion = meta['codificacion']
+    nulos = None
+    if meta.get('nulos'):
+        nulos, datos = datos[:filas], datos[filas:]
+    if codificacion == ENTERO:
+        valores = _desde_le('q', datos).tolist()
+    elif codificacion == TEXTO:
+        ancho = array('I').itemsize
+        largos = _desde_le('I', datos[:filas * ancho])
+        texto = datos[filas * ancho:].decode("utf-8")
+        fines = list(accumulate(largos))
+        valores = [texto[fin - largo:fin] for fin, largo in zip(fines, largos)]
+    elif codificacion == DICCIONARIO:
+        diccionario = meta['valores']
+        valores = [diccionario[c] for c in _desde_le(meta['tipo'], datos)]
+    elif codificacion == HUELLA:
+        valores = [datos[i:i + 16].hex() for i in range(0, filas * 16, 16)]
+        valores = [None if v == "0" * 32 else v for v in valores]
+    else:
+        raise SnapshotInvalido(f"Codificación desconocida: {codificacion}")
+    if nulos is not None:
+        valores = [None if n else v for v, n in zip(valores, nulos)]
+    if len(valores) != filas:
+        raise SnapshotInvalido(f"columna con {len(valores)} filas (se esperaban {filas})")
+    return valores
+
+
+# ----------------- EXPORTAR ----------------- #
+def exportar(ruta: str, nivel: int = NIVEL_COMPRESION, workers: Optional[int] = None) -> Dict:
+    """
+    Escribe el snapshot del banco en `ruta` (a un temporal que reemplaza al
+    destino al terminar). Las columnas se comprimen en paralelo (zlib libera el GIL).
+    Retorna {'filas': {tabla: n}, 'bytes', 'bytes_sin_comprimir'}.
+    """
+    tablas = repository.read_tablas_snapshot()
+    columnas = []
+    for tabla, codificaciones in CODIFICACION.items():
+        filas = tablas[tabla]
+        for posicion, nombre in enumerate(repository.COLUMNAS_SNAPSHOT[tabla]):
+            columnas.append((tabla, nombre, codificaciones[nombre], [f[posicion] for f in filas]))
+
+    def preparar(columna):
+        tabla, nombre, codificacion, valores = columna
+        datos, meta = _codificar(codificacion, valores)
+        comprimido = zlib.compress(datos, nivel)
+        meta.update(largo=len(comprimido), largo_crudo=len(datos), huella=_huella_bloque(comprimido))
+        return tabla, nombre, meta, comprimido
+
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as ex:
+        bloques = list(ex.map(preparar, columnas))
+
+    indice: Dict = {
+        'creado': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'tablas': {t: {'filas': len(tablas[t]), 'columnas': {}} for t in CODIFICACION},
+    }
+    # offsets relativos al fin del índice (el índice no puede contener su propio largo)
+    offset = 0
+    for tabla, nombre, meta, comprimido in bloques:
+        meta['offset'] = offset
+        indice['tablas'][tabla]['columnas'][nombre] = meta
+        offset += len(comprimido)
+    indice_bytes = json.dumps(indice, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(_ENCABEZADO.pack(MAGIA, FORMATO_VERSION, 0, len(indice_bytes),
+                                 hashlib.blake2b(indice_bytes, digest_size=16).digest()))
+        f.write(indice_bytes)
+        for *_, comprimido in bloques:
+            f.write(comprimido)
+    os.replace(temporal, ruta)
+    return {
+        'filas': {t: len(tablas[t]) for t in CODIFICACION},
+        'bytes': os.path.getsize(ruta),
+        'bytes_sin_comprimir': sum(b[2]['largo_crudo'] for b in bloques),
+    }
+
+
+# ----------------- LEER ----------------- #
+class Snapshot:
+    """
+    Snapshot abierto con mmap (sólo lectura). Se usa como context manager:
+
+        with Snapshot.abrir(ruta) as snap:
+            temas = snap.columna('ejercicios', 'tema')
+    """
+
+    def __init__(self, archivo, mapa: mmap.mmap):
+        self._archivo = archivo
+        self._mapa = mapa
+        magia, version, _, largo_indice, huella_indice = _ENCABEZADO.unpack_from(mapa, 0)
+        if magia != MAGIA:
+            raise SnapshotInvalido("no es un snapshot del banco")
+        if version > FORMATO_VERSION:
+            raise SnapshotInvalido(f"versión de formato {version} (este programa lee hasta {FORMATO_VERSION})")
+        self.version = version
+        inicio = _ENCABEZADO.size
+        indice = mapa[inicio:inicio + largo_indice]
+        if hashlib.blake2b(indice, digest_size=16).digest() != huella_indice:
+            raise SnapshotInvalido("índice dañado (no coincide el checksum)")
+        self.indice = json.loads(indice)
+        self._datos = inicio + largo_indice
+
+    @classmethod
+    def abrir(cls, ruta: str) -> "Snapshot":
+        archivo = open(ruta, "rb")
+        try:
+            if os.fstat(archivo.fileno()).st_size < _ENCABEZADO.size:
+                raise SnapshotInvalido("archivo demasiado corto")
+            return cls(archivo, mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ))
+        except BaseException:
+            archivo.close()
+            raise
+
+    def cerrar(self):
+        self._mapa.close()
+        self._archivo.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+        return False
+
+    def filas(self, tabla: str) -> int:
+        return self.indice['tablas'][tabla]['filas']
+
+    def _bloque(self, tabla: str, nombre: str) -> bytes:
+        meta = self.indice['tablas'][tabla]['columnas'][nombre]
+        inicio = self._datos + meta['offset']
+        comprimido = memoryview(self._mapa)[inicio:inicio + meta['largo']]
+        try:
+            if len(comprimido) != meta['largo'] or _huella_bloque(comprimido) != meta['huella']:
+                raise SnapshotInvalido(f"bloque {tabla}.{nombre} dañado (no coincide el checksum)")
+            datos = zlib.decompress(comprimido)
+        finally:
+            comprimido.release()
+        if len(datos) != meta['largo_crudo']:
+            raise SnapshotInvalido(f"bloque {tabla}.{nombre} con largo inesperado")
+        return datos
+
+    def columna(self, tabla: str, nombre: str) -> List:
+        """Valores de una columna (verifica el checksum del bloque antes de descomprimir)."""
+        meta = self.indice['tablas'][tabla]['columnas'][nombre]
+        return _decodificar(meta, self._bloque(tabla, nombre), self.filas(tabla))
+
+    def tabla(self, tabla: str, workers: Optional[int] = None) -> List[tuple]:
+        """Filas de la tabla con las columnas de repository.COLUMNAS_SNAPSHOT (en ese orden)."""
+        nombres = repository.COLUMNAS_SNAPSHOT[tabla]
+        faltan = [n for n in nombres if n not in self.indice['tablas'][tabla]['columnas']]
+        if faltan:
+            raise SnapshotInvalido(f"a {tabla} le faltan columnas: {', '.join(faltan)}")
+        # los bloques se verifican y descomprimen en paralelo; la decodificación es por columna
+        with ThreadPoolExecutor(max_workers=workers or min(8, len(nombres))) as ex:
+            bloques = list(ex.map(lambda n: self._bloque(tabla, n), nombres))
+        columnas = [_decodificar(self.indice['tablas'][tabla]['columnas'][n], datos, self.filas(tabla))
+                    for n, datos in zip(nombres, bloques)]
+        return list(zip(*columnas))
+
+    def verificar(self) -> Dict[str, int]:
+        """Comprueba el checksum de todos los bloques. Retorna {tabla: filas}."""
+        for tabla, datos in self.indice['tablas'].items():
+            for nombre in datos['columnas']:
+                self._bloque(tabla, nombre)
+        return {t: d['filas'] for t, d in self.indice['tablas'].items()}
+
+    def resumen(self) -> Dict:
+        """{'version', 'creado', 'filas': {tabla: n}, 'bytes'}"""
+        return {
+            'version': self.version,
+            'creado': self.indice.get('creado'),
+            'filas': {t: d['filas'] for t, d in self.indice['tablas'].items()},
+            'bytes': len(self._mapa),
+        }
+
+
+# ----------------- RESTAURAR ----------------- #
+def restaurar(ruta: str, fusionar: bool = False) -> Dict:
+    """
+    Restaura el snapshot de `ruta`. Todas las columnas se verifican antes de
+    tocar la DB, y la escritura es una sola transacción.
+      fusionar=False: el banco queda igual al del snapshot (mismos ids).
+      fusionar=True: se agrega lo que falta (ver repository.fusionar_snapshot).
+    Retorna el resumen de la operación más 'filas' (las del snapshot).
+    """
+    with Snapshot.abrir(ruta) as snap:
+        tablas = {tabla: snap.tabla(tabla) for tabla in repository.COLUMNAS_SNAPSHOT}
+    filas = {t: len(f) for t, f in tablas.items()}
+    if fusionar:
+        resultado = repository.fusionar_snapshot(tablas)
+    else:
+        resultado = repository.reemplazar_con_snapshot(tablas)
+    return {**resultado, 'filas': filas}
@@ -0,0 +1,372 @@
+r"""
+Ejercicios paramétricos: plantillas y pool de instancias ya verificadas.
+
+Una plantilla es un ejercicio del banco con coeficientes marcados (ver latex_parser):
+
+    %% EXERCISE_START
+    % id: 7
+    % parametros: a = 1..6; b = 2, 4, 8
+    7)
+    \[
+    (\param{2*a}{4}xy + \param{b}{2})\,dx + \param{a}{2}x^2\,dy = 0
+    \]
+    \textbf{Rpta:}
+    \[
+    \param{a}{2}x^2y + \param{b}{2}x = C
+    \]
+    %% EXERCISE_END
+
+  - \param{expr}{valor}: expr es aritmética exacta (enteros y fracciones, + - * /
+    y potencias enteras) sobre los parámetros; valor es el texto que se muestra
+    en el ejercicio base (tal cual). La respuesta se deriva sustituyendo los
+    mismos valores.
+  - % parametros: dominio de cada uno, "a = 1..6" (rango sin el 0) o una lista
+    "b = 2, 4, 8". Los que no se declaran toman DOMINIO_POR_DEFECTO.
+  - El LaTeX resultante se escribe como a mano: "+ \param{b}{2}" con b = -3 queda
+    "- 3", un coeficiente 1 delante de una letra no se escribe y las fracciones
+    salen como \tfrac{p}{q}.
+
+generar_pool() arma las instancias fuera del camino de los pedidos: sortea
+combinaciones (reproducibles: la semilla es la huella de la plantilla), descarta
+las que repiten un enunciado del banco o de otra instancia y verifica cada
+respuesta con services/validation_service en un ProcessPoolExecutor. Se guardan
+en la tabla instancias, indexadas por (plantilla, parámetros); sólo las
+'valido' se sortean. Volver a correrlo sólo agrega combinaciones nuevas, y
+editar la plantilla descarta las anteriores.
+
+Al generar una práctica, PoolInstancias tiene los ids de instancias válidas por
+plantilla (arrays): elegir una es un índice al azar, O(1), sin SymPy. El
+historial del semestre sigue siendo por ejercicio base (la plantilla).
+"""
+import ast
+import json
+import operator
+import os
+import random
+import re
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from fractions import Fraction
+from itertools import product
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from db import repository
+from latex_parser import CAMPOS_PLANTILLA, huella_enunciado
+from services import validation_service
+from services.expression_service import sympy_disponible
+
+INSTANCIAS_POR_PLANTILLA = 30
+DOMINIO_POR_DEFECTO = tuple(range(1, 10))
+MAX_COMBINACIONES = 100_000  # más que esto se sortea en vez de enumerar
+
+# estado de las instancias que repiten un enunciado (no se validan ni se sortean)
+DUPLICADO = "duplicado"
+
+_PARAM_RE = re.compile(r'\\param\{([^{}]*)\}\{([^{}]*)\}')
+_RANGO_RE = re.compile(r'^(-?\d+)\s*\.\.\s*(-?\d+)$')
+_OPERADORES = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+               ast.Div: operator.truediv, ast.Pow: operator.pow}
+
+Valores = Dict[str, Fraction]
+
+
+# ----------------- DEFINICIÓN ----------------- #
+class PlantillaInvalida(ValueError):
+    """Expresión o declaración de parámetros que no se puede interpretar."""
+
+
+def _arbol(expr: str) -> ast.AST:
+    try:
+        return ast.parse(expr.replace('^', '**'), mode='eval').body
+    except SyntaxError as e:
+        raise PlantillaInvalida(f"expresión inválida: {expr!r}") from e
+
+
+def _nombres(expr: str) -> List[str]:
+    return [n.id for n in ast.walk(_arbol(expr)) if isinstance(n, ast.Name)]
+
+
+def evaluar(expr: str, valores: Mapping[str, Fraction]) -> Fraction:
+    """Valor exacto de una expresión de \\param (sin eval: sólo números, parámetros y + - * / ^)."""
+    def _valor(nodo):
+        if isinstance(nodo, ast.Constant) and isinstance(nodo.value, int) and not isinstance(nodo.value, bool):
+            return Fraction(nodo.value)
+        if isinstance(nodo, ast.Name):
+            if nodo.id not in valores:
+                raise PlantillaInvalida(f"parámetro sin valor: {nodo.id}")
+            return valores[nodo.id]
+        if isinstance(nodo, ast.UnaryOp) and isinstance(nodo.op, (ast.USub, ast.UAdd)):
+            v = _valor(nodo.operand)
+            return -v if isinstance(nodo.op, ast.USub) else v
+        if isinstance(nodo, ast.BinOp) and type(nodo.op) in _OPERADORES:
+            izquierda, derecha = _valor(nodo.left), _valor(nodo.right)
+            if isinstance(nodo.op, ast.Pow) and (derecha.denominator != 1 or abs(derecha) > 16):
+                raise PlantillaInvalida("sólo potencias enteras chicas")
+            return _OPERADORES[type(nodo.op)](izquierda, derecha)
+        raise PlantillaInvalida(f"no soportado en \\param: {ast.dump(nodo)}")
+    return _valor(_arbol(expr))
+
+
+def _dominio(texto: str) -> Tuple[Fraction, ...]:
+    m = _RANGO_RE.match(texto)
+    if m:
+        desde, hasta = int(m.group(1)), int(m.group(2))
+        return tuple(Fraction(v) for v in range(desde, hasta + 1) if v != 0)
+    try:
+        return tuple(Fraction(v.strip()) for v in texto.split(",") if v.strip())
+    except ValueError as e:
+        raise PlantillaInvalida(f"dominio inválido: {texto!r}") from e
+
+
+def dominios(definicion: Mapping[str, str]) -> Dict[str, Tuple[Fraction, ...]]:
+    """{parámetro: valores posibles} de todos los parámetros que usa la plantilla."""
+    declarados = {}
+    for declaracion in (definicion.get('parametros') or "").split(";"):
+        if not declaracion.strip():
+            continue
+        nombre, _, valores = declaracion.partition("=")
+        if not nombre.strip().isidentifier() or not valores.strip():
+            raise PlantillaInvalida(f"declaración inválida: {declaracion.strip()!r}")
+        declarados[nombre.strip()] = _dominio(valores.strip())
+
+    resultado = {}
+    for campo in CAMPOS_PLANTILLA:
+        for expr, _ in _PARAM_RE.findall(definicion.get(campo) or ""):
+            for nombre in _nombres(expr):
+                resultado[nombre] = declarados.get(nombre) or tuple(map(Fraction, DOMINIO_POR_DEFECTO))
+    return dict(sorted(resultado.items()))
+
+
+def clave_parametros(valores: Mapping[str, Fraction]) -> str:
+    """'a=3;b=-1/2' (orden alfabético): clave de la instancia dentro de su plantilla."""
+    return ";".join(f"{k}={v}" for k, v in sorted(valores.items()))
+
+
+# ----------------- INSTANCIACIÓN ----------------- #
+def _numero(valor: Fraction) -> str:
+    if valor.denominator == 1:
+        return str(valor.numerator)
+    signo = "-" if valor < 0 else ""
+    return f"{signo}\\tfrac{{{abs(valor.numerator)}}}{{{valor.denominator}}}"
+
+
+def _sustituir(texto: str, valores: Mapping[str, Fraction]) -> str:
+    salida = ""
+    fin = 0
+    for m in _PARAM_RE.finditer(texto):
+        salida += texto[fin:m.start()]
+        fin = m.end()
+        previo = salida.rstrip()
+        siguiente = texto[fin:].lstrip()[:1]
+        valor = evaluar(m.group(1), valores)
+
+        if previo.endswith(('^', '_')):
+            # exponente o subíndice sin llaves
+            salida += f"{{{_numero(valor)}}}"
+            continue
+        if valor < 0 and previo.endswith(('+', '-')):
+            # "+ \param" con valor negativo: el signo pasa a la operación
+            salida = previo[:-1] + ('-' if previo.endswith('+') else '+') + salida[len(previo):]
+            valor = -valor
+        if abs(valor) == 1 and (siguiente.isalpha() or siguiente in ('\\', '(')):
+            salida += "-" if valor < 0 else ""  # coeficiente 1 implícito
+        elif valor < 0 and (previo[-1:].isalnum() or previo.endswith((')', '}'))):
+            salida += f"({_numero(valor)})"
+        else:
+            salida += _numero(valor)
+    return salida + texto[fin:]
+
+
+def instanciar(definicion: Mapping[str, str], valores: Mapping[str, Fraction]) -> Dict[str, str]:
+    """{'enunciado', 'condiciones', 'respuesta'} de la plantilla con esos valores."""
+    return {campo: _sustituir(definicion.get(campo) or "", valores) for campo in CAMPOS_PLANTILLA}
+
+
+def _combinaciones(dominio: Dict[str, Tuple[Fraction, ...]], cantidad: int, rng: random.Random,
+                   excluir: set) -> List[Valores]:
+    """Hasta `cantidad` combinaciones distintas (sin las de `excluir`), en orden reproducible."""
+    nombres = list(dominio)
+    total = 1
+    for valores in dominio.values():
+        total *= len(valores)
+    if total <= MAX_COMBINACIONES:
+        todas = [dict(zip(nombres, c)) for c in product(*dominio.values())]
+        rng.shuffle(todas)
+        return [c for c in todas if clave_parametros(c) not in excluir][:cantidad]
+
+    elegidas: Dict[str, Valores] = {}
+    for _ in range(cantidad * 20):
+        if len(elegidas) >= cantidad:
+            break
+        c = {n: rng.choice(dominio[n]) for n in nombres}
+        clave = clave_parametros(c)
+        if clave not in excluir:
+            elegidas.setdefault(clave, c)
+    return list(elegidas.values())
+
+
+# ----------------- POOL ----------------- #
+def _validar_instancia(tarea: Tuple) -> Tuple:
+    plantilla_id, huella, parametros, huella_enunciado_, campos, timeout = tarea
+    r = validation_service.validar_con_limite(campos['enunciado'], campos['condiciones'], campos['respuesta'], timeout)
+    return (plantilla_id, huella, parametros, huella_enunciado_, campos['enunciado'], campos['condiciones'],
+            campos['respuesta'], r['estado'], r['detalle'])
+
+
+def generar_pool(por_plantilla: int = INSTANCIAS_POR_PLANTILLA, workers: Optional[int] = None,
+                 timeout: Optional[float] = validation_service.TIMEOUT_S) -> Dict:
+    """
+    Completa el pool: hasta `por_plantilla` instancias nuevas por plantilla
+    activa (no repite combinaciones ya generadas, en ningún estado).
+    workers: procesos (None = uno por CPU); con 1 se valida en el proceso actual.
+    Retorna:
+        {'plantillas', 'generadas', 'por_estado': {estado: n}, 'errores': [(plantilla_id, detalle)]}
+    """
+    if not sympy_disponible():
+        raise RuntimeError("La verificación de instancias necesita SymPy (pip install sympy)")
+
+    existentes = repository.read_parametros_instancias()
+    ocupadas = repository.read_huellas_ocupadas()
+    resumen: Dict = {'plantillas': 0, 'generadas': 0, 'por_estado': {}, 'errores': []}
+    tareas = []
+    directas = []  # no necesitan validación (duplicados, expresiones que no se pueden evaluar)
+    for plantilla_id, texto, huella in repository.read_plantillas():
+        resumen['plantillas'] += 1
+        try:
+            definicion = json.loads(texto)
+            combinaciones = _combinaciones(dominios(definicion), por_plantilla, random.Random(huella),
+                                           existentes.get(plantilla_id, set()))
+        except (ValueError, PlantillaInvalida) as e:
+            resumen['errores'].append((plantilla_id, str(e)))
+            continue
+        for valores in combinaciones:
+            parametros = clave_parametros(valores)
+            try:
+                campos = instanciar(definicion, valores)
+            except (PlantillaInvalida, ZeroDivisionError) as e:
+                directas.append((plantilla_id, huella, parametros, None, "", None, None,
+                                 validation_service.ERROR, f"{type(e).__name__}: {e}"))
+                continue
+            h = huella_enunciado(campos['enunciado'])
+            if h in ocupadas:
+                directas.append((plantilla_id, huella, parametros, h, campos['enunciado'], campos['condiciones'],
+                                 campos['respuesta'], DUPLICADO, "el enunciado ya existe en el banco o en el pool"))
+                continue
+            ocupadas.add(h)
+            tareas.append((plantilla_id, huella, parametros, h, campos, timeout))
+
+    def guardar(lote):
+        resumen['generadas'] += repository.guardar_instancias(lote)
+        for fila in lote:
+            resumen['por_estado'][fila[7]] = resumen['por_estado'].get(fila[7], 0) + 1
+
+    if directas:
+        guardar(directas)
+    if tareas:
+        if workers == 1 or len(tareas) == 1:
+            hechas = map(_validar_instancia, tareas)
+            ex = None
+        else:
+            ex = ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(tareas)))
+            hechas = ex.map(_validar_instancia, tareas, chunksize=4)
+        try:
+            lote = []
+            for fila in hechas:
+                lote.append(fila)
+                if len(lote) >= repository.BATCH_SIZE:
+                    guardar(lote)
+                    lote = []
+            if lote:
+                guardar(lote)
+        finally:
+            if ex is not None:
+                ex.shutdown()
+    return resumen
+
+
+_segundo_plano = ThreadPoolExecutor(max_workers=1, thread_name_prefix="edo-instancias")
+_pendiente: Optional[Future] = None
+_pendiente_lock = threading.Lock()
+
+
+def generar_pool_en_segundo_plano(al_terminar: Optional[Callable[[Dict], None]] = None,
+                                  **opciones) -> Optional[Future]:
+    """
+    generar_pool() en un hilo aparte (los pedidos siguen usando el pool que ya
+    hay). Si ya hay una corrida esperando, no se agrega otra: esa verá también
+    las plantillas nuevas. Retorna el Future, o None si no hay SymPy.
+    """
+    global _pendiente
+    if not sympy_disponible():
+        return None
+    with _pendiente_lock:
+        if _pendiente is not None and not _pendiente.running() and not _pendiente.done():
+            return _pendiente
+
+        def correr():
+            resumen = generar_pool(**opciones)
+            if al_terminar is not None:
+                al_terminar(resumen)
+            return resumen
+        _pendiente = _segundo_plano.submit(correr)
+        return _pendiente
+
+
+# ----------------- PRÁCTICAS ----------------- #
+class PoolInstancias:
+    """Ids de instancias válidas por plantilla (arrays, sólo lectura)."""
+
+    def __init__(self, ids: Mapping[int, Sequence[int]]):
+        self.ids = ids
+
+    @classmethod
+    def desde_db(cls) -> "PoolInstancias":
+        return cls(repository.read_ids_instancias(validation_service.VALIDO))
+
+    def __contains__(self, ejercicio_id: int) -> bool:
+        return bool(self.ids.get(ejercicio_id))
+
+    def sortear(self, ejercicio_id: int, rng: random.Random) -> Optional[int]:
+        """Una instancia al azar de la plantilla (None si el ejercicio no tiene)."""
+        ids = self.ids.get(ejercicio_id)
+        return ids[rng.randrange(len(ids))] if ids else None
+
+
+def sortear_instancias(practicas: Sequence[Sequence[int]], semilla=None,
+                       pool: Optional[PoolInstancias] = None) -> List[List[Optional[int]]]:
+    """
+    Para cada práctica (lista de ids), el id de instancia de cada ejercicio
+    (None si no es plantilla o su pool está vacío). Con semilla, la práctica i
+    usa "semilla:i": el mismo lote da las mismas instancias.
+    """
+    pool = pool if pool is not None else PoolInstancias.desde_db()
+    resultado = []
+    for i, ids in enumerate(practicas):
+        rng = random.Random(f"{semilla}:{i}" if semilla is not None else None)
+        resultado.append([pool.sortear(e, rng) for e in ids])
+    return resultado
+
+
+def textos_instancias(instancias: Sequence[Sequence[Optional[int]]]) -> Dict[int, Dict]:
+    """{instancia_id: textos} de todas las instancias de un lote (una sola lectura)."""
+    return repository.read_instancias_por_ids({i for v in instancias for i in v if i is not None})
+
+
+def aplicar_instancias(practica: Sequence[Mapping], instancias: Sequence[Optional[int]],
+                       textos: Optional[Mapping[int, Dict]] = None) -> List[Dict]:
+    """
+    Ejercicios de la práctica con los textos de su instancia (dicts; mismo 'id'
+    que el ejercicio base, más 'instancia_id' y 'parametros').
+    """
+    if textos is None:
+        textos = textos_instancias([instancias])
+    resultado = []
+    for ej, instancia_id in zip(practica, instancias):
+        ej = dict(ej.a_dict() if hasattr(ej, "a_dict") else ej)
+        instancia = textos.get(instancia_id) if instancia_id is not None else None
+        if instancia is not None:
+            ej.update({campo: instancia[campo] for campo in CAMPOS_PLANTILLA})
+            ej['instancia_id'] = instancia_id
+            ej['parametros'] = instancia['parametros']
+        resultado.append(ej)
+    return resultado
@@ -0,0 +1,298 @@
+r"""
+Validación simbólica de respuestas con SymPy (dependencia opcional: pip install sympy).
+
+Cada ejercicio se traduce a SymPy:
+  - enunciado: una EDO de primer orden G(x, y, p) = 0 con p = y'. Se aceptan la
+    forma diferencial M\,dx + N\,dy = 0 (se divide por dx con dy = p\,dx), y' y
+    \frac{dy}{dx};
+  - respuesta: solución implícita F(x, y) = C o explícita y = g(x). Si la
+    constante de integración (C, c, K) aparece de forma no aditiva, se despeja
+    para quedarse con la integral primera F(x, y);
+  - condiciones (las que el parser separa tras ", \quad"), p. ej. y(0) = 1: si la
+    respuesta es particular (sin constante), debe cumplirlas.
+Las fórmulas se traducen con services/expression_service (caché de árboles ya
+parseados). La respuesta es válida si, derivando implícitamente (p = -F_x / F_y), el
+residuo G(x, y, p) se anula, lo que se comprueba evaluándolo en puntos al azar
+(simplify() sólo cuando el dominio no deja evaluar suficientes puntos).
+
+Las comprobaciones simbólicas son lentas: validar_banco() las reparte en un
+ProcessPoolExecutor, con un tiempo límite por ejercicio, y guarda cada resultado
+en la tabla validaciones con clave = hash de (enunciado, condiciones, respuesta,
+VERSION_VALIDADOR). Re-validar el banco sólo procesa lo nuevo o editado.
+"""
+import hashlib
+import os
+import random
+import re
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from db import repository
+from services.expression_service import (
+    LatexNoSoportado, expresion, separar_condicion, simbolos, sympy_disponible,
+)
+
+# subir al cambiar la traducción o los criterios (invalida la caché de resultados)
+VERSION_VALIDADOR = "1"
+TIMEOUT_S = 10.0
+
+# estados de una validación
+VALIDO = "valido"
+INVALIDO = "invalido"
+NO_SOPORTADO = "no_soportado"   # no se pudo traducir la EDO o la respuesta
+TIEMPO_AGOTADO = "tiempo_agotado"
+ERROR = "error"
+
+_PUNTOS_PRUEBA = 6
+_TOLERANCIA = 1e-7
+
+
+# ----------------- VALIDACIÓN ----------------- #
+def _edo(enunciado: str):
+    """G(x, y, p) con G = 0 equivalente a la EDO del enunciado."""
+    import sympy
+    s = simbolos()
+    eq = expresion(separar_condicion(enunciado)[0])
+    if not isinstance(eq, sympy.Eq):
+        raise LatexNoSoportado("el enunciado no es una ecuación")
+    g = sympy.expand((eq.lhs - eq.rhs).subs(s['DY'], s['p'] * s['DX']))
+    if g.has(s['DX']):
+        g = sympy.expand(g / s['DX'])
+        if g.has(s['DX']):
+            raise LatexNoSoportado("forma diferencial no lineal en dx, dy")
+    if not g.has(s['p']):
+        raise LatexNoSoportado("el enunciado no contiene y', dy/dx ni dy")
+    return g
+
+
+def _valores_constantes(resto: str) -> Dict:
+    """{C: valor} de las asignaciones 'C = ...' que siguen a la respuesta (tras ", \\quad")."""
+    s = simbolos()
+    valores = {}
+    for parte in re.split(r'(?<!\\),|\\q?quad', resto or ""):
+        if '=' not in parte:
+            continue
+        # 'C = expresión = valor': se usa el último miembro
+        miembros = parte.split('=')
+        nombre = miembros[0].strip()
+        if nombre in ('C', 'c', 'K'):
+            valores[s[nombre]] = expresion(miembros[-1])
+    return valores
+
+
+def _integral_primera(respuesta: str):
+    """
+    (F, particular): F(x, y) constante sobre las soluciones y, si la respuesta
+    no deja constantes libres, la ecuación particular (lado izq. - lado der.).
+    """
+    import sympy
+    s = simbolos()
+    ecuacion, resto = separar_condicion(respuesta)
+    eq = expresion(ecuacion)
+    if not isinstance(eq, sympy.Eq):
+        raise LatexNoSoportado("la respuesta no es una ecuación")
+    f = eq.lhs - eq.rhs
+    constantes = [s[n] for n in ('C', 'c', 'K') if f.has(s[n])]
+    valores = _valores_constantes(resto)
+    particular = f.subs(valores) if all(k in valores for k in constantes) else None
+
+    for k in constantes:
+        if f.diff(k).has(s['x']) or f.diff(k).has(s['y']):
+            despejes = sympy.solve(f, k)
+            if not despejes:
+                raise LatexNoSoportado("no se pudo despejar la constante")
+            f = despejes[0]
+        else:
+            f = f.subs(k, 0)
+    if not (f.has(s['x']) or f.has(s['y'])):
+        raise LatexNoSoportado("la respuesta no depende de x ni de y")
+    return f, particular
+
+
+def _condiciones(condiciones: Optional[str]) -> List[Tuple[object, object]]:
+    """[(x0, y0)] de condiciones 'y(x0) = y0' (separadas por coma o \\quad)."""
+    puntos = []
+    for parte in re.split(r'(?<!\\),|\\q?quad', condiciones or ""):
+        if '=' not in parte:
+            continue
+        izquierda, derecha = parte.split('=', 1)
+        m = re.match(r'^\s*y\s*(?:\\!)?\s*(?:\\left)?\s*\((?P<x>.*)\)\s*$', izquierda.replace(r'\right)', ')'))
+        if m:
+            puntos.append((expresion(m.group('x')), expresion(derecha)))
+    return puntos
+
+
+def _es_cero(expr, rng: random.Random) -> Optional[bool]:
+    """
+    True/False si expr es idénticamente nula; None si no se pudo decidir.
+    Se evalúa en puntos al azar; sólo si no hay suficientes puntos evaluables
+    (dominio) se recurre a simplify().
+    """
+    import sympy
+    libres = sorted(expr.free_symbols, key=str)
+    f = sympy.lambdify(libres, expr, modules="math")
+    evaluados = 0
+    for _ in range(_PUNTOS_PRUEBA * 4):
+        valores = [rng.uniform(0.2, 1.5) for _ in libres]
+        try:
+            r = float(f(*valores))
+        except (ValueError, ZeroDivisionError, OverflowError, TypeError):
+            continue
+        if r != r:  # NaN
+            continue
+        if abs(r) > _TOLERANCIA:
+            return False
+        evaluados += 1
+        if evaluados >= _PUNTOS_PRUEBA:
+            return True
+    return True if sympy.simplify(expr) == 0 else None
+
+
+def validar(enunciado: str, condiciones: Optional[str], respuesta: Optional[str]) -> Dict[str, str]:
+    """
+    Valida la respuesta de un ejercicio (sin caché ni tiempo límite).
+    Retorna {'estado': VALIDO | INVALIDO | NO_SOPORTADO, 'detalle': str}
+    """
+    if not (respuesta or "").strip():
+        return {'estado': NO_SOPORTADO, 'detalle': "sin respuesta"}
+    import sympy
+    s = simbolos()
+    try:
+        g = _edo(enunciado)
+        f, particular = _integral_primera(respuesta)
+        fx, fy = f.diff(s['x']), f.diff(s['y'])
+        if fy == 0:
+            raise LatexNoSoportado("la respuesta no depende de y")
+        residuo = sympy.numer(sympy.together(g.subs(s['p'], -fx / fy)))
+        cero = _es_cero(residuo, random.Random(0))
+        if cero is False:
+            return {'estado': INVALIDO, 'detalle': "la respuesta no satisface la EDO"}
+        if cero is None:
+            return {'estado': NO_SOPORTADO, 'detalle': "no se pudo decidir si el residuo se anula"}
+
+        if particular is not None:
+            for x0, y0 in _condiciones(condiciones):
+                valor = complex(particular.subs({s['x']: x0, s['y']: y0}).evalf())
+                if abs(valor) > _TOLERANCIA:
+                    return {'estado': INVALIDO, 'detalle': f"no cumple la condición y({x0}) = {y0}"}
+        return {'estado': VALIDO, 'detalle': "la respuesta satisface la EDO"}
+    except LatexNoSoportado as e:
+        return {'estado': NO_SOPORTADO, 'detalle': str(e)}
+    except Exception as e:
+        return {'estado': ERROR, 'detalle': f"{type(e).__name__}: {e}"}
+
+
+# ----------------- LOTES ----------------- #
+class _TiempoAgotado(BaseException):
+    """BaseException para que no la atrapen los except Exception de SymPy ni de validar()."""
+
+
+def _alarma(signum, frame):
+    raise _TiempoAgotado()
+
+
+def clave_validacion(enunciado: Optional[str], condiciones: Optional[str], respuesta: Optional[str]) -> str:
+    """Clave de caché: hash de los textos validados y de VERSION_VALIDADOR."""
+    h = hashlib.blake2b(digest_size=16)
+    for parte in (VERSION_VALIDADOR, enunciado, condiciones, respuesta):
+        h.update((parte or "").encode("utf-8") + b"\0")
+    return h.hexdigest()
+
+
+def validar_con_limite(enunciado: str, condiciones: Optional[str], respuesta: Optional[str],
+                       timeout: Optional[float] = TIMEOUT_S) -> Dict:
+    """
+    validar() con tiempo límite (SIGALRM; sin límite donde no hay señales o fuera
+    del hilo principal). Agrega 'duracion' al resultado.
+    """
+    con_alarma = bool(timeout) and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if con_alarma:
+        anterior = signal.signal(signal.SIGALRM, _alarma)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    inicio = time.perf_counter()
+    try:
+        resultado = validar(enunciado, condiciones, respuesta)
+    except _TiempoAgotado:
+        resultado = {'estado': TIEMPO_AGOTADO, 'detalle': f"más de {timeout:g} s"}
+    finally:
+        if con_alarma:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, anterior)
+    resultado['duracion'] = time.perf_counter() - inicio
+    return resultado
+
+
+def _validar_tarea(tarea: Tuple[str, str, Optional[str], Optional[str], Optional[float]]) -> Tuple[str, Dict]:
+    clave, enunciado, condiciones, respuesta, timeout = tarea
+    return clave, validar_con_limite(enunciado, condiciones, respuesta, timeout)
+
+
+def validar_banco(workers: Optional[int] = None, timeout: Optional[float] = TIMEOUT_S,
+                  forzar: bool = False) -> Dict:
+    """
+    Valida las respuestas de todos los ejercicios activos. Sólo se validan los
+    textos que no están en la caché (nuevos o editados), salvo forzar=True; los
+    resultados se guardan a medida que llegan.
+    workers: procesos (None = uno por CPU); con 1 se valida en el proceso actual.
+    Retorna:
+        {'total', 'en_cache', 'validados', 'por_estado': {estado: n},
+         'resultados': [{'id', 'numero', 'archivo_origen', 'estado', 'detalle'}, ...]}
+    """
+    if not sympy_disponible():
+        raise RuntimeError("La validación necesita SymPy (pip install sympy)")
+
+    columnas = ('id', 'numero', 'archivo_origen', 'enunciado', 'condiciones', 'respuesta')
+    ejercicios = []
+    tareas: Dict[str, Tuple] = {}
+    for ej in repository.iter_ejercicios_db(columnas=columnas):
+        clave = clave_validacion(ej['enunciado'], ej['condiciones'], ej['respuesta'])
+        ejercicios.append((ej['id'], ej['numero'], ej['archivo_origen'], clave))
+        tareas.setdefault(clave, (clave, ej['enunciado'], ej['condiciones'], ej['respuesta'], timeout))
+
+    cache = {} if forzar else repository.read_validaciones(tareas)
+    pendientes = [t for c, t in tareas.items() if c not in cache]
+    resultados = dict(cache)
+
+    def guardar(lote):
+        repository.guardar_validaciones(
+            (c, r['estado'], r['detalle'], r['duracion']) for c, r in lote
+        )
+        resultados.update(lote)
+
+    if pendientes:
+        if workers == 1 or len(pendientes) == 1:
+            hechos = map(_validar_tarea, pendientes)
+            ex = None
+        else:
+            ex = ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(pendientes)))
+            hechos = ex.map(_validar_tarea, pendientes, chunksize=4)
+        try:
+            lote = []
+            for hecho in hechos:
+                lote.append(hecho)
+                if len(lote) >= repository.BATCH_SIZE:
+                    guardar(lote)
+                    lote = []
+            if lote:
+                guardar(lote)
+        finally:
+            if ex is not None:
+                ex.shutdown()
+
+    por_estado: Dict[str, int] = {}
+    detalle = []
+    for ejercicio_id, numero, archivo, clave in ejercicios:
+        r = resultados[clave]
+        por_estado[r['estado']] = por_estado.get(r['estado'], 0) + 1
+        detalle.append({'id': ejercicio_id, 'numero': numero, 'archivo_origen': archivo,
+                        'estado': r['estado'], 'detalle': r['detalle']})
+    return {
+        'total': len(ejercicios),
+        'en_cache': len(ejercicios) - sum(1 for *_, c in ejercicios if c not in cache),
+        'validados': len(pendientes),
+        'por_estado': por_estado,
+        'resultados': detalle,
+    }
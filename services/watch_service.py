@@ -0,0 +1,196 @@
+"""
+Modo vigilancia: ingesta automática de los .tex que se crean o editan en data/.
+
+Por sondeo (os.scandir + stat cada `intervalo` segundos, sin dependencias ni
+APIs por sistema operativo):
+  - un archivo nuevo o con otro (tamaño, mtime) queda pendiente; recién cuando
+    pasa `espera` segundos sin volver a cambiar se encola (debounce): una
+    ráfaga de guardados, o un archivo que se está copiando, es UNA ingesta;
+  - la cola es acotada (max_cola) y no admite repetidos: si está llena, los
+    archivos listos esperan al siguiente sondeo en vez de acumularse, y un
+    archivo que vuelve a cambiar mientras espera no se encola dos veces;
+  - un único hilo escritor toma de la cola hasta `lote` archivos por vez y los
+    pasa por ingest_service.sincronizar_archivos: el mismo camino que la carga
+    manual (manifiesto, diff por ejercicio, dedup e inserción por lotes). Cien
+    archivos nuevos a la vez son unas pocas sincronizaciones seguidas, nunca
+    cien escritores concurrentes.
+Los archivos borrados sólo dejan de vigilarse (sus ejercicios quedan en la DB).
+"""
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from services.ingest_service import sincronizar_archivos
+
+INTERVALO_S = 1.0
+ESPERA_S = 2.0
+MAX_COLA = 32
+LOTE = 16
+
+# (tamaño, mtime_ns)
+Firma = Tuple[int, int]
+
+
+def escanear(directorio: str) -> Dict[str, Firma]:
+    """{ruta: (tamaño, mtime_ns)} de los .tex del directorio (sin leerlos)."""
+    firmas: Dict[str, Firma] = {}
+    try:
+        entradas = os.scandir(directorio)
+    except FileNotFoundError:
+        return firmas
+    with entradas:
+        for entrada in entradas:
+            if entrada.name.lower().endswith(".tex") and entrada.is_file():
+                try:
+                    st = entrada.stat()
+                except FileNotFoundError:
+                    continue  # borrado entre el listado y el stat
+                firmas[entrada.path] = (st.st_size, st.st_mtime_ns)
+    return firmas
+
+
+class Vigilante:
+    """
+    Vigila un directorio y sincroniza con la DB los .tex que cambian.
+    al_sincronizar(rutas, resumen) se llama desde el hilo escritor después de
+    cada sincronización (resumen como el de sincronizar_archivos).
+    """
+
+    def __init__(self, directorio: str = "data", intervalo: float = INTERVALO_S, espera: float = ESPERA_S,
+                 max_cola: int = MAX_COLA, lote: int = LOTE, workers: Optional[int] = 1,
+                 al_sincronizar: Optional[Callable[[List[str], Dict], None]] = None):
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.espera = espera
+        self.lote = lote
+        self.workers = workers
+        self.al_sincronizar = al_sincronizar
+        self.cola: "queue.Queue[str]" = queue.Queue(max_cola)
+        self._conocidas: Dict[str, Firma] = {}
+        # ruta -> momento del último cambio visto (todavía no estable)
+        self._cambiadas: Dict[str, float] = {}
+        # estables que no entraron en la cola llena
+        self._listas: List[str] = []
+        # encoladas o sincronizándose (no se repiten en la cola)
+        self._en_curso: Set[str] = set()
+        self._en_curso_lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilos: List[threading.Thread] = []
+        self.sincronizaciones = 0
+
+    # ----- detección (hilo de sondeo) ----- #
+    def revisar(self, ahora: Optional[float] = None) -> List[str]:
+        """Un sondeo: registra los cambios y encola los archivos ya estables. Retorna los encolados."""
+        ahora = time.monotonic() if ahora is None else ahora
+        actuales = escanear(self.directorio)
+        for ruta, firma in actuales.items():
+            if self._conocidas.get(ruta) != firma:
+                self._cambiadas[ruta] = ahora
+        for ruta in self._conocidas.keys() - actuales.keys():
+            self._cambiadas.pop(ruta, None)
+        self._conocidas = actuales
+
+        estables = [r for r, t in self._cambiadas.items() if ahora - t >= self.espera]
+        for ruta in estables:
+            del self._cambiadas[ruta]
+        self._listas.extend(r for r in sorted(estables) if r not in self._listas)
+        return self._encolar()
+
+    def _encolar(self) -> List[str]:
+        encoladas = []
+        while self._listas:
+            ruta = self._listas[0]
+            with self._en_curso_lock:
+                if ruta in self._en_curso:
+                    # ya espera en la cola: esa sincronización verá el contenido nuevo
+                    self._listas.pop(0)
+                    continue
+                try:
+                    self.cola.put_nowait(ruta)
+                except queue.Full:
+                    break  # contrapresión: el resto espera al próximo sondeo
+                self._en_curso.add(ruta)
+            encoladas.append(self._listas.pop(0))
+        return encoladas
+
+    def _sondear(self):
+        while not self._detener.wait(self.intervalo):
+            self.revisar()
+
+    # ----- ingesta (único hilo escritor) ----- #
+    def _tomar_lote(self, timeout: float) -> List[str]:
+        try:
+            rutas = [self.cola.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(rutas) < self.lote:
+            try:
+                rutas.append(self.cola.get_nowait())
+            except queue.Empty:
+                break
+        # se liberan antes de sincronizar: un cambio durante la ingesta se vuelve a encolar
+        with self._en_curso_lock:
+            self._en_curso.difference_update(rutas)
+        return rutas
+
+    def sincronizar_pendientes(self, timeout: float = 0.0) -> Optional[Dict]:
+        """Sincroniza un lote de la cola (si hay). Retorna el resumen o None si la cola estaba vacía."""
+        rutas = self._tomar_lote(timeout)
+        if not rutas:
+            return None
+        try:
+            resumen = sincronizar_archivos(rutas, workers=self.workers)
+        except Exception as e:
+            # (DB bloqueada, disco lleno...) el manifiesto no se actualizó: el próximo cambio reintenta
+            resumen = {'omitidos': 0, 'agregados': 0, 'duplicados': 0, 'actualizados': 0, 'retirados': 0,
+                       'errores': [(ruta, f"{type(e).__name__}: {e}") for ruta in rutas], 'conflictos': [],
+                       'similares': []}
+        self.sincronizaciones += 1
+        if self.al_sincronizar is not None:
+            self.al_sincronizar(rutas, resumen)
+        return resumen
+
+    def _escribir(self):
+        while not self._detener.is_set():
+            self.sincronizar_pendientes(timeout=self.intervalo)
+
+    # ----- ciclo de vida ----- #
+    def iniciar(self, inicial: bool = True):
+        """
+        Arranca los hilos de sondeo y de escritura. Con inicial, los .tex que ya
+        están se sincronizan una vez (el manifiesto salta los que no cambiaron).
+        """
+        self._conocidas = escanear(self.directorio)
+        if inicial:
+            self._listas.extend(sorted(self._conocidas))
+            self._encolar()
+        self._detener.clear()
+        self._hilos = [
+            threading.Thread(target=self._sondear, name="edo-vigilancia", daemon=True),
+            threading.Thread(target=self._escribir, name="edo-ingesta", daemon=True),
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def detener(self):
+        """Detiene los hilos (la sincronización en curso termina; lo encolado queda sin ingerir)."""
+        self._detener.set()
+        for hilo in self._hilos:
+            hilo.join()
+        self._hilos = []
+
+
+def vigilar(directorio: str = "data", al_sincronizar: Optional[Callable[[List[str], Dict], None]] = None,
+            **opciones):
+    """Vigila `directorio` hasta Ctrl+C."""
+    vigilante = Vigilante(directorio, al_sincronizar=al_sincronizar, **opciones)
+    vigilante.iniciar()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        vigilante.detener()
@@ -0,0 +1,415 @@
+"""
+Servicio local HTTP/JSON sobre el banco de ejercicios, para los scripts del
+curso y de corrección: python -m cli serve [--host H] [--puerto P] [--hilos N]
+
+    GET  /ejercicios?tema=..&prefijo_subtema=..    todos los que cumplen, en NDJSON (uno por línea)
+    GET  /ejercicios?...&despues_de=ID&limite=N    una página JSON {'ejercicios', 'siguiente'}
+    GET  /ejercicios/ID
+    GET  /buscar?q=TEXTO[&limite=N]                texto completo (coincidencias entre [ ])
+    GET  /estadisticas
+    GET  /semestres                                resumen del historial por semestre
+    POST /practicas  {"ejercicios": 10, "semilla": "s", "estudiantes": 30,
+                      "semestre": "2025-1", "registrar": false, "instancias": false}
+
+Sin "estudiantes" se devuelve una sola práctica ({'ejercicios'}); "semestre" y
+"registrar" valen igual para ella que para un lote.
+Con "instancias": true los ejercicios paramétricos salen con una instancia ya
+verificada del pool (services/template_service.py); en un lote se devuelve
+además 'instancias', el id de instancia de cada ejercicio de cada práctica.
+
+Filtros de /ejercicios: numero, tema, subtema, archivo_origen (igualdad) y
+prefijo_tema, prefijo_subtema, prefijo_archivo_origen.
+
+  - asyncio atiende las conexiones (HTTP/1.1 con keep-alive) y todo acceso a
+    SQLite corre en un ThreadPoolExecutor acotado: el repositorio reutiliza una
+    conexión por hilo, así que cientos de pedidos concurrentes comparten esas
+    pocas conexiones (y el catálogo en memoria, services/catalog_service.py).
+  - Las listas completas salen en NDJSON con Transfer-Encoding: chunked, por
+    tramos de TRAMO_NDJSON ids: la respuesta nunca se arma entera en memoria.
+  - Caché de respuestas: la versión de la DB es el PRAGMA data_version de una
+    conexión propia del servidor, que cambia con cualquier escritura confirmada
+    (de este u otro proceso). El ETag de un GET es (versión, ruta y
+    parámetros): un If-None-Match vigente se responde 304 sin tocar la DB, las
+    respuestas JSON chicas se guardan enteras (LRU) y los GET iguales en vuelo
+    se calculan una sola vez. Toda escritura deja viejas todas las entradas.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from db import repository
+from services import catalog_service, history_service, practice_service, search_service, template_service
+
+HOST = "127.0.0.1"
+PUERTO = 8765
+# hilos (y por lo tanto conexiones SQLite) que atienden la DB
+HILOS = 8
+# ejercicios por tramo del NDJSON (una lectura y un envío por tramo)
+TRAMO_NDJSON = 500
+# respuestas JSON guardadas enteras (LRU) y tamaño máximo de cada una
+CACHE_RESPUESTAS = 512
+CACHE_MAX_BYTES = 256 * 1024
+# límites del pedido
+MAX_ENCABEZADOS = 16 * 1024
+MAX_CUERPO = 1024 * 1024
+ESPERA_INACTIVO_S = 30.0
+
+FILTROS = ('numero', 'tema', 'subtema', 'archivo_origen')
+PREFIJO = "prefijo_"
+
+_RESALTADO = str.maketrans({search_service.MARCA_INICIO: "[", search_service.MARCA_FIN: "]"})
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado: int, mensaje: str):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+# ----------------- UTILIDADES ----------------- #
+def _serializable(obj):
+    if isinstance(obj, catalog_service.Ejercicio):
+        return obj.a_dict()
+    if isinstance(obj, (array, set, frozenset)):
+        return list(obj)
+    raise TypeError(f"No serializable: {type(obj).__name__}")
+
+
+def _a_json(datos) -> bytes:
+    return json.dumps(datos, ensure_ascii=False, default=_serializable).encode("utf-8")
+
+
+def _entero(params: Dict[str, str], nombre: str, defecto: Optional[int] = None, minimo: int = 0) -> Optional[int]:
+    valor = params.get(nombre)
+    if valor is None:
+        return defecto
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ErrorHTTP(400, f"'{nombre}' debe ser un entero") from None
+    if numero < minimo:
+        raise ErrorHTTP(400, f"'{nombre}' debe ser >= {minimo}")
+    return numero
+
+
+def _filtros(params: Dict[str, str], admitidos: Tuple[str, ...] = ()) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """(filtros, prefijos) de los parámetros; rechaza los desconocidos."""
+    filtros, prefijos = {}, {}
+    for clave, valor in params.items():
+        if clave in FILTROS:
+            filtros[clave] = valor
+        elif clave.startswith(PREFIJO) and clave[len(PREFIJO):] in repository.COLUMNAS_TEXTO_FILTRABLES:
+            prefijos[clave[len(PREFIJO):]] = valor
+        elif clave not in admitidos:
+            raise ErrorHTTP(400, f"Parámetro desconocido: {clave}")
+    return filtros, prefijos
+
+
+def _cabecera(estado: int, encabezados: Dict[str, str]) -> bytes:
+    lineas = [f"HTTP/1.1 {estado} {HTTPStatus(estado).phrase}"]
+    lineas += [f"{k}: {v}" for k, v in encabezados.items()]
+    return ("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1")
+
+
+# ----------------- CONSULTAS (corren en el pool) ----------------- #
+def _pagina(filtros: Dict, prefijos: Dict, despues_de: int, limite: int) -> Dict:
+    ids = catalog_service.ids_ejercicios(filtros, prefijos)
+    inicio = bisect_right(ids, despues_de)
+    tramo = ids[inicio:inicio + limite]
+    ejercicios = catalog_service.ejercicios_por_ids(tramo)
+    return {
+        'ejercicios': [ejercicios[i] for i in tramo if i in ejercicios],
+        'siguiente': tramo[-1] if inicio + limite < len(ids) else None,
+    }
+
+
+def _ejercicio(ejercicio_id: int):
+    ejercicio = catalog_service.ejercicios_por_ids([ejercicio_id]).get(ejercicio_id)
+    if ejercicio is None:
+        raise ErrorHTTP(404, f"No existe el ejercicio {ejercicio_id}")
+    return ejercicio
+
+
+def _buscar(texto: str, limite: int) -> List[Dict]:
+    resultados = search_service.buscar(texto, limite)
+    for r in resultados:
+        for campo, valor in r.items():
+            if isinstance(valor, str):
+                r[campo] = valor.translate(_RESALTADO)
+    return resultados
+
+
+def _lineas_ndjson(tramo: array) -> bytes:
+    ejercicios = catalog_service.ejercicios_por_ids(tramo)
+    return b"".join(_a_json(ejercicios[i]) + b"\n" for i in tramo if i in ejercicios)
+
+
+def _practicas(pedido: Dict) -> Dict:
+    n = pedido.get('ejercicios', 10)
+    estudiantes = pedido.get('estudiantes')
+    semilla = pedido.get('semilla')
+    if not isinstance(n, int) or n < 1 or (estudiantes is not None and (not isinstance(estudiantes, int) or estudiantes < 1)):
+        raise ErrorHTTP(400, "'ejercicios' y 'estudiantes' deben ser enteros positivos")
+    if semilla is not None:
+        semilla = str(semilla)
+
+    con_instancias = bool(pedido.get('instancias'))
+    registrar = bool(pedido.get('registrar'))
+    semestre_id = None
+    if pedido.get('semestre'):
+        semestre = repository.read_semestre_por_nombre(pedido['semestre'])
+        semestre_id = semestre['id'] if semestre else repository.create_semestre(pedido['semestre'])
+    if estudiantes is None:
+        return {'ejercicios': practice_service.generar_practica(
+            n, semilla, con_instancias=con_instancias, semestre_id=semestre_id, registrar=registrar
+        )}
+    variantes, estadisticas = practice_service.generar_lote(estudiantes, n, semilla, semestre_id, registrar=registrar)
+    if con_instancias:
+        return {'variantes': variantes, 'estadisticas': estadisticas,
+                'instancias': template_service.sortear_instancias(variantes, semilla)}
+    return {'variantes': variantes, 'estadisticas': estadisticas}
+
+
+# ----------------- SERVIDOR ----------------- #
+class Servidor:
+    def __init__(self, hilos: int = HILOS):
+        self.pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="edo-db")
+        self.testigo = repository.conexion_testigo()
+        # distingue los ETag de distintas ejecuciones (data_version es por conexión)
+        self.instancia = os.urandom(4).hex()
+        self.cache: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+        self.en_vuelo: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.contadores = {'pedidos': 0, 'no_modificados': 0, 'desde_cache': 0, 'compartidos': 0}
+
+    def cerrar(self):
+        self.pool.shutdown(wait=True)
+        self.testigo.close()
+
+    async def _en_pool(self, funcion: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, funcion, *args)
+
+    def _etag(self, version: int, clave: str) -> str:
+        return f'"{self.instancia}-{version}-{hashlib.blake2b(clave.encode("utf-8"), digest_size=8).hexdigest()}"'
+
+    # ----- conexión ----- #
+    async def atender(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    cabecera = await asyncio.wait_for(lector.readuntil(b"\r\n\r\n"), ESPERA_INACTIVO_S)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._responder(escritor, 431, _a_json({'error': "Encabezados demasiado grandes"}), False)
+                    return
+                try:
+                    metodo, destino, version_http, encabezados = _parsear_cabecera(cabecera)
+                    largo = int(encabezados.get('content-length', 0))
+                except ValueError:
+                    await self._responder(escritor, 400, _a_json({'error': "Pedido mal formado"}), False)
+                    return
+                if largo > MAX_CUERPO:
+                    await self._responder(escritor, 413, _a_json({'error': "Cuerpo demasiado grande"}), False)
+                    return
+                cuerpo = await lector.readexactly(largo) if largo else b""
+
+                conexion = encabezados.get('connection', "").lower()
+                seguir = conexion != "close" if version_http == "HTTP/1.1" else conexion == "keep-alive"
+                if not await self._despachar(escritor, metodo, destino, encabezados, cuerpo, seguir):
+                    return
+                if not seguir:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # CancelledError: el servidor se cierra con la conexión abierta
+            pass
+        finally:
+            escritor.close()
+
+    async def _responder(self, escritor: asyncio.StreamWriter, estado: int, cuerpo: bytes, seguir: bool,
+                         extra: Optional[Dict[str, str]] = None):
+        encabezados = {'Content-Type': "application/json; charset=utf-8", 'Content-Length': str(len(cuerpo)),
+                       'Connection': "keep-alive" if seguir else "close", **(extra or {})}
+        escritor.write(_cabecera(estado, encabezados) + cuerpo)
+        await escritor.drain()
+
+    async def _despachar(self, escritor, metodo: str, destino: str, encabezados: Dict[str, str],
+                         cuerpo: bytes, seguir: bool) -> bool:
+        """Atiende un pedido. Retorna False si la conexión quedó inutilizable (NDJSON cortado)."""
+        self.contadores['pedidos'] += 1
+        partes = urlsplit(destino)
+        ruta = unquote(partes.path).rstrip("/") or "/"
+        params = dict(parse_qsl(partes.query))
+        try:
+            if metodo == "GET":
+                if ruta == "/ejercicios" and 'limite' not in params:
+                    return await self._ndjson(escritor, destino, params, encabezados, seguir)
+                funcion = self._ruta_get(ruta, params)
+                await self._get(escritor, destino, funcion, encabezados, seguir)
+            elif metodo == "POST" and ruta == "/practicas":
+                try:
+                    pedido = json.loads(cuerpo or b"{}")
+                except ValueError:
+                    raise ErrorHTTP(400, "El cuerpo debe ser JSON") from None
+                if not isinstance(pedido, dict):
+                    raise ErrorHTTP(400, "El cuerpo debe ser un objeto JSON")
+                datos = await self._en_pool(lambda: _a_json(_practicas(pedido)))
+                await self._responder(escritor, 200, datos, seguir, {'Cache-Control': "no-store"})
+            else:
+                raise ErrorHTTP(405 if ruta in _RUTAS else 404, f"{metodo} {ruta} no existe")
+        except ErrorHTTP as e:
+            await self._responder(escritor, e.estado, _a_json({'error': str(e)}), seguir)
+        except ValueError as e:
+            await self._responder(escritor, 400, _a_json({'error': str(e)}), seguir)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return False
+        except Exception as e:
+            print(f"❌ {metodo} {destino}: {type(e).__name__}: {e}", file=sys.stderr)
+            await self._responder(escritor, 500, _a_json({'error': "Error interno"}), seguir)
+        return True
+
+    def _ruta_get(self, ruta: str, params: Dict[str, str]) -> Callable[[], object]:
+        """La consulta (sin argumentos, para el pool) que responde al GET."""
+        if ruta == "/ejercicios":
+            filtros, prefijos = _filtros(params, ('despues_de', 'limite'))
+            despues_de = _entero(params, 'despues_de', 0)
+            limite = _entero(params, 'limite', minimo=1)
+            return lambda: _pagina(filtros, prefijos, despues_de, limite)
+        if ruta.startswith("/ejercicios/"):
+            try:
+                ejercicio_id = int(ruta[len("/ejercicios/"):])
+            except ValueError:
+                raise ErrorHTTP(404, f"{ruta} no existe") from None
+            return lambda: _ejercicio(ejercicio_id)
+        if ruta == "/buscar":
+            if not params.get('q'):
+                raise ErrorHTTP(400, "Falta el parámetro 'q'")
+            texto, limite = params['q'], _entero(params, 'limite', search_service.LIMITE, minimo=1)
+            return lambda: _buscar(texto, limite)
+        if ruta == "/estadisticas":
+            return repository.read_estadisticas
+        if ruta == "/semestres":
+            return history_service.resumen_semestres
+        raise ErrorHTTP(405 if ruta in _RUTAS else 404, f"GET {ruta} no existe")
+
+    # ----- GET con caché ----- #
+    async def _get(self, escritor, clave: str, funcion: Callable[[], object], encabezados: Dict[str, str],
+                   seguir: bool):
+        version = repository.read_data_version(self.testigo)
+        etag = self._etag(version, clave)
+        extra = {'ETag': etag, 'Cache-Control': "no-cache"}
+        if encabezados.get('if-none-match') == etag:
+            self.contadores['no_modificados'] += 1
+            escritor.write(_cabecera(304, {'Connection': "keep-alive" if seguir else "close", **extra}))
+            await escritor.drain()
+            return
+
+        guardada = self.cache.get(clave)
+        if guardada is not None and guardada[0] == version:
+            self.cache.move_to_end(clave)
+            self.contadores['desde_cache'] += 1
+            await self._responder(escritor, 200, guardada[1], seguir, extra)
+            return
+
+        # pedidos iguales en vuelo esperan al primero en vez de repetir la consulta
+        clave_vuelo = (version, clave)
+        futuro = self.en_vuelo.get(clave_vuelo)
+        if futuro is not None:
+            self.contadores['compartidos'] += 1
+            cuerpo = await asyncio.shield(futuro)
+        else:
+            futuro = self.en_vuelo[clave_vuelo] = asyncio.get_running_loop().create_future()
+            try:
+                cuerpo = await self._en_pool(lambda: _a_json(funcion()))
+                futuro.set_result(cuerpo)
+            except BaseException as e:
+                futuro.set_exception(e)
+                futuro.exception()  # marcada como vista si nadie más la esperaba
+                raise
+            finally:
+                del self.en_vuelo[clave_vuelo]
+            if len(cuerpo) <= CACHE_MAX_BYTES:
+                self.cache[clave] = (version, cuerpo)
+                self.cache.move_to_end(clave)
+                if len(self.cache) > CACHE_RESPUESTAS:
+                    self.cache.popitem(last=False)
+        await self._responder(escritor, 200, cuerpo, seguir, extra)
+
+    # ----- NDJSON ----- #
+    async def _ndjson(self, escritor, clave: str, params: Dict[str, str], encabezados: Dict[str, str],
+                      seguir: bool) -> bool:
+        filtros, prefijos = _filtros(params)
+        version = repository.read_data_version(self.testigo)
+        etag = self._etag(version, clave)
+        extra = {'ETag': etag, 'Cache-Control': "no-cache", 'Connection': "keep-alive" if seguir else "close"}
+        if encabezados.get('if-none-match') == etag:
+            self.contadores['no_modificados'] += 1
+            escritor.write(_cabecera(304, extra))
+            await escritor.drain()
+            return True
+
+        ids = await self._en_pool(catalog_service.ids_ejercicios, filtros, prefijos)
+        escritor.write(_cabecera(200, {'Content-Type': "application/x-ndjson; charset=utf-8",
+                                       'Transfer-Encoding': "chunked", **extra}))
+        try:
+            for inicio in range(0, len(ids), TRAMO_NDJSON):
+                lineas = await self._en_pool(_lineas_ndjson, ids[inicio:inicio + TRAMO_NDJSON])
+                if lineas:
+                    escritor.write(b"%x\r\n%s\r\n" % (len(lineas), lineas))
+                    await escritor.drain()
+        except Exception as e:
+            # el estado ya salió: se corta la conexión sin el tramo final y el cliente ve la respuesta incompleta
+            if not isinstance(e, ConnectionError):
+                print(f"❌ GET {clave}: {type(e).__name__}: {e}", file=sys.stderr)
+            return False
+        escritor.write(b"0\r\n\r\n")
+        await escritor.drain()
+        return True
+
+
+_RUTAS = ("/ejercicios", "/buscar", "/estadisticas", "/semestres", "/practicas")
+
+
+def _parsear_cabecera(cabecera: bytes) -> Tuple[str, str, str, Dict[str, str]]:
+    """(método, destino, versión HTTP, encabezados en minúsculas); ValueError si está mal formada."""
+    lineas = cabecera.decode("latin-1").split("\r\n")
+    metodo, destino, version_http = lineas[0].split(" ")
+    encabezados = {}
+    for linea in lineas[1:]:
+        if linea:
+            nombre, _, valor = linea.partition(":")
+            encabezados[nombre.strip().lower()] = valor.strip()
+    return metodo.upper(), destino, version_http.upper(), encabezados
+
+
+async def iniciar(host: str = HOST, puerto: int = PUERTO, hilos: int = HILOS) -> Tuple[asyncio.AbstractServer, Servidor]:
+    """Abre el socket y empieza a atender (para usarlo dentro de otro loop, p. ej. benchmarks)."""
+    servidor = Servidor(hilos)
+    servidor_tcp = await asyncio.start_server(servidor.atender, host, puerto, limit=MAX_ENCABEZADOS,
+                                              backlog=1024)
+    return servidor_tcp, servidor
+
+
+def servir(host: str = HOST, puerto: int = PUERTO, hilos: int = HILOS):
+    """Atiende hasta Ctrl+C."""
+    async def principal():
+        servidor_tcp, servidor = await iniciar(host, puerto, hilos)
+        print(f"Sirviendo {repository.DB_PATH} en http://{host}:{puerto} ({hilos} hilos de DB)", file=sys.stderr)
+        try:
+            async with servidor_tcp:
+                await servidor_tcp.serve_forever()
+        finally:
+            servidor.cerrar()
+
+    try:
+        asyncio.run(principal())
+    except KeyboardInterrupt:
+        pass